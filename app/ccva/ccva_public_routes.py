@@ -1,4 +1,6 @@
+import asyncio
 import io
+import os
 import uuid
 import zipfile
 from datetime import date, datetime
@@ -15,7 +17,10 @@ from app.ccva.services.ccva_data_services import (
 
 from app.ccva.services.ccva_public_services import (fetch_ccva_results_and_errors,
                                               run_ccva_public)
+from app.ccva.services.ccva_upload import prepare_upload_chunk, validate_upload_columns
 from app.shared.configs.arangodb import get_arangodb_session
+from app.shared.configs.settings import get_settings
+from app.shared.utils.csv_stream import read_csv_frame, read_csv_header, spool_upload
 from app.shared.configs.models import ResponseMainModel
 from app.users.decorators.user import get_current_user
 from app.utilits.db_logger import  log_to_db
@@ -57,36 +62,21 @@ async def run_ccva_with_csv(
         task_id = str(uuid.uuid4())
         task_results = {}  # Initialize task results storage
 
-        # Read CSV file
-        contents = await file.read()
-        df = pd.read_csv(io.StringIO(contents.decode('utf-8')), low_memory=False)
-        print(unique_id, df.columns)
-        if 'instanceID' in df.columns:
-            df['instanceid'] = df['instanceID']
-            df.drop(columns=['instanceID'], inplace=True)
-        if 'instanceid' not in df.columns:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Instance ID (instanceid) not found in the uploaded CSV")
-        if unique_id not in df.columns:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unique ID not found in the uploaded CSV")
-       # Add additional fields to the DataFrame
-        df['vman_data_source'] = 'uploaded_csv'
-        df['vman_data_name'] = 't'
-        df['__id'] =df[unique_id]
-
-         
-        
-        df['version_number'] = '1.0'
-        df['trackid'] = task_id
-   
-
-        # Convert DataFrame back to a list of dictionaries
-        recordsDF = df.to_dict(orient='records')
-        print('before insert_all_csv_data', len(recordsDF))
-        
-        # print(recordsDF)
-        records = recordsDF or []
-        print('data 3', len(records))
-        if not records or len(records)<=0:
+        # Spool the upload to disk and parse it in chunks (CSV, gzip or ZIP)
+        path = await spool_upload(file)
+        try:
+            try:
+                validate_upload_columns(await asyncio.to_thread(read_csv_header, path), unique_id)
+            except ValueError as e:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+            df = await asyncio.to_thread(read_csv_frame, path, get_settings().CSV_UPLOAD_CHUNK_ROWS)
+        finally:
+            os.remove(path)
+        df = prepare_upload_chunk(df, unique_id, task_id)
+
+        # the CCVA runs on the DataFrame directly
+        records = df
+        if records.empty:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No records found in the uploaded CSV")
 
         #TODO: check the data to detamin the algorithim and data version to use
@@ -16,7 +16,7 @@ from app.ccva.services.ccva_data_services import (
 from app.ccva.services.ccva_graph_services import \
     fetch_db_processed_ccva_graphs
 from app.ccva.services.ccva_services import (fetch_ccva_results_and_errors,
-                                             get_record_to_run_ccva, run_ccva, process_upload_and_run_ccva, get_ccva_record_count)
+                                             run_ccva, process_upload_and_run_ccva, get_ccva_record_count)
 from app.ccva.services.ccva_upload import insert_all_csv_data
 from app.shared.configs.arangodb import get_arangodb_session, remove_null_values
 from app.shared.configs.models import ResponseMainModel
@@ -24,6 +24,7 @@ from app.shared.services.task_progress_service import TaskProgressService
 from app.users.decorators.user import get_current_user, oauth2_scheme
 from app.utilits.db_logger import  log_to_db
 from app.shared.utils.cache import cache
+from app.shared.utils.csv_stream import spool_upload
 
 # Celery task imports - for background task processing
 from celery.result import AsyncResult
@@ -72,8 +73,8 @@ async def run_ccva_with_csv(
         task_id = str(uuid.uuid4())
         task_results = {}  # Initialize task results storage
 
-        # Read CSV file immediately
-        contents = await file.read()
+        # Spool the upload to disk now, the request's file is closed before background tasks run
+        file_path = await spool_upload(file)
 
         # Prepare extra info for progress tracking (initial immediate response)
         user_id = current_user.get('uid') or current_user.get('id') or "unknown" if isinstance(current_user, dict) else "unknown"
@@ -81,7 +82,7 @@ async def run_ccva_with_csv(
         # Add the entire process (Upload -> Insert -> CCVA) to background tasks
         background_tasks.add_task(
             process_upload_and_run_ccva,
-            file_contents=contents,
+            file_path=file_path,
             unique_id=unique_id,
             current_user=current_user,
             start_date=start_date,
@@ -176,12 +177,12 @@ async def run_internal_ccva(
                     detail="Background task service (Redis/Celery) is currently unavailable. Please check the backend services."
                 )
         else:
-            records = await get_record_to_run_ccva(current_user, db, None, task_id, task_results, start_date, end_date, date_type=date_type, top=top)
-            if not records:
+            total_records = await get_ccva_record_count(current_user, db, start_date, end_date, date_type, top)
+            if total_records == 0:
                 raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No records found to run CCVA")
 
-            total_records = len(records.data)
-            background_tasks.add_task(run_ccva, db, records, task_id, task_results, start_date, end_date, malaria_status, hiv_status, ccva_algorithm, user_id, dk_threshold=dk_threshold, ood_threshold=ood_threshold)
+            # The records are streamed from the database by the background task
+            background_tasks.add_task(run_ccva, db, None, task_id, task_results, start_date, end_date, malaria_status, hiv_status, ccva_algorithm, user_id, dk_threshold=dk_threshold, ood_threshold=ood_threshold, current_user=current_user, date_type=date_type, top=top, total_records=total_records)
         
         # Constructing response
         datas = {
@@ -0,0 +1,159 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from arango.database import StandardDatabase
+from fastapi.concurrency import run_in_threadpool
+
+from app.ccva.services.va_data_merge import merge_va_data
+from app.settings.models.settings import SettingsConfigData
+from app.shared.configs.constants import db_collections
+from app.utilits.logger import app_logger
+
+
+class CCVACsmfService:
+    """
+    Cause counts (CSMF) of a CCVA task, materialised in ccva_csmf when the
+    task completes. A row holds the causes of the task's results for one
+
+        task_id, region, district, group
+
+    where group is one of GROUPS (a result counts in 'all' and in each group it
+    belongs to) and region/district are the lower-cased location of its VA
+    record. The graphs of a task are read from its rows and merged in memory
+    for location filters, instead of grouping ccva_results for each request.
+
+    Tasks completed before rows were materialised get them on first read.
+    """
+    GROUPS = ('all', 'male', 'female', 'adult', 'child', 'neonate')
+    UNDETERMINED = 'Undeterminant'
+    RESULT_FIELDS = ('ID', 'CAUSE1', 'gender', 'age_group', 'isadult', 'ischild', 'isneonatal')
+
+    @classmethod
+    def result_groups(cls, result: Dict[str, Any]) -> List[str]:
+        """The groups a (merged) CCVA result counts in"""
+        age_group = result.get('age_group')
+        groups = ['all']
+        if result.get('gender') in ('male', 'female'):
+            groups.append(result['gender'])
+        if result.get('isadult') == '1' or age_group == 'adult':
+            groups.append('adult')
+        if result.get('ischild') == '1' or age_group == 'child':
+            groups.append('child')
+        if result.get('isneonatal') == '1' or age_group == 'neonate':
+            groups.append('neonate')
+        return groups
+
+    @classmethod
+    def csmf_rows(cls, task_id: str, results: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Rows of a task from its CCVA results merged with their VA records (see merge_va_data)"""
+        rows: Dict[Tuple, Dict[str, Any]] = {}
+        for result in results:
+            cause = result.get('CAUSE1')
+            if result.get('ID') is None or cause == "":
+                continue
+            region, district = result.get('locationLevel1'), result.get('locationLevel2')
+            for group in cls.result_groups(result):
+                key = (region, district, group)
+                if key not in rows:
+                    rows[key] = {'task_id': task_id, 'region': region, 'district': district,
+                                 'group': group, 'total': 0, 'causes': {}}
+                row = rows[key]
+                row['total'] += 1
+                row['causes'][cause] = row['causes'].get(cause, 0) + 1
+        return [
+            {**row, 'causes': [{'cause': cause, 'count': count} for cause, count in row['causes'].items()]}
+            for row in rows.values()
+        ]
+
+    @classmethod
+    def _save_sync(cls, db: StandardDatabase, task_id: str, rows: List[Dict[str, Any]]):
+        """Replace the rows of a task (Synchronous)"""
+        cls.remove_sync(db, task_id)
+        if rows:
+            db.collection(db_collections.CCVA_CSMF).insert_many(rows)
+
+    @classmethod
+    def remove_sync(cls, db: StandardDatabase, task_id: str):
+        """Remove the rows of a task (Synchronous)"""
+        db.aql.execute(
+            "FOR row IN @@collection FILTER row.task_id == @task_id REMOVE row IN @@collection",
+            bind_vars={'@collection': db_collections.CCVA_CSMF, 'task_id': task_id},
+        )
+
+    @classmethod
+    def materialize_sync(cls, db: StandardDatabase, task_id: str, results: List[Dict[str, Any]]):
+        """
+        Materialise the rows of a completed task from its merged results (Synchronous).
+        Failures are logged only, the rows are then built on first read.
+        """
+        try:
+            cls._save_sync(db, task_id, cls.csmf_rows(task_id, results))
+        except Exception as e:
+            app_logger.warning(f"Failed to materialise the CSMF of CCVA task {task_id}: {e}")
+
+    @classmethod
+    async def task_rows(cls, db: StandardDatabase, task_id: str, config: SettingsConfigData) -> List[Dict[str, Any]]:
+        """The rows of a task, materialised from its stored results when it has none"""
+        def read_rows():
+            cursor = db.aql.execute(
+                "FOR row IN @@collection FILTER row.task_id == @task_id RETURN UNSET(row, '_id', '_key', '_rev')",
+                bind_vars={'@collection': db_collections.CCVA_CSMF, 'task_id': task_id},
+            )
+            return [row for row in cursor]
+
+        rows = await run_in_threadpool(read_rows)
+        if rows:
+            return rows
+
+        def read_results():
+            cursor = db.aql.execute(
+                "FOR cc IN @@results FILTER cc.task_id == @task_id RETURN KEEP(cc, @fields)",
+                bind_vars={'@results': db_collections.CCVA_RESULTS, 'task_id': task_id, 'fields': list(cls.RESULT_FIELDS)},
+            )
+            return [result for result in cursor]
+
+        results = await merge_va_data(db, await run_in_threadpool(read_results), config=config, location_levels=2)
+        rows = cls.csmf_rows(task_id, results)
+        await run_in_threadpool(cls._save_sync, db, task_id, rows)
+        return rows
+
+    @classmethod
+    def graphs(
+        cls,
+        rows: List[Dict[str, Any]],
+        selected_success_type: Optional[str] = None,
+        locations: Optional[List[str]] = None,
+        limit_dimension: Optional[str] = None,
+        limit_values: Optional[List[str]] = None,
+    ) -> Tuple[Dict[str, Dict[str, list]], int]:
+        """
+        Graphs of each group (causes with their counts and fractions, largest first)
+        and the number of results, over the rows matching the filters.
+
+        :param locations: lower-cased regions
+        :param limit_dimension: 'region' or 'district', the location access limit is on
+        :param limit_values: lower-cased values of the access limit
+        """
+        counts: Dict[str, Dict[Any, int]] = {group: {} for group in cls.GROUPS}
+        for row in rows:
+            if locations and row['region'] not in locations:
+                continue
+            if limit_dimension and limit_values and row[limit_dimension] not in limit_values:
+                continue
+            group_counts = counts[row['group']]
+            for cause in row['causes']:
+                if selected_success_type == cls.UNDETERMINED and cause['cause'] != cls.UNDETERMINED:
+                    continue
+                if selected_success_type == 'success' and cause['cause'] == cls.UNDETERMINED:
+                    continue
+                group_counts[cause['cause']] = group_counts.get(cause['cause'], 0) + cause['count']
+
+        graphs = {}
+        for group, group_counts in counts.items():
+            total = sum(group_counts.values())
+            causes = sorted(group_counts.items(), key=lambda item: (-item[1], str(item[0])))
+            graphs[group] = {
+                'index': [cause for cause, _ in causes],
+                'counts': [count for _, count in causes],
+                'values': [count / total for _, count in causes],
+            }
+        return graphs, sum(counts['all'].values())
@@ -6,6 +6,7 @@ from arango.database import StandardDatabase
 from fastapi import HTTPException, status
 from fastapi.concurrency import run_in_threadpool
 
+from app.ccva.services.ccva_csmf import CCVACsmfService
 from app.settings.services.odk_configs import fetch_odk_config
 from app.shared.configs.constants import db_collections
 from app.shared.configs.models import ResponseMainModel
@@ -431,6 +432,10 @@ async def delete_ccva_entry(ccva_id: str, db: StandardDatabase) -> ResponseMainM
                     })
                 except Exception:
                     pass
+                try:
+                    CCVACsmfService.remove_sync(db, task_id)
+                except Exception:
+                    pass
 
         await run_in_threadpool(execute_delete_entry)
         
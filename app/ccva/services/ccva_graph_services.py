@@ -6,6 +6,7 @@ from arango.database import StandardDatabase
 from fastapi import HTTPException, status
 from fastapi.concurrency import run_in_threadpool
 
+from app.ccva.services.ccva_csmf import CCVACsmfService
 from app.settings.services.odk_configs import fetch_odk_config
 from app.shared.configs.constants import db_collections
 from app.shared.configs.models import ResponseMainModel
@@ -102,6 +103,23 @@ async def fetch_db_processed_ccva_graphs(
         locations = [loc.lower() for loc in locations] if locations else None
         locationLimitValues = [loc.lower() for loc in locationLimitValues] if locationLimitValues else None
 
+        # The graphs are read from the CSMF materialised for the task (see CCVACsmfService);
+        # date filters and access limits below district level still group the results below.
+        limit_dimension = {region_field: 'region', config.field_mapping.location_level2: 'district'}.get(locationKey)
+        if not start_date and not end_date and not (locationKey and locationLimitValues and limit_dimension is None):
+            rows = await CCVACsmfService.task_rows(db, ccva_task_id, config)
+            graphs, total_records = CCVACsmfService.graphs(
+                rows, selected_success_type, locations, limit_dimension, locationLimitValues)
+            data = [{
+                "graphs": graphs,
+                "total_records": total_records,
+                "created_at": created_at,
+                "elapsed_time": elapsed_time,
+                "range": range,
+                "task_id": ccva_task_id,
+            }]
+            return ResponseMainModel(data=data, message="Processed CCVA fetched successfully", total=len(data))
+
         # Build subqueries that resolve allowed ccva_result IDs from form_submissions.
         # This is the same join-based approach used by the export and avoids relying
         # on locationLevel1/locationLevel2 being populated inside ccva_results.
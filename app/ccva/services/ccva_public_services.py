@@ -14,6 +14,8 @@ from app.ccva.utilits.pycrossva.transform import transform
 from app.shared.middlewares.exceptions import BadRequestException
 from app.ccva.models.ccva_models import InterVA5Progress
 from app.ccva.utilits.interva.interva5 import InterVA5
+from app.ccva.utilits.interva.sinks import ColumnarResultSink
+from app.ccva.services.va_data_merge import merge_va_data
 # import vman3 as vman
 from app.settings.services.odk_configs import fetch_odk_config
 from app.shared.configs.arangodb import null_convert_data, remove_null_values
@@ -106,7 +108,10 @@ async def run_ccva_public(db: StandardDatabase, records:any, task_id: str, task_
 
 
         # Convert records to DataFrame directly - Run in thread to prevent blocking
-        database_dataframe = await asyncio.to_thread(lambda: pd.DataFrame.from_records(records))
+        if isinstance(records, pd.DataFrame):
+            database_dataframe = records
+        else:
+            database_dataframe = await asyncio.to_thread(lambda: pd.DataFrame.from_records(records))
         # Fetch the  configuration
         config = await fetch_odk_config(db, True) # TODOS: the configaration should be loaded from the UI/dashboard , not store in db
         id_col = config.field_mapping.instance_id
@@ -153,8 +158,10 @@ def runCCVA(odk_raw:pd.DataFrame, id_col: str = None,date_col:str =None,start_ti
         print(f'Output directory ready: {output_folder}')
         # output_folder = f"../ccva_files/{file_id}/"
         
-        # Create an InterVA5 instance with the async callback
-        iv5out = InterVA5(input_data,task_id=file_id, hiv=hiv, malaria=malaria, write=True, directory=output_folder, filename=file_id,start_time=start_time, update_callback=update_callback, return_checked_data=True)
+        # Create an InterVA5 instance with the async callback; the results are
+        # kept in memory (only the error log is written to output_folder)
+        results_sink = ColumnarResultSink()
+        iv5out = InterVA5(input_data,task_id=file_id, hiv=hiv, malaria=malaria, write=True, directory=output_folder, filename=file_id,start_time=start_time, update_callback=update_callback, return_checked_data=True, sinks=[results_sink])
 
         call_update_callback(update_callback, InterVA5Progress(
             progress=7,
@@ -174,27 +181,10 @@ def runCCVA(odk_raw:pd.DataFrame, id_col: str = None,date_col:str =None,start_ti
             include_propensities=False
         )
         print('after get_indiv_prob')
-       ## TODOS: find the corect way to load data from records (fuction)
-        rcd = records.to_dict(orient='records')
-        # pd.DataFrame(rcd).to_csv(f"{output_folder}{file_id}_ccva_results-test.csv")
-        # get from csv(official)
+        # VA5 results (classic output columns) collected during the run
+        rcd = results_sink.to_records()
         print('rcd total')
         print(len(rcd))
-        try:
-            # Check if the CSV (responce of ccva results from file)  if file exists 
-            csv_path = f"{output_folder}{file_id}.csv"
-            if os.path.exists(csv_path):
-                rcd = pd.read_csv(csv_path).to_dict(orient='records')
-                print("CSV file read successfully.")
-                print(len(rcd))
-            else:
-                print("Use rcd from Dataframe return"   )
-                pass
-            
-        except Exception as e:
-            print(f"Error reading CSV file: {e}")
-            rcd = []
-        print(len(rcd))
         # print(rcd)
         if rcd == [] or rcd is None:
             call_update_callback(update_callback, {"progress": 0, "message": "No records found", "status": 'error',"elapsed_time": f"{(datetime.now() - start_time).seconds // 3600}:{(datetime.now() - start_time).seconds // 60 % 60}:{(datetime.now() - start_time).seconds % 60}", "task_id": file_id, "error": True})
@@ -241,13 +231,10 @@ def runCCVA(odk_raw:pd.DataFrame, id_col: str = None,date_col:str =None,start_ti
             
         print("CCVA run is completed.")
         error_log_path = f"{output_folder}{file_id}_errorlogV5.txt"
-        log_path = f"{output_folder}{file_id}.csv"
 
         
         if os.path.exists(error_log_path):
             os.remove(error_log_path)
-        if os.path.exists(log_path):
-            os.remove(log_path)
 
         return ccva_results
 
@@ -635,82 +622,5 @@ async def cleanup_expired_ccva_public_results(db: StandardDatabase = None):
         return None
     
 async def getVADataAndMergeWithResults(db: StandardDatabase, results: list):
-    # save results to csv
-    df = pd.DataFrame(results)
-    df.to_csv('results.csv')
-    from app.settings.services.odk_configs import fetch_odk_config
-
-    # Fetch configurations asynchronously
-    config = await fetch_odk_config(db, True)
-
-    # Extract field mappings from the configuration
-    is_adult = config.field_mapping.is_adult
-    is_child = config.field_mapping.is_child
-    is_neonate = config.field_mapping.is_neonate
-    deceased_gender = config.field_mapping.deceased_gender
-    location_level1 = config.field_mapping.location_level1
-    location_level2 = config.field_mapping.location_level2
-    death_date = config.field_mapping.death_date or 'id10023'
-    submitted_date = config.field_mapping.submitted_date or 'today' or 'submissiondate'
-    interview_date = config.field_mapping.interview_date or 'id10012'
-    date = config.field_mapping.date
-    instance_id = config.field_mapping.instance_id or 'instanceid'
-    # results = [{key: result[key] for key in ['ID', 'CAUSE1', 'task_id']} for result in results]
-    # Extract all data UIDs for a batch query
-    data_uids = [result.get('ID') for result in results if result.get('ID') is not None]
-
-    # Return early if there are no valid data_uids
-    if not data_uids:
-        return results
-
-    # Define a batch AQL query for all data_uids at once
-    collection = db.collection(db_collections.VA_TABLE)
-    data_uids_str = ', '.join(f'"{uid}"' for uid in data_uids)
-    query = f"""
-FOR doc IN {collection.name}
-    FILTER doc.{instance_id} IN [{data_uids_str}]
-    LET age_group = 
-        (doc.age_group=="neonate" || TO_NUMBER(doc.{is_neonate}) == 1 || ((TO_NUMBER(doc.isneonatal1) == 1 || TO_NUMBER(doc.isneonatal2) == 1))) ? "neonate" :
-        (doc.age_group=="child" || TO_NUMBER(doc.{is_child}) == 1 || ((TO_NUMBER(doc.ischild1) == 1 || TO_NUMBER(doc.ischild2) == 1))) ? "child" :
-        (doc.age_group=="adult" || TO_NUMBER(doc.{is_adult}) == 1 || ((TO_NUMBER(doc.isadult1) == 1 || TO_NUMBER(doc.isadult2) == 1))) ? "adult" :
-        "Unknown"
-    RETURN {{
-        uid: doc.{instance_id},
-        gender: LOWER(doc.{deceased_gender}),
-        date: LOWER(doc.{date}),
-        age_group: age_group,
-        locationLevel1: LOWER(doc.{location_level1}),
-        locationLevel2: LOWER(doc.{location_level2}),
-        death_date: doc.{death_date},
-        submitted_date: doc.{submitted_date},
-        interview_date: doc.{interview_date},
-        reasoans:doc.id10476,
-        form_age_group:doc.age_group,
-        isneonatal:doc.isneonatal,
-        ischild:doc.ischild, 
-        isadult:doc.isadult
-
-    }}
-    """
-    # print(query)
-    # Execute the query with caching
-    cursor = db.aql.execute(query, cache=True)
-
-    # Convert the cursor to a dictionary keyed by UID for easy lookup
-    va_data_map = {doc['uid']: doc for doc in cursor}
-    
-    # print(va_data_map)
-
-    # Merge the fetched data with the original results
-    updated_results = []
-    for result in results:
-        data_uid = result.get('ID')
-        if data_uid in va_data_map:
-            # Create a new dictionary by merging the original and the update
-            merged_result = {**result, **va_data_map[data_uid]}
-            updated_results.append(merged_result)
-        else:
-            updated_results.append(result)  # If no update, keep the original
-
-
-    return updated_results
\ No newline at end of file
+    """Adds the fields of each result's VA record (batched, parameterised lookups, see merge_va_data)"""
+    return await merge_va_data(db, results, location_levels=2)
\ No newline at end of file
@@ -4,23 +4,31 @@ import json
 import os
 import re
 from datetime import date, datetime, timedelta
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 
 import numpy as np
 import pandas as pd
 from arango.database import StandardDatabase
 from fastapi import HTTPException
 from fastapi.concurrency import run_in_threadpool
+from app.ccva.utilits import pycrossva
 from app.ccva.utilits.interva.utils import csmf
 from app.ccva.utilits.pycrossva.transform import transform
 
 from app.ccva.models.ccva_models import InterVA5Progress
 from app.ccva.utilits.interva.interva5 import InterVA5
-from app.records.services.list_data import fetch_va_records_json
+from app.ccva.utilits.interva.parallel import run_sharded
+from app.ccva.utilits.interva.sinks import ColumnarResultSink
+from app.ccva.services.ccva_csmf import CCVACsmfService
+from app.ccva.services.va_data_merge import merge_va_data
+from app.records.services.list_data import (fetch_va_records_json,
+                                            stream_va_records_json)
 from app.settings.services.odk_configs import fetch_odk_config
 from app.shared.configs.arangodb import null_convert_data, remove_null_values
 from app.shared.configs.constants import db_collections
 from app.shared.configs.models import ResponseMainModel
+from app.shared.configs.settings import get_settings
+from app.shared.services.progress_publisher import ProgressPublisher, progress_dict
 from app.shared.services.task_progress_service import TaskProgressService
 from app.shared.utils.async_utils import call_update_callback
 from app.utilits.logger import app_logger
@@ -39,6 +47,21 @@ async def websocket_broadcast(task_id: str, progress_data: dict):
         
     await websocket__manager.broadcast(task_id, json.dumps(progress_data, default=str))
 
+def ccva_progress_report(progress, user_id: Optional[str] = None) -> dict:
+    """
+    A CCVA progress report as shown and saved: status defaults to running, and
+    InterVA5 warnings are kept in 'log' while 'message' stays a stable status.
+    """
+    progress = progress_dict(progress)
+    progress.setdefault('status', 'running')
+    if progress.get('log'):
+        message = progress.get('message', '')
+        if "Error" in message or "WARNING" in message or "Not Specified" in message:
+            progress['message'] = "Running InterVA5 analysis..."
+    if user_id is not None:
+        progress['user_id'] = user_id
+    return progress
+
 async def get_record_to_run_ccva(current_user:dict,db: StandardDatabase,data_source:Optional[str], task_id: Optional[str], task_results: Dict,start_date: Optional[date] = None, end_date: Optional[date] = None,date_type:Optional[str]=None, top:Optional[int]=None):
     try:
         records= await fetch_va_records_json(current_user=current_user,paging=False,data_source=data_source,task_id=task_id,  start_date=start_date, end_date=end_date,  db=db,date_type=date_type,top=top)
@@ -59,13 +82,46 @@ async def get_ccva_record_count(current_user:dict, db: StandardDatabase, start_d
         app_logger.error(f"Error fetching record count: {e}")
         return 0
 
+
+def get_ccva_input_columns(instrument: str = '2016WHOv151', algorithm: str = 'InterVA5') -> List[str]:
+    """Question IDs (lower case) read by the pycrossva mapping from instrument to algorithm."""
+    mapping_file = os.path.join(os.path.dirname(pycrossva.__file__), "resources", "mapping_configuration_files",
+                                f"{instrument}_to_{algorithm}.csv")
+    source_ids = pd.read_csv(mapping_file, usecols=["Source Column ID"])["Source Column ID"]
+    return sorted(source_ids.dropna().str.lower().unique().tolist())
+
+
+async def load_ccva_dataframe(current_user: dict, db: StandardDatabase, data_source: Optional[str] = None, start_date: Optional[date] = None, end_date: Optional[date] = None, date_type: Optional[str] = None, top: Optional[int] = None, algorithm: Optional[str] = None) -> pd.DataFrame:
+    """
+    Builds the CCVA input DataFrame from the VA records, one cursor batch at a time.
+
+    For InterVA5 only the columns read by the pycrossva mapping (plus the
+    instance ID and date columns) are fetched; other algorithms get whole records.
+    """
+    fields = field_suffixes = None
+    if algorithm in (None, "InterVA5"):
+        config = await fetch_odk_config(db, True)
+        fields = [field for field in (config.field_mapping.instance_id, config.field_mapping.date) if field]
+        field_suffixes = get_ccva_input_columns()
+
+    chunks = []
+    async for batch in stream_va_records_json(current_user=current_user, data_source=data_source, start_date=start_date, end_date=end_date, date_type=date_type, db=db, top=top, fields=fields, field_suffixes=field_suffixes, batch_size=get_settings().CCVA_FETCH_BATCH_SIZE):
+        chunks.append(pd.DataFrame.from_records(batch))
+    if not chunks:
+        raise Exception("No records found")
+    return pd.concat(chunks, ignore_index=True, sort=False)
+
         
 # The main run_ccva function that integrates everything
-async def run_ccva(db: StandardDatabase, records:ResponseMainModel, task_id: str, task_results: Dict,start_date: Optional[date] = None, end_date: Optional[date] = None, malaria_status:Optional[str]=None, hiv_status:Optional[str]=None, ccva_algorithm:Optional[str]=None, user_id: str = "unknown", dk_threshold: Optional[float] = None, ood_threshold: Optional[float] = None):
+async def run_ccva(db: StandardDatabase, records:Optional[ResponseMainModel], task_id: str, task_results: Dict,start_date: Optional[date] = None, end_date: Optional[date] = None, malaria_status:Optional[str]=None, hiv_status:Optional[str]=None, ccva_algorithm:Optional[str]=None, user_id: str = "unknown", dk_threshold: Optional[float] = None, ood_threshold: Optional[float] = None, current_user: Optional[dict] = None, date_type: Optional[str] = None, top: Optional[int] = None, total_records: int = 0, dataframe: Optional[pd.DataFrame] = None):
+    """
+    Runs CCVA on the given records (or dataframe, e.g. an uploaded CSV); when
+    both are None the records are streamed from the database (filtered by
+    start_date, end_date, date_type and top).
+    """
+    publisher = None
     try:
-                # Define the async callback to send progress updates
-                # Define the async callback to send progress updates
-        # Capture the main loop to ensure thread-safe callbacks
+        # Capture the main loop: progress is broadcast on it from the CCVA threads
         try:
             main_loop = asyncio.get_running_loop()
         except RuntimeError:
@@ -73,61 +129,27 @@ async def run_ccva(db: StandardDatabase, records:ResponseMainModel, task_id: str
             app_logger.error("No running loop found in run_ccva!")
             return
 
-        async def _persist_and_broadcast(progress):
-            """Internal function to save to DB and broadcast"""
-            # 1. Broadcast via WebSocket
-            await websocket_broadcast(task_id, progress)
-            
-            # 2. Save to Database
-            progress_dict = progress.model_dump() if hasattr(progress, 'model_dump') else progress
-            if isinstance(progress_dict, str):
-                 try:
-                     progress_dict = json.loads(progress_dict)
-                 except:
-                     pass
-            
-            # Ensure status exists for UI updates
-            if isinstance(progress_dict, dict):
-                if 'status' not in progress_dict:
-                    progress_dict['status'] = 'running'
-                
-                # Separation of concerns: Keep 'message' stable for UI status, move details to 'log'
-                # If InterVA5 sends a "log" field, it's likely a detail. 
-                # If 'message' looks like an error/warning (which InterVA5 does), revert 'message' to generic status.
-                if 'log' in progress_dict and progress_dict['log']:
-                    # Check if message is essentially the log (InterVA5 behavior)
-                    msg = progress_dict.get('message', '')
-                    if "Error" in msg or "WARNING" in msg or "Not Specified" in msg:
-                        progress_dict['message'] = "Running InterVA5 analysis..." 
-                
-                progress_dict['user_id'] = user_id
-                
-            # Use TaskProgressService (async wrapper)
-            await TaskProgressService.save_progress(db, task_id, progress_dict)
-
-        async def update_callback(progress):
-            """
-            Thread-safe callback wrapper.
-            If called from a thread (different loop), schedules _persist_and_broadcast on the main loop.
-            """
-            try:
-                curr_loop = asyncio.get_running_loop()
-            except RuntimeError:
-                curr_loop = None
-
-            if curr_loop == main_loop:
-                 await _persist_and_broadcast(progress)
-            else:
-                 # We are in a thread/different context, update on main loop
-                 future = asyncio.run_coroutine_threadsafe(_persist_and_broadcast(progress), main_loop)
-                 return future.result()
+        def broadcast(progress):
+            asyncio.run_coroutine_threadsafe(websocket_broadcast(task_id, progress), main_loop)
+
+        # Reports are coalesced (InterVA5 reports every warning and 1% step) and
+        # saved to task_progress on a timer instead of once per report
+        publisher = ProgressPublisher(
+            task_id,
+            publish=broadcast,
+            persist=lambda progress: TaskProgressService.save_progress_sync(db, task_id, progress),
+        )
+
+        def update_callback(progress):
+            """Thread-safe progress callback (blocking: call it from a thread, not the event loop)"""
+            publisher.update(ccva_progress_report(progress, user_id))
 
         # Initial update for task start
         start_time = datetime.now()
 
         initial_progress = InterVA5Progress(
             progress=1,
-            total_records= len(records.data),
+            total_records= len(dataframe) if dataframe is not None else len(records.data) if records is not None else total_records,
             message="Collecting data.",
             status="running",
             elapsed_time=f"{(datetime.now() - start_time).seconds // 3600}:{(datetime.now() - start_time).seconds // 60 % 60}:{(datetime.now() - start_time).seconds % 60}",
@@ -135,11 +157,17 @@ async def run_ccva(db: StandardDatabase, records:ResponseMainModel, task_id: str
             error=False
         )
         
-        await update_callback(initial_progress.model_dump_json())
+        await asyncio.to_thread(update_callback, initial_progress.model_dump_json())
 
 
-        # Convert records to DataFrame directly - Run in thread to prevent blocking
-        database_dataframe = await asyncio.to_thread(lambda: pd.DataFrame.from_records(records.data))
+        if dataframe is not None:
+            database_dataframe = dataframe
+        elif records is None:
+            # Stream the records from the database, building the frame chunk by chunk
+            database_dataframe = await load_ccva_dataframe(current_user, db, None, start_date, end_date, date_type=date_type, top=top, algorithm=ccva_algorithm)
+        else:
+            # Convert records to DataFrame directly - Run in thread to prevent blocking
+            database_dataframe = await asyncio.to_thread(lambda: pd.DataFrame.from_records(records.data))
 
         
 
@@ -153,7 +181,7 @@ async def run_ccva(db: StandardDatabase, records:ResponseMainModel, task_id: str
         id_col = config.field_mapping.instance_id
         date_col = config.field_mapping.date
         # Run the CCVA process in a thread pool, with real-time updates
-        await update_callback(InterVA5Progress(
+        await asyncio.to_thread(update_callback, InterVA5Progress(
         progress=4,
         message="Running InterVA5 analysis...",
         status="running",
@@ -176,8 +204,11 @@ async def run_ccva(db: StandardDatabase, records:ResponseMainModel, task_id: str
     except Exception as e:
         print(e)
         error_message = {"progress": 0, "message": str(e), "status":'error',"elapsed_time": f"{(datetime.now() - start_time).seconds // 3600}:{(datetime.now() - start_time).seconds // 60 % 60}:{(datetime.now() - start_time).seconds % 60}", "task_id": task_id, "error": True}
-        call_update_callback(update_callback, error_message)
+        await asyncio.to_thread(call_update_callback, update_callback, error_message)
         task_results[task_id] = error_message
+    finally:
+        if publisher is not None:
+            await asyncio.to_thread(publisher.close)
         
         
 
@@ -209,6 +240,7 @@ def runCCVA(odk_raw:pd.DataFrame, id_col: str = None,date_col:str =None,start_ti
             return
 
         db.collection(db_collections.CCVA_RESULTS).insert_many(results_to_insert, overwrite=True, overwrite_mode="update")
+        CCVACsmfService.materialize_sync(db, file_id, results_to_insert)
 
         # Build CSMF per group (all/male/female/adult/child/neonate) and persist
         # to CCVA_GRAPH_RESULTS — same format as InterVA5 compile_ccva_results().
@@ -247,8 +279,10 @@ def runCCVA(odk_raw:pd.DataFrame, id_col: str = None,date_col:str =None,start_ti
         output_folder = "ccva_files/"
         os.makedirs(output_folder, exist_ok=True)
         # output_folder = f"../ccva_files/{file_id}/"
-        # Create an InterVA5 instance with the async callback
-        iv5out = InterVA5(input_data,task_id=file_id, hiv=hiv, malaria=malaria, write=True, directory=output_folder, filename=file_id,start_time=start_time, update_callback=update_callback, return_checked_data=True)
+        # Create an InterVA5 instance with the async callback; the results are
+        # kept in memory (only the error log is written to output_folder)
+        results_sink = ColumnarResultSink()
+        iv5out = InterVA5(input_data,task_id=file_id, hiv=hiv, malaria=malaria, write=True, directory=output_folder, filename=file_id,start_time=start_time, update_callback=update_callback, return_checked_data=True, sinks=[results_sink])
 
         call_update_callback(update_callback, InterVA5Progress(
             progress=7,
@@ -261,26 +295,17 @@ def runCCVA(odk_raw:pd.DataFrame, id_col: str = None,date_col:str =None,start_ti
         ).model_dump_json())
         
         # Run the InterVA5 analysis, with progress updates via the async callback
-        iv5out.run()
+        # (large inputs are split across worker processes)
+        # by default the CPUs are shared among the CCVA tasks run at once
+        settings = get_settings()
+        workers = settings.CCVA_WORKERS or max(1, (os.cpu_count() or 1) // max(1, settings.CELERY_WORKER_CONCURRENCY))
+        run_sharded(iv5out, workers=workers)
         records = iv5out.get_indiv_prob(
             top=10,
             include_propensities=False
         )
-        ## TODOS: find the corect way to load data from records (fuction)
-        rcd = records.to_dict(orient='records')
-        # pd.DataFrame(rcd).to_csv(f"{output_folder}{file_id}_ccva_results-test.csv")
-        # get from csv(official)
-        try:
-            # Check if the CSV (responce of ccva results from file)  if file exists 
-            csv_path = f"{output_folder}{file_id}.csv"
-            if os.path.exists(csv_path):
-                rcd = pd.read_csv(csv_path).to_dict(orient='records')
-            else:
-                pass
-            
-        except Exception as e:
-            app_logger.error(f"Error reading CCVA binary CSV output: {e}")
-            rcd = []
+        # VA5 results (classic output columns) collected during the run
+        rcd = results_sink.to_records()
         # print(rcd)
         if rcd == [] or rcd is None:
             call_update_callback(update_callback, {"progress": 0, "message": "No records found", "status": 'error',"elapsed_time": f"{(datetime.now() - start_time).seconds // 3600}:{(datetime.now() - start_time).seconds // 60 % 60}:{(datetime.now() - start_time).seconds % 60}", "task_id": file_id, "error": True})
@@ -298,6 +323,7 @@ def runCCVA(odk_raw:pd.DataFrame, id_col: str = None,date_col:str =None,start_ti
             call_update_callback(update_callback, {"progress": 0, "message": "No records found", "status": 'error',"elapsed_time": f"{(datetime.now() - start_time).seconds // 3600}:{(datetime.now() - start_time).seconds // 60 % 60}:{(datetime.now() - start_time).seconds % 60}", "task_id": file_id, "error": True})
             return
         db.collection(db_collections.CCVA_RESULTS).insert_many(results_to_insert, overwrite=True, overwrite_mode="update")
+        CCVACsmfService.materialize_sync(db, file_id, results_to_insert)
 
 
         total_records = len(records)
@@ -327,15 +353,13 @@ def runCCVA(odk_raw:pd.DataFrame, id_col: str = None,date_col:str =None,start_ti
                                            total_records=total_records,  
                                            rangeDates =rangeDates, 
                                            db=db,
-                                           user_id=user_id)
+                                           user_id=user_id,
+                                           update_callback=update_callback)
         error_log_path = f"{output_folder}{file_id}_errorlogV5.txt"
-        log_path = f"{output_folder}{file_id}.csv"
 
         
         if os.path.exists(error_log_path):
             os.remove(error_log_path)
-        if os.path.exists(log_path):
-            os.remove(log_path)
         return ccva_results
 
     except Exception as e:
@@ -429,7 +453,8 @@ def compile_ccva_results(iv5out, top=10, undetermined=True,start_time:timedelta=
                          total_records:int=0, rangeDates: Dict={},
                          error_logs: Optional[any]=None,
                          db: StandardDatabase=None,
-                         user_id: str = "unknown"):
+                         user_id: str = "unknown",
+                         update_callback=None):
     # Compile results for all groups
     all_results = {
         "index": csmf(iv5out, top=top, age=None, sex=None).index.tolist(),
@@ -564,7 +589,9 @@ def compile_ccva_results(iv5out, top=10, undetermined=True,start_time:timedelta=
     db.collection(db_collections.CCVA_GRAPH_RESULTS).insert(ccva_results)
     db.collection(db_collections.CCVA_ERRORS).insert(error_logs, overwrite=True, overwrite_mode="update")
     
-    call_update_callback(lambda p: websocket_broadcast(task_id, p), {"progress": 100, "message": "Finish CCVA analysis...", "status": 'completed', "data": ccva_results ,"elapsed_time": f"{(datetime.now() - start_time).seconds // 3600}:{(datetime.now() - start_time).seconds // 60 % 60}:{(datetime.now() - start_time).seconds % 60}", "task_id": task_id, "error": False})
+    # through the run's callback: a direct broadcast could be followed by a
+    # coalesced 'running' report still pending in its ProgressPublisher
+    call_update_callback(update_callback, {"progress": 100, "message": "Finish CCVA analysis...", "status": 'completed', "data": ccva_results ,"elapsed_time": f"{(datetime.now() - start_time).seconds // 3600}:{(datetime.now() - start_time).seconds // 60 % 60}:{(datetime.now() - start_time).seconds % 60}", "task_id": task_id, "error": False})
 
     return ccva_results
 
@@ -669,101 +696,18 @@ async def fetch_ccva_results_and_errors(db: StandardDatabase, task_id: str):
         return None
     
 async def getVADataAndMergeWithResults(db: StandardDatabase, results: list):
-    # save results to csv
-    df = pd.DataFrame(results)
-    df.to_csv('results.csv')
-    from app.settings.services.odk_configs import fetch_odk_config
-
-    # Fetch configurations asynchronously
-    config = await fetch_odk_config(db, True)
-
-    # Extract field mappings from the configuration
-    is_adult = config.field_mapping.is_adult
-    is_child = config.field_mapping.is_child
-    is_neonate = config.field_mapping.is_neonate
-    deceased_gender = config.field_mapping.deceased_gender
-    location_level1 = config.field_mapping.location_level1
-    location_level2 = config.field_mapping.location_level2
-    location_level3 = config.field_mapping.location_level3  # optional
-    location_level4 = config.field_mapping.location_level4  # optional
-    death_date = config.field_mapping.death_date or 'id10023'
-    submitted_date = config.field_mapping.submitted_date or 'today' or 'submissiondate'
-    interview_date = config.field_mapping.interview_date or 'id10012'
-    date = config.field_mapping.date
-    instance_id = config.field_mapping.instance_id or 'instanceid'
-    # results = [{key: result[key] for key in ['ID', 'CAUSE1', 'task_id']} for result in results]
-    # Extract all data UIDs for a batch query
-    data_uids = [result.get('ID') for result in results if result.get('ID') is not None]
-
-    # Return early if there are no valid data_uids
-    if not data_uids:
-        return results
-
-    # Define a batch AQL query for all data_uids at once
-    collection = db.collection(db_collections.VA_TABLE)
-    data_uids_str = ', '.join(f'"{uid}"' for uid in data_uids)
-    query = f"""
-FOR doc IN {collection.name}
-    FILTER doc.{instance_id} IN [{data_uids_str}]
-    LET age_group = 
-        (doc.age_group=="neonate" || TO_NUMBER(doc.{is_neonate}) == 1 || ((TO_NUMBER(doc.isneonatal1) == 1 || TO_NUMBER(doc.isneonatal2) == 1))) ? "neonate" :
-        (doc.age_group=="child" || TO_NUMBER(doc.{is_child}) == 1 || ((TO_NUMBER(doc.ischild1) == 1 || TO_NUMBER(doc.ischild2) == 1))) ? "child" :
-        (doc.age_group=="adult" || TO_NUMBER(doc.{is_adult}) == 1 || ((TO_NUMBER(doc.isadult1) == 1 || TO_NUMBER(doc.isadult2) == 1))) ? "adult" :
-        "Unknown"
-    RETURN {{
-        uid: doc.{instance_id},
-        gender: LOWER(doc.{deceased_gender}),
-        date: LOWER(doc.{date}),
-        age_group: age_group,
-        locationLevel1: LOWER(doc.{location_level1}),
-        locationLevel2: LOWER(doc.{location_level2}),
-        {f'locationLevel3: LOWER(doc.{location_level3}),' if location_level3 else ''}
-        {f'locationLevel4: LOWER(doc.{location_level4}),' if location_level4 else ''}
-        death_date: doc.{death_date},
-        submitted_date: doc.{submitted_date},
-        interview_date: doc.{interview_date},
-        reasoans:doc.id10476,
-        form_age_group:doc.age_group,
-        isneonatal:doc.isneonatal,
-        ischild:doc.ischild,
-        isadult:doc.isadult
-
-    }}
-    """
-    # print(query)
-    # Execute the query with caching
-    # Execute the query with caching
-    def execute_va_data_query():
-        cursor = db.aql.execute(query, cache=True)
-        return {doc['uid']: doc for doc in cursor}
-
-    # Convert the cursor to a dictionary keyed by UID for easy lookup
-    va_data_map = await run_in_threadpool(execute_va_data_query)
-    
-    # print(va_data_map)
-
-    # Merge the fetched data with the original results
-    updated_results = []
-    for result in results:
-        data_uid = result.get('ID')
-        if data_uid in va_data_map:
-            # Create a new dictionary by merging the original and the update
-            merged_result = {**result, **va_data_map[data_uid]}
-            updated_results.append(merged_result)
-        else:
-            updated_results.append(result)  # If no update, keep the original
-
+    """Adds the fields of each result's VA record (batched, parameterised lookups, see merge_va_data)"""
+    return await merge_va_data(db, results)
 
-    return updated_results
 
 
+from contextlib import aclosing
 
-from app.ccva.services.ccva_upload import insert_all_csv_data
-from app.ccva.services.ccva_services import get_record_to_run_ccva
-import io
+from app.ccva.services.ccva_upload import prepare_upload_chunk, validate_upload_columns
+from app.shared.utils.csv_stream import iter_csv_chunks, read_csv_header
 
 async def process_upload_and_run_ccva(
-    file_contents: bytes,
+    file_path: str,
     unique_id: str,
     current_user: dict,
     start_date: Optional[date],
@@ -808,36 +752,26 @@ async def process_upload_and_run_ccva(
         await TaskProgressService.save_progress(db, task_id, progress_data)
 
     try:
-        # Phase 1: Reading CSV
+        # Phase 1: Reading CSV (spooled to disk by the route), chunk by chunk
         await broadcast_progress(1, "Reading CSV file...", status="running")
-        
-        df = pd.read_csv(io.StringIO(file_contents.decode('utf-8')), low_memory=False)
-        
-        # Validations
-        if 'instanceID' in df.columns:
-            df['instanceid'] = df['instanceID']
-            df.drop(columns=['instanceID'], inplace=True)
-            
-        if 'instanceid' not in df.columns:
-            raise Exception("Instance ID (instanceid) not found in the uploaded CSV")
-            
-        if unique_id not in df.columns:
-             raise Exception("Unique ID not found in the uploaded CSV")
+
+        validate_upload_columns(await asyncio.to_thread(read_csv_header, file_path), unique_id)
+
+        chunks = []
+        async with aclosing(iter_csv_chunks(file_path, get_settings().CSV_UPLOAD_CHUNK_ROWS, nrows=top)) as csv_chunks:
+            async for chunk, fraction in csv_chunks:
+                chunks.append(chunk)
+                rows_read = sum(len(frame) for frame in chunks)
+                await broadcast_progress(1 + round(fraction * 3, 1), f"Reading CSV file... {rows_read:,} rows", status="running")
 
         # Phase 2: Processing Data Frame
         await broadcast_progress(5, "Processing CSV data...", status="running")
-        
-        df['vman_data_source'] = 'uploaded_csv'
-        df['vman_data_name'] = 't'
-        df['__id'] = df[unique_id]
-        df['version_number'] = '1.0'
-        df['trackid'] = task_id
-
-        recordsDF = df.to_dict(orient='records')
-        if top:
-            recordsDF = recordsDF[:top]
-            
-        total_csv_records = len(recordsDF)
+
+        df = await asyncio.to_thread(
+            lambda: prepare_upload_chunk(pd.concat(chunks, ignore_index=True, sort=False), unique_id, task_id)
+            if chunks else pd.DataFrame())
+        chunks.clear()
+        total_csv_records = len(df)
 
         if total_csv_records == 0:
              raise Exception("Uploaded CSV is empty")
@@ -849,16 +783,13 @@ async def process_upload_and_run_ccva(
         # Phase 4: Fetching for CCVA
         await broadcast_progress(10, "Preparing data for analysis...", status="running")
         # records = await get_record_to_run_ccva(current_user, db, 'uploaded_csv', task_id, task_results, start_date, end_date, date_type=date_type)
-        records = ResponseMainModel(data=recordsDF, message="Data prepared from CSV")
-        if not records.data:
-            raise Exception("No records found after insertion")
 
         # Phase 5: Run CCVA
         # run_ccva will take over progress updates (starting typically at progress=1 or similar)
         # We can pass an initial state if run_ccva supports it, effectively it starts its own progress flow.
         await run_ccva(
             db, 
-            records, 
+            None, 
             task_id, 
             task_results, 
             start_date, 
@@ -866,9 +797,12 @@ async def process_upload_and_run_ccva(
             malaria_status, 
             hiv_status, 
             ccva_algorithm, 
-            user_id
+            user_id,
+            dataframe=df,
         )
 
     except Exception as e:
         print(f"Error in process_upload_and_run_ccva: {e}")
-        await broadcast_progress(0, str(e), status="error", error=True)
\ No newline at end of file
+        await broadcast_progress(0, str(e), status="error", error=True)
+    finally:
+        os.remove(file_path)
\ No newline at end of file
@@ -1,6 +1,18 @@
-from typing import List
+import asyncio
+import json
+import time
+from contextlib import aclosing
+from typing import Awaitable, Callable, List, Optional
+
+import pandas as pd
+from arango.database import StandardDatabase
 
 from app.odk.services.data_download import insert_many_data_to_arangodb
+from app.shared.configs.settings import get_settings
+from app.shared.services.va_rollups import VARollupService
+from app.shared.services.va_stats_service import VAStatsService
+from app.shared.utils.csv_stream import iter_csv_chunks
+from app.utilits.logger import app_logger
 
 
 async def insert_all_csv_data(data: List[dict]):
@@ -10,3 +22,86 @@ async def insert_all_csv_data(data: List[dict]):
 
     except Exception as e:
         raise e
+
+
+def validate_upload_columns(columns: List[str], unique_id: str):
+    """Raises ValueError when an uploaded CSV misses the instance ID or the unique ID column"""
+    if 'instanceid' not in columns and 'instanceID' not in columns:
+        raise ValueError("Instance ID (instanceid) not found in the uploaded CSV")
+    if unique_id not in columns:
+        raise ValueError("Unique ID not found in the uploaded CSV")
+
+
+def prepare_upload_chunk(df: pd.DataFrame, unique_id: str, task_id: str, lower_columns: bool = False) -> pd.DataFrame:
+    """Adds the VMan fields to (a chunk of) an uploaded CSV"""
+    if 'instanceID' in df.columns:
+        df['instanceid'] = df['instanceID']
+        df.drop(columns=['instanceID'], inplace=True)
+    df['vman_data_source'] = 'uploaded_csv'
+    df['vman_data_name'] = 't'
+    df['__id'] = df[unique_id]
+    df['version_number'] = '1.0'
+    df['trackid'] = task_id
+    if lower_columns:
+        df.columns = map(str.lower, df.columns)
+    return df
+
+
+async def broadcast_upload_progress(progress_data: dict):
+    """Publishes upload progress on the task's websocket channel"""
+    try:
+        from app.main import websocket__manager
+
+        await websocket__manager.broadcast(progress_data["task_id"], json.dumps(progress_data, default=str))
+    except Exception as e:
+        app_logger.warning(f"Failed to broadcast upload progress: {e}")
+
+
+async def ingest_csv_upload(
+    db: StandardDatabase,
+    path: str,
+    unique_id: str,
+    task_id: str,
+    chunk_rows: Optional[int] = None,
+    progress_callback: Optional[Callable[[dict], Awaitable]] = None,
+) -> int:
+    """
+    Saves a spooled CSV upload (plain, gzip or ZIP) into the VA records, one
+    chunk of rows at a time: the next chunk is parsed while the previous one
+    is saved, and at most two chunks are held in memory.
+
+    Progress ({"progress", "records_processed", ...}) is sent to
+    progress_callback after every chunk. Returns the number of records saved.
+    """
+    chunk_rows = chunk_rows or get_settings().CSV_UPLOAD_CHUNK_ROWS
+    start_time = time.time()
+    records_saved = 0
+
+    async with aclosing(iter_csv_chunks(path, chunk_rows)) as chunks:
+        async for df, fraction in chunks:
+            records = await asyncio.to_thread(
+                lambda: prepare_upload_chunk(df, unique_id, task_id, lower_columns=True).to_dict(orient='records'))
+            await insert_many_data_to_arangodb(records, update_stats=False)
+            records_saved += len(records)
+            if progress_callback:
+                await progress_callback({
+                    "task_id": task_id,
+                    "progress": round(fraction * 100, 1),
+                    "records_processed": records_saved,
+                    "elapsed_time": time.time() - start_time,
+                    "status": "running",
+                    "message": f"Uploading... {records_saved:,} records saved",
+                })
+
+    await VAStatsService.reconcile(db)
+    await VARollupService.rebuild(db)
+    if progress_callback:
+        await progress_callback({
+            "task_id": task_id,
+            "progress": 100,
+            "records_processed": records_saved,
+            "elapsed_time": time.time() - start_time,
+            "status": "completed",
+            "message": f"Upload completed: {records_saved:,} records",
+        })
+    return records_saved
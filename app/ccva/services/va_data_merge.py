@@ -0,0 +1,108 @@
+"""
+Merge of CCVA results with the VA record fields shown alongside them.
+
+The result IDs are passed to one parameterised AQL query (the same query
+text, so Arango plans it once) in batches of MERGE_BATCH_SIZE, which run in
+parallel (MERGE_CONCURRENCY at a time). Records are read by primary key (see
+va_record_lookup) and only the merged fields are returned.
+"""
+import asyncio
+from typing import Dict, List, Optional
+
+from arango.database import StandardDatabase
+from fastapi.concurrency import run_in_threadpool
+
+from app.settings.models.settings import SettingsConfigData
+from app.shared.services.va_record_keys import va_record_lookup
+
+MERGE_BATCH_SIZE = 5000
+MERGE_CONCURRENCY = 4
+
+
+def va_merge_query(config: SettingsConfigData, lookup: str, location_levels: int = 4) -> str:
+    """AQL returning the merged fields of the records found by `lookup` (see va_record_lookup)"""
+    mapping = config.field_mapping
+    is_adult = mapping.is_adult
+    is_child = mapping.is_child
+    is_neonate = mapping.is_neonate
+    death_date = mapping.death_date or 'id10023'
+    submitted_date = mapping.submitted_date or 'today'
+    interview_date = mapping.interview_date or 'id10012'
+    instance_id = mapping.instance_id or 'instanceid'
+    locations = [mapping.location_level1, mapping.location_level2, mapping.location_level3, mapping.location_level4]
+    location_fields = ''.join(
+        f"locationLevel{level}: LOWER(doc.{field}),\n        "
+        for level, field in enumerate(locations[:location_levels], start=1) if field
+    )
+    return f"""
+{lookup}
+    LET age_group =
+        (doc.age_group=="neonate" || TO_NUMBER(doc.{is_neonate}) == 1 || ((TO_NUMBER(doc.isneonatal1) == 1 || TO_NUMBER(doc.isneonatal2) == 1))) ? "neonate" :
+        (doc.age_group=="child" || TO_NUMBER(doc.{is_child}) == 1 || ((TO_NUMBER(doc.ischild1) == 1 || TO_NUMBER(doc.ischild2) == 1))) ? "child" :
+        (doc.age_group=="adult" || TO_NUMBER(doc.{is_adult}) == 1 || ((TO_NUMBER(doc.isadult1) == 1 || TO_NUMBER(doc.isadult2) == 1))) ? "adult" :
+        "Unknown"
+    RETURN {{
+        uid: doc.{instance_id},
+        gender: LOWER(doc.{mapping.deceased_gender}),
+        date: LOWER(doc.{mapping.date}),
+        age_group: age_group,
+        {location_fields}death_date: doc.{death_date},
+        submitted_date: doc.{submitted_date},
+        interview_date: doc.{interview_date},
+        reasoans:doc.id10476,
+        form_age_group:doc.age_group,
+        isneonatal:doc.isneonatal,
+        ischild:doc.ischild,
+        isadult:doc.isadult
+    }}
+    """
+
+
+async def fetch_va_merge_fields(
+    db: StandardDatabase,
+    uids: List,
+    config: SettingsConfigData,
+    location_levels: int = 4,
+    batch_size: int = MERGE_BATCH_SIZE,
+    concurrency: int = MERGE_CONCURRENCY,
+) -> Dict:
+    """Merged fields of the VA records with these instance IDs, by instance ID"""
+    instance_id = config.field_mapping.instance_id or 'instanceid'
+    uids = list(dict.fromkeys(uid for uid in uids if uid is not None))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    def execute_batch(batch):
+        lookup, bind_vars = va_record_lookup(batch, instance_id)
+        query = va_merge_query(config, lookup, location_levels)
+        return list(db.aql.execute(query, bind_vars=bind_vars, cache=True, batch_size=len(batch) or 1))
+
+    async def fetch_batch(batch):
+        async with semaphore:
+            return await run_in_threadpool(execute_batch, batch)
+
+    batches = await asyncio.gather(*(
+        fetch_batch(uids[start:start + batch_size]) for start in range(0, len(uids), batch_size)
+    ))
+    return {doc['uid']: doc for batch in batches for doc in batch}
+
+
+async def merge_va_data(
+    db: StandardDatabase,
+    results: List[dict],
+    config: Optional[SettingsConfigData] = None,
+    location_levels: int = 4,
+    **kwargs,
+) -> List[dict]:
+    """The CCVA results (keyed by 'ID') with the fields of their VA record added"""
+    data_uids = [result.get('ID') for result in results if result.get('ID') is not None]
+    if not data_uids:
+        return results
+    if config is None:
+        from app.settings.services.odk_configs import fetch_odk_config
+        config = await fetch_odk_config(db, True)
+
+    va_data_map = await fetch_va_merge_fields(db, data_uids, config, location_levels, **kwargs)
+    return [
+        {**result, **va_data_map[result.get('ID')]} if result.get('ID') in va_data_map else result
+        for result in results
+    ]
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+"""
+interva.engine
+-------------------
+
+This module contains the Bayesian update used by InterVA5 to turn the
+symptom indicators of a VA record into cause propensities.
+
+``bayes_update`` is the record-by-record reference implementation, and
+``bayes_update_batch`` runs the same update for a whole block of records at
+once.  The batch version walks the symptoms (not the records) and applies
+each symptom's likelihood row to every record that reports it, so the
+sequence of floating point operations for any single record is exactly the
+one used by the reference implementation and the results are identical.
+"""
+
+from __future__ import annotations
+
+from numpy import copy, empty, ndarray, nansum, nonzero, where
+
+# Cause blocks that are renormalised after every symptom: pregnancy status,
+# causes of death and circumstances of mortality.
+CAUSE_BLOCKS = ((0, 3), (3, 64), (64, 70))
+
+
+def bayes_update(prior: ndarray, likelihood: ndarray,
+                 new_input: ndarray) -> ndarray:
+    """Run the InterVA5 Bayesian update for a single VA record.
+
+    :param prior: prior propensities of the causes (``Sys_Prior[17:]``)
+    :type prior: numpy.ndarray
+    :param likelihood: numeric SCI matrix with one row per indicator and one
+    column per cause (``probbaseV5[:, 17:]``)
+    :type likelihood: numpy.ndarray
+    :param new_input: 0/1 vector flagging the indicators with substantive
+    values (the first element, the ID, is ignored)
+    :type new_input: numpy.ndarray
+    :return: cause propensities after all indicators have been applied
+    :rtype: numpy.ndarray
+    """
+
+    prob = copy(prior)
+    temp = where(new_input[1:] == 1)[0]
+    for temp_sub in temp:
+        prob = prob * likelihood[temp_sub + 1, :]
+        for lo, hi in CAUSE_BLOCKS:
+            if nansum(prob[lo:hi]) > 0:
+                prob[lo:hi] = prob[lo:hi] / nansum(prob[lo:hi])
+    return prob
+
+
+def bayes_update_batch(prior: ndarray, likelihood: ndarray,
+                       new_inputs: ndarray,
+                       chunk_size: int = 5000) -> ndarray:
+    """Run the InterVA5 Bayesian update for many VA records at once.
+
+    :param prior: prior propensities of the causes (``Sys_Prior[17:]``)
+    :type prior: numpy.ndarray
+    :param likelihood: numeric SCI matrix with one row per indicator and one
+    column per cause (``probbaseV5[:, 17:]``)
+    :type likelihood: numpy.ndarray
+    :param new_inputs: 2-D 0/1 matrix (records x indicators) flagging the
+    indicators with substantive values (the first column, the ID, is ignored)
+    :type new_inputs: numpy.ndarray
+    :param chunk_size: number of records updated together, which bounds the
+    size of the temporary arrays
+    :type chunk_size: int
+    :return: matrix (records x causes) of cause propensities
+    :rtype: numpy.ndarray
+    """
+
+    n_records = new_inputs.shape[0]
+    probs = empty((n_records, prior.shape[0]))
+    for start in range(0, n_records, max(1, chunk_size)):
+        stop = min(start + chunk_size, n_records)
+        probs[start:stop] = _bayes_update_chunk(prior, likelihood,
+                                                new_inputs[start:stop])
+    return probs
+
+
+def _bayes_update_chunk(prior: ndarray, likelihood: ndarray,
+                        new_inputs: ndarray) -> ndarray:
+    """Apply the update to one block of records, one indicator at a time."""
+
+    prob = empty((new_inputs.shape[0], prior.shape[0]))
+    prob[:] = prior
+    for s in range(1, new_inputs.shape[1]):
+        rows = nonzero(new_inputs[:, s] == 1)[0]
+        if len(rows) == 0:
+            continue
+        sub = prob[rows] * likelihood[s, :]
+        for lo, hi in CAUSE_BLOCKS:
+            totals = nansum(sub[:, lo:hi], axis=1)
+            positive = totals > 0
+            sub[positive, lo:hi] = (sub[positive, lo:hi] /
+                                    totals[positive, None])
+        prob[rows] = sub
+    return prob
@@ -20,7 +20,6 @@ if TYPE_CHECKING:
 
 import datetime
 import warnings
-from csv import writer
 from decimal import Decimal
 from io import BytesIO
 from logging import INFO, FileHandler, getLogger
@@ -29,12 +28,28 @@ from os import chdir, getcwd, mkdir, path
 # from pkgutil import get_data
 
 from app.ccva.utilits.interva.data.causetext import CAUSETEXTV5
-from app.ccva.utilits.interva.utils import _get_dem_groups
-from numpy import (argsort, array, concatenate, copy, delete, nan, nanmax,
-                   nansum, ndarray, where)
-from pandas import (DataFrame, Index, Series, isna, read_csv, read_excel,
-                    set_option, to_numeric)
-from app.ccva.utilits.vacheck.datacheck5 import datacheck5
+from app.ccva.utilits.interva.engine import bayes_update, bayes_update_batch
+from app.ccva.utilits.interva.probbase import (CompiledProbbase,
+                                               compile_probbase,
+                                               get_compiled_probbase,
+                                               read_probbase)
+from app.ccva.utilits.interva.sinks import CSVResultSink
+from app.ccva.utilits.interva.utils import (_get_dem_groups,
+                                            _get_dem_groups_many)
+from numpy import (argsort, array, concatenate, copy, delete, isnan, nan,
+                   nanmax, nansum, ndarray, where, zeros)
+from pandas import DataFrame, Index, Series, isna, read_csv, set_option
+from app.ccva.utilits.vacheck.datacheck5 import datacheck5, datacheck5_many
+
+# Number of valid records checked together by the batch engine.
+BATCH_SIZE = 2000
+
+# Section headers of the error log (interva.parallel merges shard logs on them).
+LOG_INCOMPLETE = ("\nThe following records are incomplete and "
+                  "excluded from further processing:\n")
+LOG_DISCREPANCIES = ("\nThe following data discrepancies were identified "
+                     "and handled:\n")
+LOG_SECOND_PASS = "\nSecond pass\n"
 
 
 class InterVA5:
@@ -81,6 +96,16 @@ class InterVA5:
     :type return_checked_data: boolean
     :param openva_app: instance of the openva_app (used for updating progress
     bar, which requires the PyQt5 package to be installed).
+    :param engine: how the data checks and the Bayesian update are computed.
+    Possible values are "batch": valid records are processed together with
+    NumPy matrix operations (default), or "reference": the original
+    record-by-record computation. Both give identical results.
+    :type engine: string
+    :param sinks: destinations of the VA5 results (see interva.sinks), which
+    replace the csv output written when write = True (the error log is still
+    written).  If None, the results are written to filename.csv when write is
+    True.
+    :type sinks: list of interva.sinks.ResultSink
     """
 
     def __init__(self,
@@ -99,7 +124,9 @@ class InterVA5:
                  openva_app: Optional['PyQt5.QtWidgets.QWidget'] = None,
                  gui_ctrl: dict = {"break": False},
                  start_time: datetime.timedelta = None,
-                 update_callback: Optional[Callable] = None):  # Correctly define update_callback
+                 update_callback: Optional[Callable] = None,  # Correctly define update_callback
+                 engine: str = "batch",
+                 sinks: Optional[list] = None):
 
         self.va_input = va_input
         self.task_id = task_id
@@ -120,6 +147,8 @@ class InterVA5:
         self.dem_group: DataFrame = DataFrame({})
         self.update_callback = update_callback  # Store the callback for later use in the run method
         self.start_time = start_time
+        self.engine = engine
+        self.sinks = sinks
       
       
         
@@ -142,7 +171,8 @@ class InterVA5:
                f"sci = " + sci_msg +
                f"return_checked_data = {self.return_checked_data}\n"
                f"openva_app = {self.openva_app}\n"
-               f"gui_ctrl = {self.gui_ctrl}\n" + ")")
+               f"gui_ctrl = {self.gui_ctrl}\n"
+               f"engine = {self.engine}\n" + ")")
         return msg
 
     def __str__(self):
@@ -199,31 +229,176 @@ class InterVA5:
                 cause1, lik1, cause2, lik2, cause3, lik3, indet,
                 str(comcat), comnum, wholeprob]
 
-    @staticmethod
-    def _save_va5(x: list, filename: str, write: bool) -> None:
-        """ Saves the VA5 result to csv, without propensities. """
+    def _run_batch(self, pending: list, compiled_pb: CompiledProbbase,
+                   va_input_names: Index, id_inputs: Series,
+                   batch: dict) -> None:
+        """ Runs the data checks for a block of valid records at once. """
+
+        S = len(va_input_names)
+        va_values = array([x for _, _, x in pending], dtype=object)
+        va_values[:, 0] = [index_current for _, index_current, _ in pending]
+        va_data = DataFrame(va_values, columns=va_input_names)
+        tmp = datacheck5_many(va_input=va_data,
+                              probbase=compiled_pb.datacheck_table,
+                              rules=compiled_pb.datacheck_rules)
+        output = tmp["output"]
+
+        batch["index"].extend((i, index_current)
+                              for i, index_current, _ in pending)
+        batch["first_pass"].extend(tmp["first_pass"])
+        batch["second_pass"].extend(tmp["second_pass"])
+        batch["dem_group"].extend(_get_dem_groups_many(output))
+        if self.return_checked_data:
+            output_values = output.to_numpy()
+            batch["checked_data"].extend(
+                [id_inputs[i]] + list(output_values[row, 1:S])
+                for row, (i, _, _) in enumerate(pending))
+
+        checked = output.iloc[:, 1:].to_numpy(dtype=float)
+        new_input = zeros((len(pending), S), dtype=int)
+        new_input[:, 1:] = checked == compiled_pb.subst_vector[1:]
+        answered = ~isnan(checked)
+        reproductive = (answered[:, 3] & answered[:, 15:18].any(axis=1))
+        batch["new_input"].append(new_input)
+        batch["reproductive"].append(reproductive.astype(int))
+
+    def _interpret_prob(self, index_current: str, prob: ndarray,
+                        reproductiveAge: int) -> list:
+        """ Returns the VA5 result for the cause propensities of a record. """
+
+        preg_state = " "
+        lik_preg = " "
+        prob_names = self.causetextV5.iloc[:, 0].copy()
+        prob_A = copy(prob[0:3])
+        prob_B = copy(prob[3:64])
+        prob_C = copy(prob[64:70])
+
+        # Determine Preg_State and Likelihood
+        if nansum(prob_A) == 0 or reproductiveAge == 0:
+            preg_state = "n/a"
+            lik_preg = " "
+        if nanmax(prob_A) < 0.1 and reproductiveAge == 1:
+            preg_state = "indeterminate"
+            lik_preg = " "
+        if where(prob_A == nanmax(prob_A))[0][0] == 0 and \
+                prob_A[0] >= 0.1 and reproductiveAge == 1:
+            preg_state = "Not pregnant or recently delivered"
+            lik_preg = round(prob_A[0]/nansum(prob_A) * 100)
+        if where(prob_A == nanmax(prob_A))[0][0] == 1 and \
+                prob_A[1] >= 0.1 and reproductiveAge == 1:
+            preg_state = "Pregnancy ended within 6 weeks of death"
+            lik_preg = round(prob_A[1]/nansum(prob_A) * 100)
+        if where(prob_A == nanmax(prob_A))[0][0] == 2 and \
+                prob_A[2] >= 0.1 and reproductiveAge == 1:
+            preg_state = "Pregnant at death"
+            lik_preg = round(prob_A[2]/nansum(prob_A) * 100)
+
+        # Determine the output of InterVA
+        prob_temp = copy(prob_B)
+        prob_temp_names = prob_names.iloc[3:64].copy()
+        top3 = []
+        cause1 = lik1 = cause2 = lik2 = cause3 = lik3 = None
+        indet = 0
+        if nanmax(prob_temp) < 0.4:
+            cause1 = lik1 = cause2 = lik2 = cause3 = lik3 = " "
+            indet = 100
+            cause1 = "Undeterminant"        # modified by Isaac, Dec 13th, 2024
+        if nanmax(prob_temp) >= 0.4:
+            max1_loc = where(prob_temp == nanmax(prob_temp))[0][0]
+            lik1 = round(nanmax(prob_temp) * 100)
+            cause1 = prob_temp_names.iloc[max1_loc]
+            prob_temp = delete(prob_temp, max1_loc)
+            prob_temp_names.drop(prob_temp_names.index
+                                 [max1_loc], inplace=True)
+            top3.append(lik1)
+
+            max2_loc = where(prob_temp == nanmax(prob_temp))[0][0]
+            lik2 = round(nanmax(prob_temp) * 100)
+            cause2 = prob_temp_names.iloc[max2_loc]
+            if nanmax(prob_temp) < 0.5 * nanmax(prob_B):
+                lik2 = cause2 = " "
+            prob_temp = delete(prob_temp, max2_loc)
+            prob_temp_names.drop(prob_temp_names.index[max2_loc],
+                                 inplace=True)
+            top3.append(lik2)
+
+            max3_loc = where(prob_temp == nanmax(prob_temp))[0][0]
+            lik3 = round(nanmax(prob_temp) * 100)
+            cause3 = prob_temp_names.iloc[max3_loc]
+            if nanmax(prob_temp) < 0.5 * nanmax(prob_B):
+                lik3 = cause3 = " "
+            top3.append(lik3)
+            top3 = array([int(x) if x != " " else 0 for x in top3])
+            indet = round(100 - nansum(top3))
+
+        # Determine the Circumstances of Mortality CATegory (COMCAT)
+        # and probability
+        prob_C_names = prob_names[64:70]
+        comcat = ""
+        comnum = None
+        if nansum(prob_C) > 0:
+            prob_C = prob_C / nansum(prob_C)
+        if nanmax(prob_C) < 0.5:
+            comcat = "Multiple"
+            comnum = " "
+        if nanmax(prob_C) >= 0.5:
+            comcat = prob_C_names.iloc[where(prob_C == nanmax(prob_C))[0][0]]
+            comnum = round(nanmax(prob_C) * 100)
+
+        combined_prob = Series(concatenate((prob_A, prob_B, prob_C)),
+                               index=prob_names)
+        return InterVA5._va5(index_current, self.malaria, self.hiv,
+                             preg_state, lik_preg, cause1, lik1,
+                             cause2, lik2, cause3, lik3, indet,
+                             comcat, comnum, wholeprob=combined_prob)
+
+    def _load_causetext(self) -> None:
+        """ Sets the cause names (with group codes if requested). """
 
-        if not write:
-            return ()
-        del x[14]
-        filename = filename + ".csv"
-        with open(filename, 'a', newline="") as csvfile:
-            csv_writer = writer(csvfile)
-            csv_writer.writerow(x)
+        causetextV5_horizontal = DataFrame(CAUSETEXTV5)
+        self.causetextV5 = causetextV5_horizontal.transpose()
+        if self.groupcode:
+            # adding groupcode to cause
+            for i in range(3, 64):
+                cause = str(self.causetextV5.iloc[i, 0])
+                code = str(self.causetextV5.iloc[i, 1])
+                self.causetextV5.iloc[i, 1] = code + " " + cause
+            self.causetextV5.drop(self.causetextV5.columns[0],
+                                  axis=1, inplace=True)
+        else:
+            self.causetextV5.drop(self.causetextV5.columns[1],
+                                  axis=1, inplace=True)
 
-    @staticmethod
-    def _save_va5_prob(x: list, filename: str, write: bool) -> None:
-        """ Saves the VA5 result to csv, with propensities. """
+    def _result_header(self) -> list:
+        """ Returns the header row of the csv output. """
 
-        if not write:
-            return ()
-        prob = x.pop(14)
-        x = array(x)
-        filename = filename + ".csv"
-        x = concatenate((x, prob))
-        with open(filename, "a", newline="") as csvfile:
-            csv_writer = writer(csvfile)
-            csv_writer.writerow(x)
+        header = ["ID", "MALPREV", "HIVPREV", "PREGSTAT", "PREGLIK",
+                  "CAUSE1", "LIK1", "CAUSE2", "LIK2", "CAUSE3", "LIK3",
+                  "INDET", "COMCAT", "COMNUM"]
+        if self.output == "extended":
+            header = header + list(self.causetextV5.iloc[:, 0])
+        return header
+
+    def _result_sinks(self) -> list:
+        """ Returns the sinks receiving the VA5 results. """
+
+        if self.sinks is not None:
+            return list(self.sinks)
+        if self.write:
+            return [CSVResultSink(path.join(self.directory,
+                                            self.filename + ".csv"),
+                                  append=self.append)]
+        return []
+
+    def _save_result(self, va_result: list, sinks: list) -> None:
+        """ Saves the VA5 result in the configured output format. """
+
+        row = va_result[:14]
+        if self.output == "extended":
+            # add the propensities
+            row.extend(va_result[14])
+        for sink in sinks:
+            sink.write(row)
 
     def run(self) -> None:
         """Assign causes of death to valid VA records.
@@ -255,14 +430,13 @@ class InterVA5:
             self.directory = getcwd()
         if not path.isdir(self.directory):
             mkdir(self.directory)
+        sinks = self._result_sinks()
         global_dir = getcwd()
         if global_dir != self.directory:
             chdir(self.directory)
 
-        probbaseV5 = None
         if self.sci is None:
-            probbase_df = get_probbase(version="19").copy()
-            probbaseV5 = probbase_df.to_numpy()
+            compiled_pb = get_compiled_probbase(version="19")
         if self.sci is not None:
             valid_sci = True
             if not isinstance(self.sci, DataFrame) and \
@@ -274,29 +448,11 @@ class InterVA5:
                 raise IOError(
                     "Error: Invalid SCI (must be Pandas DataFrame or "
                     "Numpy ndarray with 354 rows and 87 columns).")
-            if isinstance(self.sci, DataFrame):
-                probbase_df = self.sci.copy()
-                self.sci = self.sci.to_numpy()
-            probbaseV5 = self.sci
+            compiled_pb = compile_probbase(self.sci)
+        pb_for_datacheck = compiled_pb.datacheck_table
 
-        pb_for_datacheck = probbase_df.fillna(".")
-        pb_for_datacheck["qdesc"] = ""
-        pb_for_datacheck = pb_for_datacheck.to_numpy(dtype=str)
-
-        self.probbaseV5Version = probbaseV5[0, 2]
-        causetextV5_horizontal = DataFrame(CAUSETEXTV5)
-        self.causetextV5 = causetextV5_horizontal.transpose()
-        if self.groupcode:
-            # adding groupcode to cause
-            for i in range(3, 64):
-                cause = str(self.causetextV5.iloc[i, 0])
-                code = str(self.causetextV5.iloc[i, 1])
-                self.causetextV5.iloc[i, 1] = code + " " + cause
-            self.causetextV5.drop(self.causetextV5.columns[0],
-                                  axis=1, inplace=True)
-        else:
-            self.causetextV5.drop(self.causetextV5.columns[1],
-                                  axis=1, inplace=True)
+        self.probbaseV5Version = compiled_pb.version_label
+        self._load_causetext()
         logger = None
         now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
@@ -321,7 +477,7 @@ class InterVA5:
             raise IOError("error: no data input")
         N = va_data.shape[0]
         S = va_data.shape[1]
-        if S != probbaseV5.shape[0]:
+        if S != compiled_pb.likelihood.shape[0]:
             raise IOError(
                 "error: invalid data input format. Number of values incorrect")
         if va_input_names[S-1].lower() != "i459o":
@@ -343,26 +499,7 @@ class InterVA5:
                 "If the change is undesirable, please change in the input "
                 "to match standard InterVA5 input format.")
             va_input_names = valabels
-        pb_ncol = probbaseV5.shape[1]
-        probbaseV5[:, 17:pb_ncol][probbaseV5[:, 17:pb_ncol] == "I"] = 1
-        probbaseV5[:, 17:pb_ncol][probbaseV5[:, 17:pb_ncol] == "A+"] = 0.8
-        probbaseV5[:, 17:pb_ncol][probbaseV5[:, 17:pb_ncol] == "A"] = 0.5
-        probbaseV5[:, 17:pb_ncol][probbaseV5[:, 17:pb_ncol] == "A-"] = 0.2
-        probbaseV5[:, 17:pb_ncol][probbaseV5[:, 17:pb_ncol] == "B+"] = 0.1
-        probbaseV5[:, 17:pb_ncol][probbaseV5[:, 17:pb_ncol] == "B"] = 0.05
-        probbaseV5[:, 17:pb_ncol][probbaseV5[:, 17:pb_ncol] == "B-"] = 0.02
-        probbaseV5[:, 17:pb_ncol][probbaseV5[:, 17:pb_ncol] == "B -"] = 0.02
-        probbaseV5[:, 17:pb_ncol][probbaseV5[:, 17:pb_ncol] == "C+"] = 0.01
-        probbaseV5[:, 17:pb_ncol][probbaseV5[:, 17:pb_ncol] == "C"] = 0.005
-        probbaseV5[:, 17:pb_ncol][probbaseV5[:, 17:pb_ncol] == "C-"] = 0.002
-        probbaseV5[:, 17:pb_ncol][probbaseV5[:, 17:pb_ncol] == "D+"] = 0.001
-        probbaseV5[:, 17:pb_ncol][probbaseV5[:, 17:pb_ncol] == "D"] = 5e-04
-        probbaseV5[:, 17:pb_ncol][probbaseV5[:, 17:pb_ncol] == "D-"] = 1e-04
-        probbaseV5[:, 17:pb_ncol][probbaseV5[:, 17:pb_ncol] == "E"] = 1e-05
-        probbaseV5[:, 17:pb_ncol][probbaseV5[:, 17:pb_ncol] == "N"] = 0
-        probbaseV5[:, 17:pb_ncol][probbaseV5[:, 17:pb_ncol] == ""] = 0
-        probbaseV5[0, 0:17] = 0
-        Sys_Prior = copy(to_numeric(probbaseV5[0, :]))
+        Sys_Prior = copy(compiled_pb.prior)
         D = len(Sys_Prior)
         self.hiv = self.hiv.lower()
         self.malaria = self.malaria.lower()
@@ -385,25 +522,20 @@ class InterVA5:
         if self.malaria == "v":
             Sys_Prior[24] = 1e-05
             Sys_Prior[44] = 1e-05
+        if self.engine not in ["batch", "reference"]:
+            raise IOError("error: the engine should be one of the two: "
+                          "'batch', 'reference'")
 
         ID_list = [nan for _ in range(N)]
         VA_result = [[] for _ in range(N)]
-        if self.write and not self.append:
-            header = ["ID", "MALPREV", "HIVPREV", "PREGSTAT", "PREGLIK",
-                      "CAUSE1", "LIK1", "CAUSE2", "LIK2", "CAUSE3", "LIK3",
-                      "INDET", "COMCAT", "COMNUM"]
-            if self.output == "extended":
-                header = header + list(self.causetextV5.iloc[:, 0])
-            with open(self.filename + ".csv", "w", newline="") as write_obj:
-                csv_writer = writer(write_obj)
-                csv_writer.writerow(header)
+        for sink in sinks:
+            sink.open(self._result_header())
         nd = max(1, round(N/100))
         np = max(1, round(N/10))
 
         if self.write:
             # elapsed_time =f"{(datetime.datetime.now() - self.start_time).seconds // 3600}:{(datetime.datetime.now() - self.start_time).seconds // 60 % 60}:{(datetime.datetime.now() - self.start_time).seconds % 60}"
-            logger.info("\nThe following records are incomplete and "
-                        "excluded from further processing:\n")
+            logger.info(LOG_INCOMPLETE)
             if self.update_callback:
                 call_update_callback(self.update_callback, {"progress": 0,"message": "The following records are incomplete and excluded from further processing:","log": "The following records are incomplete and excluded from further processing:","elapsed_time": elapsed_time,"error": False, "total_records":self.va_input.shape[0]})
 
@@ -411,6 +543,13 @@ class InterVA5:
         second_pass = []
         list_checked_data = []
         list_dem_group = []
+        pending = []
+        batch = {"index": [], "first_pass": [], "second_pass": [],
+                 "dem_group": [], "checked_data": [], "new_input": [],
+                 "reproductive": []}
+
+        likelihood = compiled_pb.likelihood
+        subst_vector = compiled_pb.subst_vector
 
         # Log start of analysis
         if self.update_callback:
@@ -479,167 +618,90 @@ class InterVA5:
                     self.openva_app.emit(progress)
                 continue
 
-            input_current = Series(input_current, index=va_input_names)
-            tmp = datacheck5(va_input=input_current, va_id=index_current,
-                             probbase=pb_for_datacheck)
-
-            list_dem_group.append(_get_dem_groups(tmp["output"]))
-
-            if self.return_checked_data:
-                list_checked_data.append(
-                    [id_inputs[i]] + list(tmp["output"][1:S]))
-
-            input_current = copy(tmp["output"])
-            first_pass.append(tmp["first_pass"])
-            second_pass.append(tmp["second_pass"])
-
-            subst_vector = array([nan for _ in range(S)])
-            subst_vector[probbaseV5[:, 5] == "N"] = 0
-            subst_vector[probbaseV5[:, 5] == "Y"] = 1
-
-            new_input = array([0 for _ in range(S)])
-            for y in range(1, S):
-                if not isna(input_current[y]):
-                    if input_current[y] == subst_vector[y]:
-                        new_input[y] = 1
-
-            input_current[input_current == 0] = 1
-            input_current[0] = 0
-            input_current[isna(input_current)] = 0
-            reproductiveAge = 0
-            preg_state = " "
-            lik_preg = " "
-            if input_current[4] == 1 and (input_current[16:19].any() == 1):
-                reproductiveAge = 1
-            prob = copy(Sys_Prior[17:D])
-            temp = where(new_input[1:len(input_current)] == 1)[0]
-            for jj in range(len(temp)):
-                temp_sub = temp[jj]
-                for j in range(17, D):
-                    prob[j-17] = prob[j-17] * probbaseV5[temp_sub + 1, j]
-                if nansum(prob[0:3]) > 0:
-                    prob[0:3] = prob[0:3] / nansum(prob[0:3])
-                if nansum(prob[3:64]) > 0:
-                    prob[3:64] = prob[3:64] / nansum(prob[3:64])
-                if nansum(prob[64:70]) > 0:
-                    prob[64:70] = prob[64:70] / nansum(prob[64:70])
-
-            prob_names = self.causetextV5.iloc[:, 0].copy()
-            prob_A = copy(prob[0:3])
-            prob_B = copy(prob[3:64])
-            prob_C = copy(prob[64:70])
-
-            # Determine Preg_State and Likelihood
-            if nansum(prob_A) == 0 or reproductiveAge == 0:
-                preg_state = "n/a"
-                lik_preg = " "
-            if nanmax(prob_A) < 0.1 and reproductiveAge == 1:
-                preg_state = "indeterminate"
-                lik_preg = " "
-            if where(prob_A == nanmax(prob_A))[0][0] == 0 and \
-                    prob_A[0] >= 0.1 and reproductiveAge == 1:
-                preg_state = "Not pregnant or recently delivered"
-                lik_preg = round(prob_A[0]/nansum(prob_A) * 100)
-            if where(prob_A == nanmax(prob_A))[0][0] == 1 and \
-                    prob_A[1] >= 0.1 and reproductiveAge == 1:
-                preg_state = "Pregnancy ended within 6 weeks of death"
-                lik_preg = round(prob_A[1]/nansum(prob_A) * 100)
-            if where(prob_A == nanmax(prob_A))[0][0] == 2 and \
-                    prob_A[2] >= 0.1 and reproductiveAge == 1:
-                preg_state = "Pregnant at death"
-                lik_preg = round(prob_A[2]/nansum(prob_A) * 100)
-
-            # Determine the output of InterVA
-            prob_temp = copy(prob_B)
-            prob_temp_names = prob_names.iloc[3:64].copy()
-            top3 = []
-            cause1 = lik1 = cause2 = lik2 = cause3 = lik3 = None
-            indet = 0
-            if nanmax(prob_temp) < 0.4:
-                cause1 = lik1 = cause2 = lik2 = cause3 = lik3 = " "
-                indet = 100
-                cause1 = "Undeterminant"        # modified by Isaac, Dec 13th, 2024
-            if nanmax(prob_temp) >= 0.4:
-                max1_loc = where(prob_temp == nanmax(prob_temp))[0][0]
-                lik1 = round(nanmax(prob_temp) * 100)
-                cause1 = prob_temp_names.iloc[max1_loc]
-                prob_temp = delete(prob_temp, max1_loc)
-                prob_temp_names.drop(prob_temp_names.index
-                                     [max1_loc], inplace=True)
-                top3.append(lik1)
-
-                max2_loc = where(prob_temp == nanmax(prob_temp))[0][0]
-                lik2 = round(nanmax(prob_temp) * 100)
-                cause2 = prob_temp_names.iloc[max2_loc]
-                if nanmax(prob_temp) < 0.5 * nanmax(prob_B):
-                    lik2 = cause2 = " "
-                prob_temp = delete(prob_temp, max2_loc)
-                prob_temp_names.drop(prob_temp_names.index[max2_loc],
-                                     inplace=True)
-                top3.append(lik2)
-
-                max3_loc = where(prob_temp == nanmax(prob_temp))[0][0]
-                lik3 = round(nanmax(prob_temp) * 100)
-                cause3 = prob_temp_names.iloc[max3_loc]
-                if nanmax(prob_temp) < 0.5 * nanmax(prob_B):
-                    lik3 = cause3 = " "
-                top3.append(lik3)
-                top3 = array([int(x) if x != " " else 0 for x in top3])
-                indet = round(100 - nansum(top3))
-
-            # Determine the Circumstances of Mortality CATegory (COMCAT)
-            # and probability
-            prob_C_names = prob_names[64:70]
-            comcat = ""
-            comnum = None
-            if nansum(prob_C) > 0:
-                prob_C = prob_C / nansum(prob_C)
-            if nanmax(prob_C) < 0.5:
-                comcat = "Multiple"
-                comnum = " "
-            if nanmax(prob_C) >= 0.5:
-                comcat = prob_C_names.iloc[where(prob_C == nanmax(prob_C))[0][0]]
-                comnum = round(nanmax(prob_C) * 100)
-
-            ID_list[i] = index_current
-            combined_prob = Series(concatenate((prob_A, prob_B, prob_C)),
-                                   index=prob_names)
-            VA_result[i] = InterVA5._va5(index_current, self.malaria, self.hiv,
-                                         preg_state, lik_preg, cause1, lik1,
-                                         cause2, lik2, cause3, lik3, indet,
-                                         comcat, comnum,
-                                         wholeprob=combined_prob)
-            if self.output == "classic":
-                InterVA5._save_va5(VA_result[i].copy(),
-                                   filename=self.filename,
-                                   write=self.write)
-            if self.output == "extended":
-                InterVA5._save_va5_prob(VA_result[i].copy(),
-                                        filename=self.filename,
-                                        write=self.write)
+            if self.engine == "batch":
+                pending.append((i, index_current, input_current))
+                if len(pending) >= BATCH_SIZE:
+                    self._run_batch(pending, compiled_pb, va_input_names,
+                                    id_inputs, batch)
+                    pending = []
+            else:
+                input_current = Series(input_current, index=va_input_names)
+                tmp = datacheck5(va_input=input_current, va_id=index_current,
+                                 probbase=pb_for_datacheck)
+
+                list_dem_group.append(_get_dem_groups(tmp["output"]))
+
+                if self.return_checked_data:
+                    list_checked_data.append(
+                        [id_inputs[i]] + list(tmp["output"][1:S]))
+
+                input_current = copy(tmp["output"])
+                first_pass.append(tmp["first_pass"])
+                second_pass.append(tmp["second_pass"])
+
+                new_input = array([0 for _ in range(S)])
+                for y in range(1, S):
+                    if not isna(input_current[y]):
+                        if input_current[y] == subst_vector[y]:
+                            new_input[y] = 1
+
+                input_current[input_current == 0] = 1
+                input_current[0] = 0
+                input_current[isna(input_current)] = 0
+                reproductiveAge = 0
+                if input_current[4] == 1 and \
+                        (input_current[16:19].any() == 1):
+                    reproductiveAge = 1
+
+                prob = bayes_update(Sys_Prior[17:D], likelihood, new_input)
+                ID_list[i] = index_current
+                VA_result[i] = self._interpret_prob(index_current, prob,
+                                                    reproductiveAge)
+                self._save_result(VA_result[i], sinks)
             if self.openva_app:
                 progress = int(100 * k / N)
                 self.openva_app.emit(progress)
+        if len(pending) > 0:
+            self._run_batch(pending, compiled_pb, va_input_names, id_inputs,
+                            batch)
+        if len(batch["index"]) > 0:
+            first_pass.extend(batch["first_pass"])
+            second_pass.extend(batch["second_pass"])
+            list_dem_group.extend(batch["dem_group"])
+            list_checked_data.extend(batch["checked_data"])
+            probs = bayes_update_batch(Sys_Prior[17:D], likelihood,
+                                       concatenate(batch["new_input"]))
+            reproductive = concatenate(batch["reproductive"])
+            for row, (i, index_current) in enumerate(batch["index"]):
+                ID_list[i] = index_current
+                VA_result[i] = self._interpret_prob(index_current, probs[row],
+                                                    reproductive[row])
+                self._save_result(VA_result[i], sinks)
         if self.write:
             
             if self.update_callback:
                 
                 if len(first_pass)>0 or len(second_pass)>0:
                     call_update_callback(self.update_callback, {"progress": progress,"message": "The following data discrepancies were identified and handled:","log": "The following data discrepancies were identified and handled:","elapsed_time": elapsed_time,"error": False, "total_records":self.va_input.shape[0]})
-            logger.info("\nThe following data discrepancies were identified "
-                        "and handled:\n")
+            logger.info(LOG_DISCREPANCIES)
             for j in range(len(first_pass)):
                 item = first_pass[j]
                 if item:
                     for k in item:
                         logger.info(k)
-            logger.info("\nSecond pass\n")
+            logger.info(LOG_SECOND_PASS)
             
             for j in range(len(second_pass)):
                 item = second_pass[j]
                 if item:
                     for k in item:
                         logger.info(k)
+            # detach the log file, otherwise later runs in this process
+            # would keep writing into it
+            logger.removeHandler(file_handler)
+            file_handler.close()
+        for sink in sinks:
+            sink.close()
         chdir(global_dir)
         if not self.return_checked_data:
             self.checked_data = "return_checked_data = False"
@@ -1013,17 +1075,7 @@ def get_probbase(version: str = "19") -> DataFrame:
     :rtype: pandas.DataFrame
     """
 
-    if version == "19":
-        probbase_bytes = get_data('interva', "probbaseV5_19.csv")
-        probbase = read_csv(BytesIO(probbase_bytes))
-        # note: version 19 does not have first row included in v18
-    else:
-        probbase_xls = get_data("interva", "probbase.xls")
-        probbase = read_excel(probbase_xls)
-        # note: drop first row so it matches the input
-        probbase.drop([probbase.index[0]], inplace=True)
-
-    return probbase
+    return read_probbase(version)
 
 
 
@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+
+"""
+interva.parallel
+-------------------
+
+This module runs InterVA5 on large inputs by splitting the VA records into
+contiguous shards, assigning the causes of every shard in its own process and
+merging the shard results back into a single InterVA5 object.  The merged
+object (results, dem_group, checked_data, csv output and error log) is the
+same as the one produced by a single InterVA5.run() on the whole input.
+"""
+
+from __future__ import annotations
+
+import datetime
+import queue
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import current_process, get_context
+from os import path, remove
+from typing import Callable, Optional
+
+from numpy import array_split
+from pandas import DataFrame, Series, concat, read_csv
+
+from app.ccva.utilits.interva.interva5 import (LOG_DISCREPANCIES,
+                                               LOG_INCOMPLETE,
+                                               LOG_SECOND_PASS, InterVA5)
+from app.shared.utils.async_utils import call_update_callback
+from app.utilits.logger import app_logger
+
+# Inputs with fewer records than this per worker are not worth sharding.
+SHARD_MIN_RECORDS = 1000
+
+# Seconds between checks of the shard progress queue.
+PROGRESS_POLL_INTERVAL = 0.5
+
+_progress_queue = None
+_cancel_event = None
+
+
+def run_sharded(iv5: InterVA5, workers: int,
+                min_shard_size: int = SHARD_MIN_RECORDS) -> None:
+    """Run InterVA5 with the records split across worker processes.
+
+    The results are stored in iv5 exactly as InterVA5.run() stores them and
+    are written to the sinks of iv5 (the csv file by default).  If iv5.write
+    is True the error log is written to the file InterVA5.run() would have
+    written.  Progress reported by the shards is combined into a single
+    progress stream sent to iv5.update_callback.  Setting
+    iv5.gui_ctrl["break"] stops the shards, and run_sharded raises the
+    RuntimeError InterVA5.run() raises.
+
+    If the input is too small to be split in at least two shards of
+    min_shard_size records, if the worker processes cannot be started, or if
+    this process is daemonic (Celery prefork workers, whose children would be
+    left running if the worker was killed), InterVA5.run() is used instead.
+
+    :param iv5: InterVA5 object to run
+    :type iv5: interva.interva5.InterVA5
+    :param workers: maximum number of worker processes
+    :type workers: int
+    :param min_shard_size: minimum number of records in a shard
+    :type min_shard_size: int
+    :return: None
+    """
+
+    if isinstance(iv5.va_input, str) and iv5.va_input[-4:] == ".csv":
+        iv5.va_input = read_csv(iv5.va_input)
+    n_records = iv5.va_input.shape[0]
+    n_shards = min(workers, n_records // max(1, min_shard_size))
+    if n_shards < 2:
+        iv5.run()
+        return
+    if current_process().daemon:
+        app_logger.info("InterVA5 shards are not started from a daemonic "
+                        "process, running in a single process")
+        iv5.run()
+        return
+
+    bounds = [(int(part[0]), int(part[-1]) + 1)
+              for part in array_split(range(n_records), n_shards)]
+    # runCCVA is called from threads (web server thread pool, Celery), which
+    # must not be forked
+    context = get_context("spawn")
+    progress_queue = context.Queue()
+    cancel_event = context.Event()
+    try:
+        executor = ProcessPoolExecutor(max_workers=n_shards,
+                                       mp_context=context,
+                                       initializer=_init_shard_worker,
+                                       initargs=(progress_queue, cancel_event))
+        futures = [executor.submit(_run_shard, shard,
+                                   _shard_params(iv5, shard, start, stop))
+                   for shard, (start, stop) in enumerate(bounds)]
+    except OSError as e:
+        app_logger.warning(f"InterVA5 shards could not be started ({e}), "
+                           "running in a single process")
+        iv5.run()
+        return
+
+    progress = _ShardProgressAggregator(iv5.update_callback,
+                                        [stop - start
+                                         for start, stop in bounds],
+                                        iv5.start_time)
+    shard_results = [None] * n_shards
+    with executor:
+        pending = set(futures)
+        try:
+            while pending:
+                if iv5.gui_ctrl["break"]:
+                    cancel_event.set()
+                done, pending = wait(pending,
+                                     timeout=PROGRESS_POLL_INTERVAL,
+                                     return_when=FIRST_COMPLETED)
+                progress.drain(progress_queue)
+                for future in done:
+                    shard, results, dem_group = future.result()
+                    shard_results[shard] = (results, dem_group)
+        except BaseException:
+            # the running shards stop at their next record
+            cancel_event.set()
+            executor.shutdown(cancel_futures=True)
+            raise
+    progress.drain(progress_queue)
+
+    _merge_results(iv5, shard_results, bounds)
+    _write_results(iv5)
+    if iv5.write:
+        _merge_error_logs(iv5, n_shards)
+    progress.finish()
+
+
+def _init_shard_worker(progress_queue, cancel_event) -> None:
+    """Keeps the progress queue and cancellation event of the parent in the
+    worker process."""
+
+    global _progress_queue, _cancel_event
+    _progress_queue = progress_queue
+    _cancel_event = cancel_event
+
+
+def _shard_name(name: str, shard: int) -> str:
+    """Task id of a shard (used for its error log)."""
+
+    return f"{name}_shard{shard}"
+
+
+def _shard_params(iv5: InterVA5, shard: int, start: int, stop: int) -> dict:
+    """InterVA5 arguments for one shard of the records."""
+
+    return {"va_input": iv5.va_input.iloc[start:stop].reset_index(drop=True),
+            "task_id": _shard_name(iv5.task_id, shard),
+            "hiv": iv5.hiv,
+            "malaria": iv5.malaria,
+            "write": iv5.write,
+            "directory": iv5.directory,
+            "output": iv5.output,
+            # the results are written by run_sharded, once merged
+            "sinks": [],
+            "groupcode": iv5.groupcode,
+            "sci": iv5.sci,
+            "return_checked_data": iv5.return_checked_data,
+            "start_time": iv5.start_time,
+            "engine": iv5.engine}
+
+
+def _run_shard(shard: int, params: dict) -> tuple:
+    """Runs InterVA5 on one shard (in a worker process)."""
+
+    iv5 = InterVA5(update_callback=_ShardProgress(shard),
+                   gui_ctrl=_ShardControl(), **params)
+    iv5.run()
+    return shard, iv5.results, iv5.dem_group
+
+
+class _ShardControl:
+    """gui_ctrl of a shard: "break" is set with the cancellation event of the
+    parent."""
+
+    def __getitem__(self, key: str) -> bool:
+        return (key == "break" and _cancel_event is not None
+                and _cancel_event.is_set())
+
+    def __repr__(self) -> str:
+        return f"{{'break': {self['break']}}}"
+
+
+class _ShardProgress:
+    """update_callback of a shard, forwarding the updates to the parent."""
+
+    def __init__(self, shard: int):
+        self.shard = shard
+
+    def __call__(self, progress: dict) -> None:
+        if _progress_queue is not None:
+            _progress_queue.put((self.shard, progress))
+
+
+class _ShardProgressAggregator:
+    """Combines the progress updates of all shards into one progress stream.
+
+    :param update_callback: callback receiving the combined updates
+    :type update_callback: callable
+    :param shard_sizes: number of records in every shard
+    :type shard_sizes: list
+    :param start_time: start of the analysis (for the elapsed time)
+    :type start_time: datetime.datetime
+    """
+
+    def __init__(self, update_callback: Optional[Callable],
+                 shard_sizes: list, start_time: datetime.datetime):
+        self.update_callback = update_callback
+        self.start_time = start_time
+        self.shard_sizes = shard_sizes
+        self.total_records = sum(shard_sizes)
+        self.shard_progress = [0] * len(shard_sizes)
+        self.last_progress = -1
+
+    def progress(self) -> int:
+        """Overall progress, weighting every shard by its size."""
+
+        done = sum(p * n for p, n in zip(self.shard_progress,
+                                         self.shard_sizes))
+        return int(done / self.total_records)
+
+    def drain(self, progress_queue) -> None:
+        """Forwards the updates queued by the shards since the last call."""
+
+        while True:
+            try:
+                shard, update = progress_queue.get_nowait()
+            except queue.Empty:
+                return
+            self.shard_progress[shard] = max(self.shard_progress[shard],
+                                             update.get("progress", 0))
+            overall = self.progress()
+            log = str(update.get("log", ""))
+            if log.startswith("Processing record") or \
+                    update.get("message") == "Finalising results...":
+                # progress ticks: only sent when the overall value moves
+                if overall == self.last_progress:
+                    continue
+                self.last_progress = overall
+                update = dict(update,
+                              log=f"Processed {overall}% of "
+                                  f"{self.total_records} records")
+            elif not log.startswith("WARNING") and shard != 0:
+                # stage messages are the same for every shard
+                continue
+            call_update_callback(self.update_callback,
+                                 dict(update, progress=overall,
+                                      total_records=self.total_records))
+
+    def finish(self) -> None:
+        """Sends the final update once the shards are merged."""
+
+        call_update_callback(self.update_callback, {
+            "progress": 99,
+            "message": "Finalising results...",
+            "log": f"All {self.total_records} records processed — "
+                   "compiling results...",
+            "elapsed_time": _elapsed_time(self.start_time),
+            "total_records": self.total_records,
+            "error": False})
+
+
+def _merge_results(iv5: InterVA5, shard_results: list,
+                   bounds: list) -> None:
+    """Stores the concatenated shard results in iv5."""
+
+    ids = []
+    va5 = []
+    checked_data = []
+    dem_groups = []
+    for (results, dem_group), (start, _) in zip(shard_results, bounds):
+        shard_ids = results["ID"].copy()
+        shard_ids.index = shard_ids.index + start
+        ids.append(shard_ids)
+        if results["VA5"] is not None:
+            shard_va5 = results["VA5"].copy()
+            shard_va5.index = shard_va5.index + start
+            va5.append(shard_va5)
+        if isinstance(results["checked_data"], DataFrame):
+            checked_data.append(results["checked_data"])
+        if dem_group.shape[0] > 0:
+            dem_groups.append(dem_group)
+
+    iv5.hiv = shard_results[0][0]["HIV"]
+    iv5.malaria = shard_results[0][0]["Malaria"]
+    iv5._load_causetext()
+    if not iv5.return_checked_data:
+        iv5.checked_data = "return_checked_data = False"
+    else:
+        iv5.checked_data = concat(checked_data, ignore_index=True)
+    if len(dem_groups) > 0:
+        iv5.dem_group = concat(dem_groups)
+    iv5.results = {"ID": Series(concat(ids), name="ID"),
+                   "VA5": concat(va5) if len(va5) > 0 else None,
+                   "Malaria": iv5.malaria,
+                   "HIV": iv5.hiv,
+                   "checked_data": iv5.checked_data}
+
+
+def _write_results(iv5: InterVA5) -> None:
+    """Writes the merged results to the sinks of iv5."""
+
+    sinks = iv5._result_sinks()
+    for sink in sinks:
+        sink.open(iv5._result_header())
+    if iv5.results["VA5"] is not None:
+        for va_result in iv5.results["VA5"].itertuples(index=False):
+            iv5._save_result(list(va_result), sinks)
+    for sink in sinks:
+        sink.close()
+
+
+def _merge_error_logs(iv5: InterVA5, n_shards: int) -> None:
+    """Concatenates the sections of the shard error logs (in shard order)."""
+
+    log_file = path.join(iv5.directory, iv5.task_id + "_errorlogV5.txt")
+    preamble = None
+    sections = ([], [], [])
+    for shard in range(n_shards):
+        shard_file = path.join(iv5.directory,
+                               _shard_name(iv5.task_id, shard) +
+                               "_errorlogV5.txt")
+        with open(shard_file) as shard_log:
+            log = shard_log.read()
+        remove(shard_file)
+        head, log = log.split(LOG_INCOMPLETE, 1)
+        incomplete, log = log.split(LOG_DISCREPANCIES, 1)
+        first_pass, second_pass = log.split(LOG_SECOND_PASS, 1)
+        if preamble is None:
+            preamble = head
+        # drop the line break that ends the section header of every shard
+        for section, text in zip(sections,
+                                 (incomplete, first_pass, second_pass)):
+            section.append(text[1:])
+    with open(log_file, "w") as out:
+        out.write(preamble)
+        for header, section in zip((LOG_INCOMPLETE, LOG_DISCREPANCIES,
+                                    LOG_SECOND_PASS), sections):
+            out.write(header + "\n" + "".join(section))
+
+
+def _elapsed_time(start_time: datetime.datetime) -> str:
+    """Elapsed time since start_time in the H:M:S form used by InterVA5."""
+
+    seconds = (datetime.datetime.now() - start_time).seconds
+    return f"{seconds // 3600}:{seconds // 60 % 60}:{seconds % 60}"
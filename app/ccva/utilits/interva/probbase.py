@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+
+"""
+interva.probbase
+-------------------
+
+This module compiles the symptom-cause-information (SCI, aka probbase) used
+by InterVA5 into the numeric tables the algorithm works with, and caches the
+compiled tables so repeated runs skip the parsing entirely.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path
+from typing import BinaryIO, Union
+from zipfile import BadZipFile
+
+from numpy import (array, asarray, concatenate, full, load, nan, ndarray,
+                   savez, zeros)
+from pandas import DataFrame, isna, read_csv, read_excel
+
+from app.ccva.utilits.vacheck.datacheck5 import compile_rules
+from app.utilits.logger import app_logger
+
+# Letter grades used in the SCI and the likelihoods they stand for.
+GRADE_VALUES = {
+    "I": 1, "A+": 0.8, "A": 0.5, "A-": 0.2, "B+": 0.1, "B": 0.05,
+    "B-": 0.02, "B -": 0.02, "C+": 0.01, "C": 0.005, "C-": 0.002,
+    "D+": 0.001, "D": 5e-04, "D-": 1e-04, "E": 1e-05, "N": 0, "": 0,
+}
+
+# Column layout of the SCI.
+SUBST_COL = 5
+FIRST_CAUSE_COL = 17
+
+# Directory for the on-disk copies of the compiled probbase (optional).
+CACHE_DIR_ENV = "INTERVA_PROBBASE_CACHE_DIR"
+
+# Layout of the compiled tables in the cache files: bump it when
+# compile_probbase or _ARRAY_FIELDS change, so older files are not loaded.
+COMPILED_FORMAT_VERSION = 1
+
+_RULE_FIELDS = ("dont_ask_symptom", "dont_ask_target", "dont_ask_value",
+                "ask_if_target", "ask_if_value", "nn_only_target")
+_ARRAY_FIELDS = ("likelihood", "prior", "subst_vector",
+                 "datacheck_table") + _RULE_FIELDS
+
+
+class CompiledProbbase:
+    """Numeric form of the InterVA5 SCI.
+
+    :param version_label: the probbase version text stored in the SCI
+    :type version_label: str
+    :param likelihood: matrix (indicators x causes) of likelihoods; row 0
+    holds the unconditional prior
+    :type likelihood: numpy.ndarray
+    :param prior: unconditional prior over all SCI columns (``Sys_Prior``),
+    with zeros for the 17 descriptive columns
+    :type prior: numpy.ndarray
+    :param subst_vector: substantive value of every indicator (1 for "Y",
+    0 for "N" and nan otherwise)
+    :type subst_vector: numpy.ndarray
+    :param datacheck_table: string version of the SCI as expected by
+    vacheck.datacheck5.datacheck5
+    :type datacheck_table: numpy.ndarray
+    :param dont_ask_symptom: indicator of every don't-ask rule, in the order
+    the data check applies them
+    :type dont_ask_symptom: numpy.ndarray
+    :param dont_ask_target: indicator referenced by every don't-ask rule
+    :type dont_ask_target: numpy.ndarray
+    :param dont_ask_value: value of the referenced indicator that triggers
+    every don't-ask rule
+    :type dont_ask_value: numpy.ndarray
+    :param ask_if_target: per indicator, the indicator referenced by its
+    ask-if rule (-1 if none)
+    :type ask_if_target: numpy.ndarray
+    :param ask_if_value: per indicator, the value the ask-if rule sets
+    :type ask_if_value: numpy.ndarray
+    :param nn_only_target: per indicator, the neonate indicator referenced
+    by its neonates-only rule (-1 if none)
+    :type nn_only_target: numpy.ndarray
+    """
+
+    def __init__(self, version_label: str, likelihood: ndarray,
+                 prior: ndarray, subst_vector: ndarray,
+                 datacheck_table: ndarray, dont_ask_symptom: ndarray,
+                 dont_ask_target: ndarray, dont_ask_value: ndarray,
+                 ask_if_target: ndarray, ask_if_value: ndarray,
+                 nn_only_target: ndarray):
+        self.version_label = version_label
+        self.likelihood = likelihood
+        self.prior = prior
+        self.subst_vector = subst_vector
+        self.datacheck_table = datacheck_table
+        self.dont_ask_symptom = dont_ask_symptom
+        self.dont_ask_target = dont_ask_target
+        self.dont_ask_value = dont_ask_value
+        self.ask_if_target = ask_if_target
+        self.ask_if_value = ask_if_value
+        self.nn_only_target = nn_only_target
+        for field in _ARRAY_FIELDS:
+            getattr(self, field).setflags(write=False)
+
+    def __repr__(self):
+        return (f"interva.probbase.CompiledProbbase("
+                f"{self.version_label!r}, "
+                f"{self.likelihood.shape[0]} indicators, "
+                f"{self.likelihood.shape[1]} causes)")
+
+    @property
+    def datacheck_rules(self) -> dict:
+        """Rule tables in the form expected by vacheck.datacheck5_many."""
+
+        return {field: getattr(self, field) for field in _RULE_FIELDS}
+
+    def save(self, filename: Union[str, Path, BinaryIO]) -> None:
+        """Save the compiled tables to a NumPy .npz file."""
+
+        savez(filename, version_label=array(self.version_label),
+              **{field: getattr(self, field) for field in _ARRAY_FIELDS})
+
+    @classmethod
+    def load(cls, filename: Union[str, Path]) -> CompiledProbbase:
+        """Load compiled tables written by CompiledProbbase.save."""
+
+        with load(filename, allow_pickle=False) as data:
+            return cls(version_label=str(data["version_label"]),
+                       **{field: data[field] for field in _ARRAY_FIELDS})
+
+
+def compile_probbase(sci: Union[DataFrame, ndarray]) -> CompiledProbbase:
+    """Compile an SCI into the numeric tables used by InterVA5.
+
+    :param sci: symptom-cause-information with 354 rows (the first one is the
+    unconditional prior) and 87 columns
+    :type sci: pandas DataFrame or numpy ndarray
+    :return: the compiled SCI
+    :rtype: interva.probbase.CompiledProbbase
+    """
+
+    sci_values = sci.to_numpy() if isinstance(sci, DataFrame) else sci
+    sci_values = asarray(sci_values, dtype=object)
+
+    datacheck_table = sci_values.copy()
+    datacheck_table[isna(datacheck_table.astype(object))] = "."
+    datacheck_table[:, 1] = ""
+    datacheck_table = datacheck_table.astype(str)
+
+    grades = sci_values[:, FIRST_CAUSE_COL:].copy()
+    for grade, value in GRADE_VALUES.items():
+        grades[grades == grade] = value
+    likelihood = grades.astype(float)
+    prior = concatenate((zeros(FIRST_CAUSE_COL), likelihood[0, :]))
+
+    subst_vector = full(sci_values.shape[0], nan)
+    subst_vector[sci_values[:, SUBST_COL] == "N"] = 0
+    subst_vector[sci_values[:, SUBST_COL] == "Y"] = 1
+
+    rules = compile_rules(datacheck_table)
+    return CompiledProbbase(version_label=sci_values[0, 2],
+                            likelihood=likelihood,
+                            prior=prior,
+                            subst_vector=subst_vector,
+                            datacheck_table=datacheck_table,
+                            **rules)
+
+
+def read_probbase(version: str = "19") -> DataFrame:
+    """
+    Read a probbase shipped with InterVA5.
+
+    :param version: Probbase version
+    :type version: str
+    :return: the probbase with the unconditional prior as the first row
+    :rtype: pandas.DataFrame
+    """
+
+    from app.ccva.utilits.interva.interva5 import get_data
+
+    if version == "19":
+        probbase_bytes = get_data("interva", "probbaseV5_19.csv")
+        probbase = read_csv(BytesIO(probbase_bytes))
+        # note: version 19 does not have first row included in v18
+    else:
+        probbase_xls = get_data("interva", "probbase.xls")
+        probbase = read_excel(probbase_xls)
+        # note: drop first row so it matches the input
+        probbase.drop([probbase.index[0]], inplace=True)
+
+    return probbase
+
+
+@lru_cache(maxsize=None)
+def get_compiled_probbase(version: str = "19") -> CompiledProbbase:
+    """Return the compiled probbase, building it at most once per process.
+
+    If the environment variable INTERVA_PROBBASE_CACHE_DIR is set, the
+    compiled tables are also kept there as .npz files (keyed by version, a
+    digest of the source file and COMPILED_FORMAT_VERSION), so other processes
+    load them instead of compiling the probbase again.  A file that cannot be
+    loaded is compiled and written again.
+
+    :param version: Probbase version
+    :type version: str
+    :return: the compiled SCI
+    :rtype: interva.probbase.CompiledProbbase
+    """
+
+    cache_file = None
+    cache_dir = os.environ.get(CACHE_DIR_ENV)
+    if cache_dir:
+        cache_file = Path(cache_dir) / _cache_filename(version)
+        if cache_file.exists():
+            try:
+                return CompiledProbbase.load(cache_file)
+            except (KeyError, ValueError, OSError, BadZipFile) as e:
+                app_logger.warning(f"Compiled probbase {cache_file} not "
+                                   f"loaded ({e!r}), compiling it again")
+
+    compiled = compile_probbase(read_probbase(version))
+
+    if cache_file is not None:
+        # write then rename, so concurrent workers never read a partial file
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_file, "wb") as file:
+            compiled.save(file)
+        os.replace(tmp_file, cache_file)
+    return compiled
+
+
+def _cache_filename(version: str) -> str:
+    """Name of the on-disk compiled probbase for a given version."""
+
+    from app.ccva.utilits.interva.interva5 import get_data
+
+    source = "probbaseV5_19.csv" if version == "19" else "probbase.xls"
+    digest = hashlib.sha1(get_data("interva", source)).hexdigest()[:12]
+    return f"probbaseV5_{version}_{digest}_f{COMPILED_FORMAT_VERSION}.npz"
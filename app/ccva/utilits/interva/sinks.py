@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+
+"""
+interva.sinks
+-------------------
+
+This module contains the destinations ("sinks") of the VA5 results written
+by InterVA5.  A sink receives the header once and then one row per valid VA
+record (the classic or extended output columns), and is closed at the end of
+the run.
+"""
+
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from csv import writer
+from os import path
+
+from pandas import DataFrame, to_numeric
+
+# Number of rows kept in memory before they are written out.
+BUFFER_ROWS = 1000
+
+# Number of descriptive columns in a VA5 row (ID ... COMNUM); the extended
+# output adds one propensity column per cause after them.
+N_RESULT_COLUMNS = 14
+
+# Numeric descriptive columns, and the values standing for a missing result
+# (InterVA5 writes " " for an empty cause or likelihood).
+NUMERIC_RESULT_COLUMNS = ("PREGLIK", "LIK1", "LIK2", "LIK3", "INDET", "COMNUM")
+MISSING_VALUES = (" ", "", "n/a")
+
+
+class ResultSink(ABC):
+    """Destination of the VA5 results."""
+
+    @abstractmethod
+    def open(self, header: list) -> None:
+        """Starts the output with the given column names."""
+
+    @abstractmethod
+    def write(self, row: list) -> None:
+        """Adds the result row of one VA record."""
+
+    def close(self) -> None:
+        """Finishes the output."""
+
+
+class CSVResultSink(ResultSink):
+    """Writes the results to a csv file, in blocks of rows.
+
+    :param filename: path of the csv file
+    :type filename: str
+    :param append: a logical value indicating whether the rows should be
+    appended to an existing file (without writing the header).
+    :type append: boolean
+    :param buffer_rows: number of rows written at once
+    :type buffer_rows: int
+    """
+
+    def __init__(self, filename: str, append: bool = False,
+                 buffer_rows: int = BUFFER_ROWS):
+        # resolved now, InterVA5.run() changes the working directory
+        self.filename = path.abspath(filename)
+        self.append = append
+        self.buffer_rows = buffer_rows
+        self._file = None
+        self._writer = None
+        self._buffer = []
+
+    def open(self, header: list) -> None:
+        self._file = open(self.filename, "a" if self.append else "w",
+                          newline="")
+        self._writer = writer(self._file)
+        if not self.append:
+            self._writer.writerow(header)
+
+    def write(self, row: list) -> None:
+        self._buffer.append(row)
+        if len(self._buffer) >= self.buffer_rows:
+            self._flush()
+
+    def close(self) -> None:
+        if self._file is None:
+            return
+        self._flush()
+        self._file.close()
+        self._file = None
+
+    def _flush(self) -> None:
+        self._writer.writerows(self._buffer)
+        self._buffer = []
+
+
+class ColumnarResultSink(ResultSink):
+    """Keeps the results in memory, one list of values per column."""
+
+    def __init__(self):
+        self.header = []
+        self.columns = []
+
+    def open(self, header: list) -> None:
+        self.header = list(header)
+        self.columns = [[] for _ in self.header]
+
+    def write(self, row: list) -> None:
+        for column, value in zip(self.columns, row):
+            column.append(value)
+
+    def __len__(self):
+        return len(self.columns[0]) if self.columns else 0
+
+    def to_frame(self) -> DataFrame:
+        """Returns the results as a pandas DataFrame."""
+
+        return DataFrame(dict(zip(self.header, self.columns)),
+                         columns=self.header)
+
+    def to_records(self) -> list:
+        """Returns the results as a list of dicts (one per VA record).
+
+        The numeric columns (NUMERIC_RESULT_COLUMNS) hold numbers, whole ones
+        as int, and missing values (MISSING_VALUES) are None, as in the csv
+        output read back with pandas.read_csv().
+        """
+
+        if len(self) == 0:
+            return []
+        frame = self.to_frame()
+        descriptive = list(frame.columns[:N_RESULT_COLUMNS])
+        frame[descriptive] = frame[descriptive].replace(list(MISSING_VALUES), None)
+        for name in NUMERIC_RESULT_COLUMNS:
+            if name not in frame.columns:
+                continue
+            column = to_numeric(frame[name], errors="coerce")
+            if (column.dropna() % 1 == 0).all():
+                column = column.astype("Int64")
+            frame[name] = column
+        frame = frame.astype(object).where(frame.notna(), None)
+        return frame.to_dict(orient="records")
+
+
+class ParquetResultSink(ResultSink):
+    """Writes the results to a Parquet file (requires pyarrow).
+
+    The descriptive columns are stored as strings (as in the csv output) and
+    the propensities of the extended output as doubles.
+
+    :param filename: path of the Parquet file
+    :type filename: str
+    :param buffer_rows: number of rows in every row group
+    :type buffer_rows: int
+    """
+
+    def __init__(self, filename: str, buffer_rows: int = 10 * BUFFER_ROWS):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("ParquetResultSink requires the pyarrow "
+                              "package (pip install pyarrow)")
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self.filename = path.abspath(filename)
+        self.buffer_rows = buffer_rows
+        self._schema = None
+        self._writer = None
+        self._buffer = ColumnarResultSink()
+
+    def open(self, header: list) -> None:
+        pa = self._pa
+        self._schema = pa.schema(
+            [(name, pa.string() if i < N_RESULT_COLUMNS else pa.float64())
+             for i, name in enumerate(header)])
+        self._writer = self._pq.ParquetWriter(self.filename, self._schema)
+        self._buffer.open(header)
+
+    def write(self, row: list) -> None:
+        self._buffer.write(row)
+        if len(self._buffer) >= self.buffer_rows:
+            self._flush()
+
+    def close(self) -> None:
+        if self._writer is None:
+            return
+        self._flush()
+        self._writer.close()
+        self._writer = None
+
+    def _flush(self) -> None:
+        if len(self._buffer) == 0:
+            return
+        arrays = [[None if value is None else str(value) for value in column]
+                  if i < N_RESULT_COLUMNS else column
+                  for i, column in enumerate(self._buffer.columns)]
+        self._writer.write_table(
+            self._pa.Table.from_arrays(arrays, schema=self._schema))
+        self._buffer.open(self._buffer.header)
@@ -11,9 +11,17 @@ from .exceptions import VAInputException, VAIDException
 from pandas import read_csv, Series, DataFrame
 # from pkgutil import get_data
 from io import BytesIO
-from numpy import nan, ndarray, where, isnan
+from typing import Optional
+from numpy import array, full, isnan, nan, ndarray, nonzero, where, zeros
 import numpy
 
+# Column layout of the probbase used by the data checks.
+INDIC_COL = 0
+SUBST_COL = 5
+DONT_ASK_COLS = range(7, 15)
+ASK_IF_COL = 15
+NN_ONLY_COL = 16
+
 
 def datacheck5(va_input: Series,
                va_id: str,
@@ -157,6 +165,196 @@ def datacheck5(va_input: Series,
     return output
 
 
+def compile_rules(probbase: ndarray) -> dict:
+    """
+    Resolve the don't-ask, ask-if and neonates-only rules of the probbase
+    into indicator indices, so the data checks never search the probbase
+    by indicator name.
+    :param probbase: SCI from InterVA5 (as used by datacheck5)
+    :type probbase: numpy.ndarray
+    :return: integer rule tables: dont_ask_symptom, dont_ask_target and
+    dont_ask_value (one entry per don't-ask rule, in the order they are
+    applied), and ask_if_target, ask_if_value and nn_only_target (one entry
+    per indicator, -1 for indicators without such a rule).
+    :rtype: dictionary
+    """
+
+    indic_index = {}
+    for i, indic in enumerate(probbase[:, INDIC_COL]):
+        indic_index.setdefault(indic, i)
+
+    number_symptoms = probbase.shape[0]
+    dont_ask_symptom, dont_ask_target, dont_ask_value = [], [], []
+    ask_if_target = full(number_symptoms, -1)
+    ask_if_value = zeros(number_symptoms, dtype=int)
+    nn_only_target = full(number_symptoms, -1)
+    for j in range(1, number_symptoms):
+        for col in DONT_ASK_COLS:
+            rule = probbase[j, col]
+            if rule != ".":
+                dont_ask_symptom.append(j)
+                dont_ask_target.append(indic_index[rule[0:5]])
+                dont_ask_value.append(int(rule[5:6] == "Y"))
+        rule = probbase[j, ASK_IF_COL]
+        if rule != ".":
+            # an ask-if rule naming an unknown indicator never fires
+            ask_if_target[j] = indic_index.get(rule[0:5], -1)
+            ask_if_value[j] = int(rule[5:6].replace("Y", "1")
+                                  .replace("N", "0"))
+        rule = probbase[j, NN_ONLY_COL]
+        if rule != ".":
+            nn_only_target[j] = indic_index[rule[0:5]]
+
+    return {"dont_ask_symptom": array(dont_ask_symptom, dtype=int),
+            "dont_ask_target": array(dont_ask_target, dtype=int),
+            "dont_ask_value": array(dont_ask_value, dtype=int),
+            "ask_if_target": ask_if_target,
+            "ask_if_value": ask_if_value,
+            "nn_only_target": nn_only_target}
+
+
+def datacheck5_many(va_input: DataFrame,
+                    probbase: ndarray,
+                    insilico_check=False,
+                    rules: Optional[dict] = None) -> dict:
+    """
+    Runs the InterVA5 data consistency check on many observations at once.
+    The rules are applied in the same order as datacheck5, but each rule is
+    evaluated for all observations together, so the results (and the log
+    messages) are identical to calling datacheck5 on every row.
+    :param va_input: original data with one observation per row, the ID in
+    the first column and values 0 (absence), 1 (presence), and numpy.nan
+    (missing) for the 353 symptoms.
+    :type va_input: pandas.DataFrame
+    :param probbase: SCI from InterVA5
+    :type probbase: numpy.ndarray
+    :param insilico_check: Indicator to use InSilicoVA rule which sets all
+    symptoms that should not be asked to a value of missing. In contrast,
+    the default rule sets these symptoms to missing only when they take the
+    substantive value.
+    :type insilico_check: boolean
+    :param rules: rule tables from compile_rules (compiled from probbase
+    when not given).
+    :type rules: dictionary
+    :return: cleaned input with log messages from first and second passes.
+    :rtype: dictionary with keys output (a pandas.DataFrame), first_pass (a
+    list with the messages of each observation), and second_pass (a list
+    with the messages of each observation).
+    """
+
+    if not isinstance(va_input, DataFrame):
+        raise VAInputException(
+            "`va_input` must be a pandas.DataFrame, not {}".format(
+                va_input.__class__.__name__
+            ))
+    if va_input.shape[1] != 354:
+        raise VAInputException(
+            "`va_input` must have 354 columns"
+        )
+    symptoms = va_input.iloc[:, 1:]
+    if not (symptoms.isin([0, 1]) | symptoms.isna()).to_numpy().all():
+        raise VAInputException(
+            "`va_input` must have values 0, 1, and nan for symptoms."
+        )
+    va_ids = [str(va_id) for va_id in va_input.iloc[:, 0]]
+    if "" in va_ids:
+        raise VAIDException(
+            "`va_id` cannot be an empty string"
+        )
+    if rules is None:
+        rules = compile_rules(probbase)
+
+    input_values = va_input.to_numpy(dtype=object, copy=True)
+    input_values[:, 0] = 0
+    input_current = input_values.astype(float)
+    number_records, number_symptoms = input_current.shape
+    first_pass = [[] for _ in range(number_records)]
+    second_pass = [[] for _ in range(number_records)]
+    prefixes = [f"{va_id}   " for va_id in va_ids]
+
+    dont_ask_rules = [[] for _ in range(number_symptoms)]
+    for r, j in enumerate(rules["dont_ask_symptom"]):
+        t = rules["dont_ask_target"][r]
+        msg = (f"{probbase[j, 4]} "
+               f"({probbase[j, 3]}) "
+               "value inconsistent with "
+               f"{probbase[[t], 3]} ({probbase[[t], 2]}) "
+               "- cleared in working information")
+        dont_ask_rules[j].append((t, rules["dont_ask_value"][r], msg))
+
+    def log(rows, msg, k):
+        messages = first_pass if k == 0 else second_pass
+        for row in rows:
+            messages[row].append(prefixes[row] + msg)
+
+    for k in range(2):
+        for j in range(1, number_symptoms):
+            subst_val = int(probbase[j, 5] == "Y")
+            for t, dont_ask_val, msg in dont_ask_rules[j]:
+                current = input_current[:, j]
+                input_dont_ask = input_current[:, t]
+                clear = (~isnan(current) & ~isnan(input_dont_ask) &
+                         (input_dont_ask == dont_ask_val))
+                if not insilico_check:
+                    clear &= current == subst_val
+                rows = nonzero(clear)[0]
+                if len(rows) > 0:
+                    input_current[rows, j] = nan
+                    log(rows, msg, k)
+
+            # ask if
+            t = rules["ask_if_target"][j]
+            if t >= 0:
+                ask_if_val = rules["ask_if_value"][j]
+                input_ask_if = input_current[:, t]
+                change_ask_if = ((input_current[:, j] == subst_val) &
+                                 (input_ask_if != ask_if_val) &
+                                 (input_ask_if != subst_val))
+                rows = nonzero(change_ask_if)[0]
+                if len(rows) > 0:
+                    input_current[rows, t] = ask_if_val
+                    msg = (f"{probbase[j, 3]} "
+                           f"({probbase[j, 2]})"
+                           "  not flagged in category "
+                           f"{probbase[t, 3]} "
+                           f"({probbase[t, 2]}) "
+                           "- updated in working information")
+                    log(rows, msg, k)
+
+            # neonates only
+            t = rules["nn_only_target"][j]
+            if t >= 0:
+                input_nn_only = input_current[:, t]
+                clear = ((input_current[:, j] == subst_val) &
+                         (input_nn_only != 1))
+                rows = nonzero(clear)[0]
+                if len(rows) > 0:
+                    input_current[rows, j] = nan
+                    msg = (f"{probbase[j, 3]} "
+                           f"({probbase[j, 2]}) only required for neonates"
+                           " - cleared in working information")
+                    log(rows, msg, k)
+
+    # keep the original values (and their types) where nothing was changed
+    initial = input_values.astype(float)
+    changed = ~((input_current == initial) |
+                (isnan(input_current) & isnan(initial)))
+    output_values = input_values
+    rows, cols = nonzero(changed)
+    for row, col in zip(rows, cols):
+        value = input_current[row, col]
+        output_values[row, col] = nan if isnan(value) else int(value)
+    output_values[:, 0] = va_input.iloc[:, 0].to_numpy()
+    input_final = DataFrame(output_values,
+                            index=va_input.index,
+                            columns=va_input.columns)
+
+    output = {"output": input_final,
+              "first_pass": first_pass,
+              "second_pass": second_pass}
+    return output
+
+
 def get_example_input() -> DataFrame:
     """
     Get an example input.
@@ -12,6 +12,8 @@ from celery import Celery
 from celery.schedules import crontab
 from decouple import config
 
+from app.shared.configs.settings import get_settings
+
 # Redis configuration - Read from environment
 REDIS_URL = config('REDIS_CELERY_URL', default='redis://redis:6379')
 REDIS_PASSWORD = config('REDIS_PASSWORD', default='vman@1029')
@@ -73,7 +75,7 @@ celery_app.conf.update(
     
     # Worker settings
     worker_prefetch_multiplier=1,  # Fair task distribution
-    worker_concurrency=2,  # Default 2 concurrent tasks
+    worker_concurrency=get_settings().CELERY_WORKER_CONCURRENCY,  # Default 2 concurrent tasks
     
     # Retry settings
     task_default_retry_delay=60,  # 1 minute delay between retries
@@ -126,6 +128,17 @@ def _prewarm_vman_ml_predictor(**kwargs):
     t.start()
 
 
+# The InterVA5 probbase (SCI) is compiled into numeric tables once per process
+# and cached; doing it here keeps that setup out of the first CCVA task.
+@worker_process_init.connect
+def _prewarm_interva_probbase(**kwargs):
+    try:
+        from app.ccva.utilits.interva.probbase import get_compiled_probbase
+        get_compiled_probbase("19")
+    except Exception as exc:
+        print(f"[prewarm] WARNING: InterVA5 probbase pre-warm failed: {exc}")
+
+
 # Beat schedule:
 #   check_dqa_analytics_schedule  — hourly, fires the DQA snapshot recompute
 #                                   at the user-configured UTC hour.
@@ -4,6 +4,7 @@ import getpass
 import typer
 from app.users.models.user import User
 from app.shared.configs.arangodb import get_arangodb_session
+from app.shared.services.va_record_keys import migrate_va_record_keys
 from app.users.schemas.user import RegisterUserRequest
 from app.users.services.user import create_or_update_user_account
 
@@ -79,6 +80,26 @@ def details(email: str = typer.Option(..., "--email", "-e", help="User's email")
     except Exception as e:
         typer.echo(f"An error occurred: {str(e)}")
 
+@app.command("migrate-va-keys")
+def migrate_va_keys(
+    batch_size: int = typer.Option(1000, "--batch-size", help="Records moved per transaction"),
+    dry_run: bool = typer.Option(False, "--dry-run", help="Only count the records to migrate"),
+):
+    """
+    Store VA records saved under random keys under the key derived from their instance ID.
+    """
+    try:
+        async def migrate():
+            async for db in get_arangodb_session():
+                return await migrate_va_record_keys(db, batch_size=batch_size, dry_run=dry_run)
+
+        summary = asyncio.run(migrate())
+        typer.echo(f"VA records to migrate: {summary['to_migrate']}")
+        if not dry_run:
+            typer.echo(f"Migrated: {summary['migrated']}, failed: {summary['failed']}")
+    except Exception as e:
+        typer.echo(f"An error occurred: {str(e)}")
+
 def main():
     app()
 
@@ -8,6 +8,7 @@ from fastapi.concurrency import run_in_threadpool
 from app.shared.configs.constants import db_collections
 from app.shared.configs.models import ResponseMainModel
 from app.shared.middlewares.exceptions import BadRequestException
+from app.shared.services.va_record_keys import va_record_lookup
 
 
 async def fetch_error_list(
@@ -106,17 +107,17 @@ async def fetch_error_list(
 async def fetch_error_details(db: StandardDatabase, error_id: str) -> ResponseMainModel:
     try:
         # collection = db.collection(db_collections.CCVA_ERRORS)
+        lookup, bind_vars = va_record_lookup([f"uuid:{error_id}"], var='fs')
         query = f"""
-            FOR e IN {db_collections.CCVA_ERRORS}
-                FILTER e.uuid == @error_id
-                COLLECT uuid = e.uuid, errorType = e.error_type, group = e.group INTO groupedErrors
-
             LET formData = (
-                FOR fs IN {db_collections.VA_TABLE}
-                    FILTER fs.__id == CONCAT("uuid:", uuid)
+                {lookup}
                     RETURN UNSET(fs, ["_id", "_rev", "__id", "_key", "instanceid", "submissiondate"])
             )
 
+            FOR e IN {db_collections.CCVA_ERRORS}
+                FILTER e.uuid == @error_id
+                COLLECT uuid = e.uuid, errorType = e.error_type, group = e.group INTO groupedErrors
+
             RETURN {{
                 error: {{
                     uuid: uuid,
@@ -133,7 +134,7 @@ async def fetch_error_details(db: StandardDatabase, error_id: str) -> ResponseMa
         # print(query)
         
         def execute_details_query():
-            cursor = db.aql.execute(query, bind_vars={"error_id": error_id}, cache=True)
+            cursor = db.aql.execute(query, bind_vars={**bind_vars, "error_id": error_id}, cache=True)
             return cursor.next()
 
         result = await run_in_threadpool(execute_details_query)
@@ -152,15 +153,14 @@ async def fetch_error_details(db: StandardDatabase, error_id: str) -> ResponseMa
 
 async def fetch_form_data(db: StandardDatabase, form_id: str) -> ResponseMainModel:
     try:
-        collection = db.collection(db_collections.FORM_SUBMISSIONS)
+        lookup, bind_vars = va_record_lookup([form_id], var='fs')
         query = f"""
-        FOR fs IN {collection.name}
-        FILTER fs.__id == @form_id
+        {lookup}
         RETURN fs
         """
         
         def execute_form_data_query():
-            cursor = db.aql.execute(query, bind_vars={"form_id": form_id}, cache=True)
+            cursor = db.aql.execute(query, bind_vars=bind_vars, cache=True)
             return cursor.next()
 
         result = await run_in_threadpool(execute_form_data_query)
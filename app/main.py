@@ -14,7 +14,10 @@ from app import routes
 from app.shared.middlewares.error_handlers import register_error_handlers
 from app.users.utils.default import default_account_creation
 from app.utilits import websocket_manager
-from app.shared.configs.arangodb import get_arangodb_session
+from app.shared.configs.arangodb import (close_arangodb, get_arangodb_pool_stats,
+                                         get_arangodb_session, init_arangodb)
+from app.shared.configs.arangodb_async import close_async_arangodb
+from app.odk.utils.odk_client import close_odk_clients
 from app.users.decorators.user import get_current_user_ws
 from app.users.models.user import User
 from app.pcva.services.va_records_services import save_discordant_message_service
@@ -22,6 +25,8 @@ from app.utilits.schedeular import shutdown_scheduler, start_scheduler
 from redis import asyncio as aioredis
 from fastapi_cache import FastAPICache
 from fastapi_cache.backends.redis import RedisBackend
+from app.shared.utils.cache import CACHE_PREFIX
+from app.settings.services.config_cache import config_cache
 from app.celery_app import celery_app
 
 
@@ -89,6 +94,14 @@ async def lifespan(app: FastAPI):
     logger.info("📚 Visit http://localhost:8080/vman/api/v1/docs for the API documentation (Swagger UI)")
     logger.info("🌐 Visit http://localhost:8080/vman/api/v1 for the main API")
     
+    # Shared ArangoDB client: connects and bootstraps collections/indexes once
+    # per worker, requests then reuse its connection pool
+    try:
+        await init_arangodb()
+    except Exception as e:
+        # retried by the first request that needs the database
+        logger.error(f"❌ Failed to initialize ArangoDB client: {e}")
+
     # Mark server as ready immediately
     app_status["server_ready"] = True
     
@@ -101,7 +114,10 @@ async def lifespan(app: FastAPI):
         config('REDIS_URL', default="redis://localhost:6370"),
         password=redis_password
     )
-    FastAPICache.init(RedisBackend(redis), prefix="vman_cache")
+    FastAPICache.init(RedisBackend(redis), prefix=CACHE_PREFIX)
+
+    # Drop cached system configurations saved by other workers
+    config_cache.start_listener()
     
     # Start WebSocket manager with Redis Pub/Sub
     await websocket__manager.start()
@@ -116,7 +132,11 @@ async def lifespan(app: FastAPI):
         await websocket__manager.stop()
         
         await shutdown_scheduler()
+        config_cache.stop_listener()
         await redis.close()
+        await close_async_arangodb()
+        await close_odk_clients()
+        close_arangodb()
         
         logger.info("✅ Shutdown completed")
         
@@ -181,6 +201,7 @@ async def health_check():
     return {
         "status": "healthy" if app_status["server_ready"] else "starting",
         "initialization_status": app_status,
+        "database_pool": get_arangodb_pool_stats(),
         "message": "VMan API v3 is running" if app_status["server_ready"] else "VMan API v3 is starting up"
     }
 
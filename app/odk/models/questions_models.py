@@ -1,7 +1,10 @@
-
-from typing import List
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List
 from arango import Optional
+from arango.database import StandardDatabase
 from pydantic import BaseModel
+from app.shared.configs.arangodb_async import get_async_db
 from app.shared.configs.models import VManBaseModel
 from app.shared.configs.constants import db_collections
 
@@ -22,4 +25,54 @@ class VA_Question(VManBaseModel):
 
     @classmethod
     def get_collection_name(cls) -> str:
-        return db_collections.VA_QUESTIONS
\ No newline at end of file
+        return db_collections.VA_QUESTIONS
+
+    @classmethod
+    async def sync_many(cls, questions: List[Dict[str, Any]], db: StandardDatabase) -> Dict[str, int]:
+        """
+        Insert or update the form questions, matched on name, with one query to read
+        the stored questions and one bulk write of the new and changed ones.
+
+        Updated questions keep their _key, uuid and created_at; unchanged ones are not written.
+
+        :return counts of inserted, updated and unchanged questions
+        """
+        cls.init_collection(db)
+        adb = get_async_db(db)
+        question_fields = [field for field in cls.model_fields if field not in VManBaseModel.model_fields] + ['is_deleted']
+
+        incoming = {question['name']: cls(**question).model_dump() for question in questions}
+        cursor = await adb.aql(
+            """
+            FOR doc IN @@collection
+                FILTER doc.name IN @names
+                RETURN MERGE(KEEP(doc, @fields), { _key: doc._key, uuid: doc.uuid, created_at: doc.created_at })
+            """,
+            bind_vars={'@collection': cls.get_collection_name(), 'names': list(incoming), 'fields': question_fields},
+        )
+        stored = {doc['name']: doc for doc in await cursor.to_list()}
+
+        now = datetime.now().isoformat()
+        changes = []
+        counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+        for name, question in incoming.items():
+            old = stored.get(name)
+            if old is None:
+                changes.append({**question, 'uuid': str(uuid.uuid4()), 'created_at': now})
+                counts['inserted'] += 1
+            elif any(old.get(field) != question.get(field) for field in question_fields):
+                changes.append({**question, '_key': old['_key'], 'uuid': old.get('uuid') or str(uuid.uuid4()),
+                                'created_at': old.get('created_at'), 'updated_at': now})
+                counts['updated'] += 1
+            else:
+                counts['unchanged'] += 1
+
+        if changes:
+            await adb.aql(
+                """
+                FOR question IN @questions
+                    INSERT question INTO @@collection OPTIONS { overwriteMode: "update", keepNull: true }
+                """,
+                bind_vars={'@collection': cls.get_collection_name(), 'questions': changes},
+            )
+        return counts
@@ -142,6 +142,8 @@ async def fetch_odk_data_with_async_endpoint(
                 method="api",
                 server_total=initial_response.get('server_total', total_data_count),
                 local_count=initial_response.get('local_count', 0),
+                sync_mode=initial_response.get('sync_mode'),
+                watermark=initial_response.get('watermark'),
             )
             app_logger.info(f"ODK sync task dispatched (id={task_id}, user={user_name}, {total_data_count} records)")
         else:
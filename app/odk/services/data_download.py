@@ -1,19 +1,24 @@
+import asyncio
+from contextlib import aclosing
 from datetime import datetime
 import json
 import time
-from json import loads
 from typing import Dict, List
 
-import pandas as pd
 from arango.database import StandardDatabase
 from fastapi import HTTPException
-from fastapi.concurrency import run_in_threadpool
 from loguru import logger
 
 from app.odk.models.questions_models import VA_Question
 from app.odk.utils.data_transform import (assign_questions_options,
                                           filter_non_questions,
                                           odk_questions_formatter)
+from app.odk.services.sync_pipeline import (form_flattener,
+                                            iter_submission_pages,
+                                            normalize_submissions)
+from app.odk.services.sync_watermark import (ODKSyncWatermark,
+                                             remove_deleted_submissions,
+                                             unsynced_at_watermark)
 from app.odk.utils.odk_client import ODKClientAsync
 from app.pcva.responses.va_response_classes import VAQuestionResponseClass
 from app.settings.services.odk_configs import fetch_odk_config, add_configs_settings
@@ -22,6 +27,11 @@ from app.shared.configs.arangodb import (ArangoDBClient, get_arangodb_client,
                                          remove_null_values, sanitize_document, clean_document)
 from app.shared.configs.constants import db_collections
 from app.shared.configs.models import ResponseMainModel
+from app.shared.configs.settings import get_settings
+from app.shared.services.va_record_keys import va_record_key, with_va_record_key
+from app.shared.services.va_rollups import VARollupService, rollup_fields
+from app.shared.services.va_stats_service import VAStatsService
+from app.shared.utils.cache import bump_cache_versions, invalidate_cache
 
 
 async def update_sync_status_internal(db: StandardDatabase, last_sync_data_count: int, total_synced_data: int):
@@ -78,7 +88,15 @@ async def fetch_odk_data_initial(
         records_margins: Dict = None
         
         config = await fetch_odk_config(db)
-        
+
+        # user requested ranges do not move the watermark; forced and resent
+        # downloads skip the delta check
+        sync_mode = "range" if start_date or end_date else "full"
+        if sync_mode == "full" and not force_update and not resend:
+            watermark = await ODKSyncWatermark.get(db, config.odk_api_configs)
+            if watermark:
+                return await fetch_odk_delta_initial(db, config.odk_api_configs, watermark)
+
         if not start_date and not end_date and not force_update:
             records_margins = await get_margin_dates_and_records_count(db)
         
@@ -105,6 +123,7 @@ async def fetch_odk_data_initial(
                     "local_count": available_data_count,
                     "start_date": start_date,
                     "end_date": end_date,
+                    "sync_mode": sync_mode,
                 }
             
             if available_data_count > 0 :
@@ -127,11 +146,48 @@ async def fetch_odk_data_initial(
                 "local_count": available_data_count,     # how many we already have
                 "start_date": start_date,
                 "end_date": end_date,
+                "sync_mode": sync_mode,
             }
             
     except Exception as e:
         logger.error(f"Error fetching ODK data: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+async def fetch_odk_delta_initial(db: StandardDatabase, odk_config, watermark: dict):
+    """
+    Delta sync check: counts the submissions received or edited since the
+    form's watermark, and whether local records were deleted on the server.
+    The submissions at the watermark are counted only if they are not synced.
+    """
+    stats = await VAStatsService.get_stats(db)
+    available_data_count = stats.get('total_records', 0)
+    local_odk_count = (stats.get('records_by_source') or {}).get(VAStatsService.UNKNOWN_SOURCE, 0)
+
+    async with ODKClientAsync(odk_config) as odk_client:
+        delta = await odk_client.getFormSubmissions(top=1, watermark=watermark, watermark_op='gt')
+        at_watermark = await odk_client.getFormSubmissions(watermark=watermark, watermark_op='eq')
+        server = await odk_client.getSubmissionIds(top=1)
+    total_data_count = delta.get("@odata.count", 0) + await unsynced_at_watermark(db, at_watermark.get("value", []))
+    server_total = server.get("@odata.count", 0)
+    deletes_pending = local_odk_count > server_total
+
+    response = {
+        "total_data_count": total_data_count,   # new and edited records
+        "server_total": server_total,
+        "local_count": available_data_count,
+        "start_date": None,
+        "end_date": None,
+        "sync_mode": "delta",
+        "watermark": watermark,
+    }
+    if not total_data_count and not deletes_pending:
+        logger.info("\nVMan is up to date.")
+        return {"download_status": False, "status": "VMan is up to date", **response}
+
+    logger.info(f"{total_data_count} new or edited records to be downloaded (since {watermark})"
+                + (", deleted submissions to remove" if deletes_pending else ""))
+    return {"download_status": True, "status": "Data to be downloaded", **response}
         
 
 
@@ -141,6 +197,22 @@ async def fetch_odk_data_initial(
 
 
 
+async def finish_watermark_sync(db: StandardDatabase, odk_config, sync_mode: str = None, seen_watermark: dict = None) -> int:
+    """
+    After a completed sync: moves the form's watermark forward (delta sync) or
+    sets it from the local records (full sync), then removes the records
+    deleted on the server. Returns the number of records removed.
+    """
+    if sync_mode == "delta":
+        await ODKSyncWatermark.advance(db, odk_config, seen_watermark)
+    elif sync_mode == "full":
+        await ODKSyncWatermark.rebuild(db, odk_config)
+    else:
+        return 0
+    async with ODKClientAsync(odk_config) as odk_client:
+        return await remove_deleted_submissions(odk_client, db)
+
+
 async def fetch_odk_data_with_async(
     total_data_count: int,
     start_date: str = None,
@@ -152,7 +224,8 @@ async def fetch_odk_data_with_async(
 ):
     """
     Fetch ODK data asynchronously with WebSocket progress updates.
-    Uses @odata.nextLink pagination to respect the server's page-size limit.
+    Pages are downloaded ahead (in parallel windows when the server sorts
+    submissions) while the previous ones are normalised and saved.
     """
     try:
         from app.main import websocket__manager
@@ -171,44 +244,24 @@ async def fetch_odk_data_with_async(
                 await websocket__manager.broadcast("123", json.dumps(progress_data))
 
             records_saved = 0
-            next_link = None
-            first_page = True
-
-            # Follow @odata.nextLink instead of calculating skip manually —
-            # this prevents "limit exceeded" errors when the server enforces
-            # a smaller $top cap than what was previously requested.
-            while True:
-                try:
-                    if next_link:
-                        data = await odk_client.getFormSubmissions(next_link=next_link)
-                    else:
-                        data = await odk_client.getFormSubmissions(
-                            top=top,
-                            skip=skip if first_page else None,
-                            start_date=start_date,
-                            end_date=end_date,
-                            order_by='__system/submissionDate',
-                            order_direction='asc'
-                        )
-                        first_page = False
-
-                    if isinstance(data, str):
-                        logger.error(f"Error fetching data: {data}")
-                        raise HTTPException(status_code=500, detail=data)
-
-                    page_records = data.get('value', [])
-                    if not page_records:
-                        break
-
-                    df = pd.json_normalize(page_records, sep='/')
-                    df.columns = [col.split('/')[-1] for col in df.columns]
-                    df.columns = df.columns.str.lower()
-                    df = df.dropna(axis=1, how='all')
-                    df = df.loc[:, ~df.columns.duplicated()]
-                    chunk = loads(df.to_json(orient='records'))
+            settings = get_settings()
+            flattener = await form_flattener(odk_client)
+            pages = iter_submission_pages(
+                odk_client,
+                top=top,
+                skip=skip,
+                start_date=start_date,
+                end_date=end_date,
+                concurrency=settings.ODK_FETCH_CONCURRENCY,
+                prefetch=settings.ODK_PREFETCH_PAGES,
+            )
+
+            async with aclosing(pages):
+                async for page_records in pages:
+                    chunk = await asyncio.to_thread(normalize_submissions, page_records, flattener)
 
                     if chunk:
-                        await insert_many_data_to_arangodb(chunk, overwrite_mode='replace')
+                        await insert_many_data_to_arangodb(chunk, overwrite_mode='replace', clean=False)
                         records_saved += len(chunk)
 
                         progress = min((records_saved / total_data_count) * 100, 100.0)
@@ -225,13 +278,6 @@ async def fetch_odk_data_with_async(
                             }
                             await websocket__manager.broadcast("123", json.dumps(progress_data))
 
-                    next_link = data.get('@odata.nextLink')
-                    if not next_link:
-                        break
-
-                except Exception as e:
-                    raise e
-
             end_time = time.time()
             total_elapsed_time = end_time - start_time
             logger.info(f"Total elapsed time: {total_elapsed_time:.2f}s")
@@ -270,13 +316,15 @@ async def fetch_form_questions(db: StandardDatabase):
             #         for field in all_questions_fields
             #     ]
             # }
-            count = 0
-            for question in [
-                    assign_questions_options(field, formated_questions)
-                    for field in all_questions_fields
-                ]:
-                await VA_Question(**question).save(db, "name")
-                count += 1
+            form_questions = [
+                assign_questions_options(field, formated_questions)
+                for field in all_questions_fields
+            ]
+            counts = await VA_Question.sync_many(form_questions, db)
+            count = len(form_questions)
+            if counts['inserted'] or counts['updated']:
+                await invalidate_cache('form_questions')
+            logger.info(f"Form questions synced: {counts}")
 
             questions = await VA_Question.get_many(paging=False, db=db)
 
@@ -297,62 +345,66 @@ async def insert_data_to_arangodb(data: dict,data_source:str=None):
         
 
         db:ArangoDBClient = await get_arangodb_client()
-        await db.replace_one(collection_name=db_collections.VA_TABLE, document=data)
+        await db.replace_one(collection_name=db_collections.VA_TABLE, document=with_va_record_key(data))
+        await bump_cache_versions(db_collections.VA_TABLE)
     except Exception as e:
         raise e
     
     
-async def insert_many_data_to_arangodb(data: List[dict], overwrite_mode: str = 'ignore'):
+async def insert_many_data_to_arangodb(data: List[dict], overwrite_mode: str = 'ignore', clean: bool = True, update_stats: bool = True):
+    """
+        :param clean: remove null/NaN values first (clean_document); records from normalize_submissions are already clean
+        :param update_stats: recount the VA record statistics and rollups after 'ignore' inserts; batch imports reconcile once at the end instead
+    """
     try:
-        data = [clean_document(item) for item in data]
+        if clean:
+            data = [clean_document(item) for item in data]
         db: ArangoDBClient = await get_arangodb_client()
 
         if overwrite_mode == 'replace':
-            # AQL UPSERT on __id correctly handles both new inserts and updates.
-            # The native insert_many(silent=True) silently drops documents that
-            # violate the unique __id secondary index, so new records never land.
-            return await db.upsert_many(
+            # Records are stored under a _key derived from __id and replaced with
+            # bulk inserts; records saved earlier under another _key are upserted
+            # on __id with AQL (insert_many(silent=True) would silently drop them).
+            fields = await rollup_fields(db.db)
+            old_sources = await db.upsert_many(
                 collection_name=db_collections.VA_TABLE,
                 documents=data,
                 key_field='__id',
+                return_old_fields=[VAStatsService.SOURCE_FIELD] + (VARollupService.record_fields(fields) if fields else []),
+                key_function=lambda record: va_record_key(record['__id']),
             )
+            await VAStatsService.apply_upsert_changes(db.db, data, old_sources)
+            if fields:
+                await VARollupService.apply_upsert_changes(db.db, fields, data, old_sources)
+            await bump_cache_versions(db_collections.VA_TABLE)
+            return []
 
-        return await db.insert_many(
+        result = await db.insert_many(
             collection_name=db_collections.VA_TABLE,
-            documents=data,
+            documents=[with_va_record_key(item) for item in data],
             overwrite_mode=overwrite_mode,
             sanitize=False,
         )
+        await bump_cache_versions(db_collections.VA_TABLE)
+        # silent inserts do not report which documents landed, recount instead
+        if update_stats:
+            await VAStatsService.reconcile(db.db)
+            await VARollupService.rebuild(db.db)
+        return result
     except Exception as e:
         raise e
     
 async def get_margin_dates_and_records_count(db: StandardDatabase = None):
-    query = f"""
-                LET totalCount = LENGTH(FOR doc IN {db_collections.VA_TABLE} RETURN 1)
-
-                
-                LET latestRecord = (
-                        FOR doc IN {db_collections.VA_TABLE}
-                            SORT doc.submissiondate DESC
-                            LIMIT 1
-                            RETURN MERGE({{latest_date: doc.submissiondate}}, {{ total_records: totalCount }})
-                    )[0]
-                
-                LET earliestRecord = (
-                        FOR doc IN {db_collections.VA_TABLE}
-                            SORT doc.submissiondate ASC
-                            LIMIT 1
-                            RETURN MERGE({{earliest_date: doc.submissiondate}}, latestRecord)
-                    )[0]
-
-                RETURN earliestRecord
-            """
-
-    def execute_query():
-        cursor = db.aql.execute(query=query)
-        return cursor.next()
-
-    return await run_in_threadpool(execute_query)
+    """
+        Total number of VA records and their earliest/latest submission dates,
+        read from the maintained statistics document (see VAStatsService).
+    """
+    stats = await VAStatsService.get_stats(db)
+    return {
+        'earliest_date': stats.get('earliest_date'),
+        'latest_date': stats.get('latest_date'),
+        'total_records': stats.get('total_records', 0),
+    }
 
 
 
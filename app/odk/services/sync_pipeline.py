@@ -0,0 +1,158 @@
+"""
+Pipelined download of ODK Central submissions.
+
+Pages are downloaded ahead of processing into a bounded buffer, so the
+normalise/upsert work of one page overlaps the download of the next ones.
+When the server sorts submissions (is_sort_allowed), the remaining
+$skip/$top windows are requested in parallel (at most `concurrency` at a
+time) and still handed out in order; otherwise the @odata.nextLink chain is
+followed by a single prefetching reader.
+
+Submissions are flattened with one SubmissionFlattener per sync, built from
+the form fields (see form_flattener).
+
+    async with aclosing(iter_submission_pages(odk_client, top=100)) as pages:
+        async for page_records in pages:
+            records = await asyncio.to_thread(normalize_submissions, page_records, flattener)
+            ...
+"""
+import asyncio
+import math
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from app.odk.utils.data_transform import SubmissionFlattener
+
+ORDER_BY = '__system/submissionDate'
+
+
+def normalize_submissions(page_records: List[dict], flattener: Optional[SubmissionFlattener] = None) -> List[dict]:
+    """
+    Flattens ODK submissions into VMan records: nested groups are dropped from
+    the field names (lower case), empty values and duplicate fields are removed.
+
+    :param flattener: reuse one SubmissionFlattener (built from the form fields) for every page of a sync
+    """
+    return (flattener or SubmissionFlattener()).flatten_page(page_records)
+
+
+async def form_flattener(odk_client) -> SubmissionFlattener:
+    """SubmissionFlattener for the client's form; field precedence falls back to submission order if the fields cannot be read"""
+    try:
+        fields = await odk_client.getFormFields()
+    except Exception:
+        fields = None
+    return SubmissionFlattener(fields if isinstance(fields, list) else None)
+
+
+async def iter_submission_pages(
+    odk_client,
+    top: int = 100,
+    skip: int = 0,
+    start_date: str = None,
+    end_date: str = None,
+    concurrency: int = 1,
+    prefetch: int = 4,
+    fetch_page: Optional[Callable[..., Awaitable[Dict[str, Any]]]] = None,
+    watermark: Optional[dict] = None,
+) -> AsyncIterator[List[dict]]:
+    """
+    Yields the submissions (ODK JSON, one list per page) in submission date order.
+
+    :param concurrency: number of $skip/$top windows downloaded at the same time
+    :param prefetch: number of pages downloaded ahead of the consumer
+    :param fetch_page: replaces odk_client.getFormSubmissions (e.g. to add retries)
+    :param watermark: only submissions received or edited after it (delta sync, see sync_watermark)
+    """
+    fetch_page = fetch_page or odk_client.getFormSubmissions
+    query = dict(start_date=start_date, end_date=end_date, order_by=ORDER_BY, order_direction='asc')
+    if watermark:
+        query['watermark'] = watermark
+    first = await fetch_page(top=top, skip=skip, **query)
+    if isinstance(first, str):
+        raise Exception(f"Unexpected string response: {first}")
+
+    total = first.get('@odata.count')
+    windows = 0
+    if concurrency > 1 and getattr(odk_client, 'is_sort_allowed', False) and total is not None:
+        windows = max(math.ceil((total - (skip or 0)) / top), 1)
+
+    if windows > 1:
+        pages = _window_pages(first, fetch_page, query, top, skip or 0, windows, concurrency, max(prefetch, concurrency))
+    else:
+        pages = _linked_pages(first, fetch_page, prefetch)
+    try:
+        async for page_records in pages:
+            yield page_records
+    finally:
+        await pages.aclose()
+
+
+async def _window_pages(first, fetch_page, query, top, skip, windows, concurrency, prefetch):
+    """Downloads the $skip/$top windows in parallel, yielding them in order."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fill_window(index: int, data: Optional[dict] = None) -> List[dict]:
+        # the last window also takes submissions that arrived during the sync
+        last = index == windows - 1
+        async with semaphore:
+            if data is None:
+                data = await fetch_page(top=top, skip=skip + index * top, **query)
+            records = list(data.get('value', []))
+            # servers capping $top return the rest of the window through nextLink
+            next_link = data.get('@odata.nextLink')
+            while next_link and (last or len(records) < top):
+                data = await fetch_page(next_link=next_link)
+                records.extend(data.get('value', []))
+                next_link = data.get('@odata.nextLink')
+        return records if last else records[:top]
+
+    tasks = deque()
+    next_index = 0
+    try:
+        while tasks or next_index < windows:
+            while next_index < windows and len(tasks) < prefetch:
+                tasks.append(asyncio.ensure_future(fill_window(next_index, first if next_index == 0 else None)))
+                next_index += 1
+            records = await tasks.popleft()
+            if records:
+                yield records
+    finally:
+        await _cancel(tasks)
+
+
+async def _linked_pages(first, fetch_page, prefetch):
+    """Follows @odata.nextLink in a background reader, at most `prefetch` pages ahead."""
+    queue = asyncio.Queue(maxsize=max(prefetch, 1))
+    done = object()
+
+    async def read_pages():
+        try:
+            data = first
+            while data.get('value'):
+                await queue.put(data['value'])
+                next_link = data.get('@odata.nextLink')
+                if not next_link:
+                    break
+                data = await fetch_page(next_link=next_link)
+            await queue.put(done)
+        except Exception as exc:
+            await queue.put(exc)
+
+    reader = asyncio.ensure_future(read_pages())
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        await _cancel([reader])
+
+
+async def _cancel(tasks):
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,215 @@
+"""
+Watermarks of the ODK delta sync.
+
+For each ODK form a system_configs document records the latest
+__system/submissionDate and __system/updatedAt already synced. The next sync
+requests only submissions received or edited since them (see
+ODKClientAsync.watermark_filter), instead of comparing record counts.
+
+The submissions stamped with the watermark times themselves are synced
+already, except those received or edited in the same millisecond after the
+sync: they are counted by comparing that slice with the local records (see
+unsynced_at_watermark), so an unchanged form has nothing to download.
+
+Submissions deleted on the server are found by comparing instance IDs only
+($select=__id) with the local ODK records, which is done when there are
+more local records than submissions on the server.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from arango.database import StandardDatabase
+from fastapi.concurrency import run_in_threadpool
+
+from app.settings.models.settings import OdkConfigModel
+from app.shared.configs.constants import db_collections
+from app.shared.services.va_rollups import VARollupService
+from app.shared.services.va_stats_service import VAStatsService
+from app.shared.utils.cache import bump_cache_versions
+from app.utilits.logger import app_logger
+
+WATERMARK_KEY_PREFIX = 'odk_sync_watermark'
+ID_PAGE_SIZE = 10000
+# never remove more than this share of the local ODK records in one sync:
+# a larger difference means a different form or server, not deletions
+MAX_DELETE_RATIO = 0.5
+REMOVE_BATCH_SIZE = 1000
+
+
+def merge_watermarks(*watermarks: Optional[dict]) -> Optional[dict]:
+    """The latest submission date and update time of several watermarks"""
+    merged = {}
+    for watermark in watermarks:
+        for field in ('submission_date', 'updated_at'):
+            value = (watermark or {}).get(field)
+            if value and (merged.get(field) is None or value > merged[field]):
+                merged[field] = value
+    return {'submission_date': merged.get('submission_date'), 'updated_at': merged.get('updated_at')} if merged else None
+
+
+def submissions_watermark(page_records: List[dict]) -> Optional[dict]:
+    """Watermark of a page of ODK submissions (ODK JSON, before normalisation)"""
+    system = [record.get('__system') or {} for record in page_records]
+    return merge_watermarks(*(
+        {'submission_date': item.get('submissionDate'), 'updated_at': item.get('updatedAt')} for item in system
+    ))
+
+
+class ODKSyncWatermark:
+    """Per form sync watermark stored in system_configs"""
+
+    @staticmethod
+    def key(odk_config: OdkConfigModel) -> str:
+        return f"{WATERMARK_KEY_PREFIX}_{odk_config.project_id}_{odk_config.form_id}"
+
+    @classmethod
+    def _get_sync(cls, db: StandardDatabase, odk_config: OdkConfigModel) -> Optional[Dict[str, Any]]:
+        document = db.collection(db_collections.SYSTEM_CONFIGS).get(cls.key(odk_config))
+        # a watermark of another server does not describe the local records
+        if not document or document.get('url') != str(odk_config.url).rstrip('/'):
+            return None
+        if not (document.get('submission_date') or document.get('updated_at')):
+            return None
+        return {'submission_date': document.get('submission_date'), 'updated_at': document.get('updated_at')}
+
+    @classmethod
+    async def get(cls, db: StandardDatabase, odk_config: OdkConfigModel) -> Optional[Dict[str, Any]]:
+        """The watermark of the configured form, None before its first complete sync"""
+        return await run_in_threadpool(cls._get_sync, db, odk_config)
+
+    @classmethod
+    def _save_sync(cls, db: StandardDatabase, odk_config: OdkConfigModel, watermark: dict):
+        db.collection(db_collections.SYSTEM_CONFIGS).insert({
+            '_key': cls.key(odk_config),
+            'url': str(odk_config.url).rstrip('/'),
+            'project_id': odk_config.project_id,
+            'form_id': odk_config.form_id,
+            'submission_date': watermark.get('submission_date'),
+            'updated_at': watermark.get('updated_at'),
+            'synced_at': datetime.now().isoformat(),
+        }, overwrite=True, overwrite_mode="replace")
+
+    @classmethod
+    def _advance_sync(cls, db: StandardDatabase, odk_config: OdkConfigModel, watermark: Optional[dict]):
+        watermark = merge_watermarks(cls._get_sync(db, odk_config), watermark)
+        if watermark:
+            cls._save_sync(db, odk_config, watermark)
+        return watermark
+
+    @classmethod
+    async def advance(cls, db: StandardDatabase, odk_config: OdkConfigModel, watermark: Optional[dict]):
+        """Move the watermark forward to the latest submission synced (never backwards)"""
+        return await run_in_threadpool(cls._advance_sync, db, odk_config, watermark)
+
+    @classmethod
+    def _rebuild_sync(cls, db: StandardDatabase, odk_config: OdkConfigModel):
+        query = f"""
+            FOR doc IN {db_collections.VA_TABLE}
+                FILTER doc.vman_data_source == null
+                COLLECT AGGREGATE submission_date = MAX(doc.submissiondate), updated_at = MAX(doc.updatedat)
+                RETURN {{ submission_date, updated_at }}
+        """
+        watermark = db.aql.execute(query).next()
+        if watermark.get('submission_date'):
+            cls._save_sync(db, odk_config, watermark)
+        return watermark
+
+    @classmethod
+    async def rebuild(cls, db: StandardDatabase, odk_config: OdkConfigModel):
+        """Set the watermark from the local records, after a complete (non delta) sync"""
+        return await run_in_threadpool(cls._rebuild_sync, db, odk_config)
+
+    @classmethod
+    async def clear(cls, db: StandardDatabase, odk_config: OdkConfigModel):
+        """Forget the watermark, the next sync compares counts again"""
+        await run_in_threadpool(
+            db.collection(db_collections.SYSTEM_CONFIGS).delete, cls.key(odk_config), ignore_missing=True
+        )
+
+
+def _local_odk_ids_sync(db: StandardDatabase) -> Set[str]:
+    cursor = db.aql.execute(
+        f"FOR doc IN {db_collections.VA_TABLE} FILTER doc.vman_data_source == null RETURN doc.__id",
+        batch_size=ID_PAGE_SIZE, stream=True,
+    )
+    return set(cursor)
+
+
+def _local_updates_sync(db: StandardDatabase, instance_ids: List[str]) -> Dict[str, Optional[str]]:
+    cursor = db.aql.execute(f"""
+        FOR doc IN {db_collections.VA_TABLE}
+            FILTER doc.__id IN @ids AND doc.vman_data_source == null
+            RETURN [doc.__id, doc.updatedat]
+    """, bind_vars={'ids': instance_ids})
+    return dict(cursor)
+
+
+async def unsynced_at_watermark(db: StandardDatabase, submissions: List[dict]) -> int:
+    """
+    Number of submissions stamped with the watermark times (ODK JSON) that are
+    missing locally or were edited since they were synced.
+    """
+    if not submissions:
+        return 0
+    local = await run_in_threadpool(_local_updates_sync, db, [submission.get('__id') for submission in submissions])
+    return sum(
+        1 for submission in submissions
+        if submission.get('__id') not in local
+        or local[submission.get('__id')] != (submission.get('__system') or {}).get('updatedAt')
+    )
+
+
+def _remove_submissions_sync(db: StandardDatabase, instance_ids: List[str]) -> int:
+    removed = 0
+    for start in range(0, len(instance_ids), REMOVE_BATCH_SIZE):
+        cursor = db.aql.execute(f"""
+            FOR id IN @ids
+                FOR doc IN {db_collections.VA_TABLE}
+                    FILTER doc.__id == id AND doc.vman_data_source == null
+                    REMOVE doc IN {db_collections.VA_TABLE}
+                    RETURN 1
+        """, bind_vars={'ids': instance_ids[start:start + REMOVE_BATCH_SIZE]})
+        removed += len(list(cursor))
+    return removed
+
+
+async def remove_deleted_submissions(odk_client, db: StandardDatabase) -> int:
+    """
+    Removes the local ODK records whose submission no longer exists on the
+    server. Only instance IDs are downloaded, and only when the local ODK
+    records outnumber the server's submissions.
+
+    Returns the number of records removed.
+    """
+    stats = await VAStatsService.get_stats(db)
+    local_count = (stats.get('records_by_source') or {}).get(VAStatsService.UNKNOWN_SOURCE, 0)
+
+    page = await odk_client.getSubmissionIds(top=ID_PAGE_SIZE)
+    server_count = page.get('@odata.count', 0)
+    if local_count <= server_count:
+        return 0
+
+    server_ids = set()
+    while True:
+        server_ids.update(record['__id'] for record in page.get('value', []))
+        if not page.get('@odata.nextLink'):
+            break
+        page = await odk_client.getSubmissionIds(next_link=page['@odata.nextLink'])
+
+    local_ids = await run_in_threadpool(_local_odk_ids_sync, db)
+    deleted = sorted(local_ids - server_ids)
+    if not deleted:
+        return 0
+    if not server_ids or len(deleted) > len(local_ids) * MAX_DELETE_RATIO:
+        app_logger.warning(
+            f"Not removing {len(deleted)} of {len(local_ids)} ODK records missing on the server: "
+            "the form or server configuration may have changed"
+        )
+        return 0
+
+    removed = await run_in_threadpool(_remove_submissions_sync, db, deleted)
+    await bump_cache_versions(db_collections.VA_TABLE)
+    await VAStatsService.reconcile(db)
+    await VARollupService.rebuild(db)
+    app_logger.info(f"Removed {removed} records deleted on the ODK server")
+    return removed
@@ -1,3 +1,5 @@
+import math
+
 import xmltodict, json
 
 def xml_to_json(xml_data):
@@ -158,4 +160,79 @@ def assign_questions_options(field, questions):
         "name": field['name'].lower(),
         "label": label,
         "options": options
-    }
\ No newline at end of file
+    }
+
+class SubmissionFlattener:
+    """
+    Flattens ODK submissions (OData JSON) into VMan records in a single pass:
+    nested groups are dropped from the field names (lower case), null/NaN
+    values are left out, and when several fields share a name the first one
+    of the form with a value keeps it.
+
+    Unlike the json_normalize path it replaced, a record does not depend on
+    the other submissions of its page: integers stay integers (pandas made
+    them floats in columns with missing values), and a duplicated name takes
+    the value of a later field when the first one is null (pandas dropped the
+    later column of the page).
+
+    The form field list (getFormFields) fixes that precedence in form order,
+    so it is the same on every page; fields missing from the list (__system,
+    GeoJSON parts, ...) follow in the order they are met. Field names are
+    resolved once per path and reused for every submission.
+
+    The records are ready to save, no clean_document pass is needed.
+    """
+    def __init__(self, fields: list = None):
+        self._form_order = {}
+        for field in fields or []:
+            path = field.get('path', '').strip('/').lower()
+            if path and path not in self._form_order:
+                self._form_order[path] = len(self._form_order)
+        self._next_rank = len(self._form_order)
+        # path tree: key -> (name, rank, children, path)
+        self._tree = {}
+
+    def _entry(self, node: dict, key: str, parent_path: str):
+        path = f"{parent_path}/{key}" if parent_path else key
+        rank = self._form_order.get(path.lower())
+        if rank is None:
+            rank = self._next_rank
+            self._next_rank += 1
+        entry = node[key] = (key.lower(), rank, {}, path)
+        return entry
+
+    def _walk(self, submission: dict, node: dict, parent_path: str, record: dict, ranks: dict):
+        for key, value in submission.items():
+            entry = node.get(key) or self._entry(node, key, parent_path)
+            if isinstance(value, dict):
+                self._walk(value, entry[2], entry[3], record, ranks)
+                continue
+            if value is None or (isinstance(value, float) and (math.isnan(value) or math.isinf(value))):
+                continue
+            if isinstance(value, list):
+                value = [item for item in value if item is not None]
+            name, rank = entry[0], entry[1]
+            current = ranks.get(name)
+            if current is None or rank < current:
+                record[name] = value
+                ranks[name] = rank
+
+    def flatten(self, submission: dict) -> dict:
+        """Flatten one submission"""
+        record = {}
+        self._walk(submission, self._tree, '', record, {})
+        return record
+
+    def flatten_page(self, submissions: list) -> list:
+        """Flatten a page of submissions"""
+        return [self.flatten(submission) for submission in submissions]
+
+
+def flatten_submissions(submissions: list, fields: list = None) -> list:
+    """
+     Flattens ODK submissions into VMan records, see SubmissionFlattener.
+     :param submissions: ODK submissions (OData JSON)
+     :param fields: form fields from getFormFields, decide which field keeps a duplicated name
+     :returns flat records
+    """
+    return SubmissionFlattener(fields).flatten_page(submissions)
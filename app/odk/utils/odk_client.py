@@ -1,14 +1,158 @@
+import asyncio
+import hashlib
+import importlib.util
 import json
-import os
+import time
+import weakref
 from datetime import datetime
+from typing import Dict, Optional
 
 import httpx
+from decouple import config as env_config
+from redis import asyncio as aioredis
 
 from app.odk.utils.data_transform import flattenTranslations, xml_to_json
 from app.settings.models.settings import OdkConfigModel
+from app.utilits.logger import app_logger
+
+# httpx speaks HTTP/2 only when the optional h2 package is installed
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# Sessions are refreshed this many seconds before ODK Central expires them
+SESSION_REFRESH_MARGIN = 300
+SESSION_REDIS_PREFIX = "vman:odk:session:"
+
+# In-process ODK sessions: session key -> {"token", "expireAt", "expires"}
+_sessions: Dict[str, dict] = {}
+# Per event loop: pooled HTTP clients (one per ODK server), auth locks and Redis client
+_loop_state: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict]" = weakref.WeakKeyDictionary()
+
+
+def _session_key(base_url: str, username: str, password: str) -> str:
+    # the password is part of the key so changed credentials never reuse a session
+    return hashlib.sha256(f"{base_url}\n{username}\n{password}".encode()).hexdigest()
+
+
+def _expires(session_data: dict) -> float:
+    """Epoch seconds at which the session expires (ODK Central expireAt is UTC ISO 8601)"""
+    try:
+        return datetime.fromisoformat(session_data['expireAt'].replace('Z', '+00:00')).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return 0.0
+
+
+def _is_fresh(session_data: Optional[dict]) -> bool:
+    return bool(session_data and session_data.get('token')) and \
+        session_data['expires'] - SESSION_REFRESH_MARGIN > time.time()
+
+
+def _state() -> dict:
+    loop = asyncio.get_running_loop()
+    state = _loop_state.get(loop)
+    if state is None:
+        state = _loop_state[loop] = {"clients": {}, "locks": {}, "redis": None}
+    return state
+
+
+def _create_http_client(base_url: str) -> httpx.AsyncClient:
+    # 60s read timeout; ODK Central can be slow on large pages
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(60.0, connect=10.0),
+        limits=httpx.Limits(
+            max_connections=env_config('ODK_MAX_CONNECTIONS', default=20, cast=int),
+            max_keepalive_connections=env_config('ODK_MAX_CONNECTIONS', default=20, cast=int),
+            keepalive_expiry=60.0,
+        ),
+        http2=HTTP2_AVAILABLE and env_config('ODK_HTTP2', default=True, cast=bool),
+    )
+
+
+def get_odk_http_client(base_url: str) -> httpx.AsyncClient:
+    """Long-lived pooled HTTP client for an ODK server, shared by every ODKClientAsync of the event loop"""
+    clients = _state()["clients"]
+    client = clients.get(base_url)
+    if client is None or client.is_closed:
+        client = clients[base_url] = _create_http_client(base_url)
+    return client
+
+
+def _get_redis():
+    """Redis client used to share sessions between processes (Celery workers), None when disabled"""
+    if not env_config('ODK_SESSION_REDIS', default=True, cast=bool):
+        return None
+    state = _state()
+    if state["redis"] is None:
+        state["redis"] = aioredis.from_url(
+            env_config('REDIS_URL', default="redis://localhost:6370"),
+            password=env_config('REDIS_PASSWORD', default=None),
+            socket_connect_timeout=2,
+            socket_timeout=2,
+        )
+    return state["redis"]
+
+
+async def _redis_get_session(key: str) -> Optional[dict]:
+    redis = _get_redis()
+    if redis is None:
+        return None
+    try:
+        value = await redis.get(SESSION_REDIS_PREFIX + key)
+        return json.loads(value) if value else None
+    except Exception as e:
+        app_logger.debug(f"ODK session cache (redis) unavailable: {e}")
+        return None
+
+
+async def _redis_set_session(key: str, session_data: dict):
+    redis = _get_redis()
+    ttl = int(session_data['expires'] - time.time())
+    if redis is None or ttl <= 0:
+        return
+    try:
+        await redis.set(SESSION_REDIS_PREFIX + key, json.dumps(session_data), ex=ttl)
+    except Exception as e:
+        app_logger.debug(f"ODK session cache (redis) unavailable: {e}")
+
+
+async def _redis_delete_session(key: str, token: Optional[str] = None):
+    redis = _get_redis()
+    if redis is None:
+        return
+    try:
+        if token is not None:
+            shared = await _redis_get_session(key)
+            if not shared or shared.get('token') != token:
+                return
+        await redis.delete(SESSION_REDIS_PREFIX + key)
+    except Exception as e:
+        app_logger.debug(f"ODK session cache (redis) unavailable: {e}")
+
+
+async def close_odk_clients():
+    """Close the pooled ODK HTTP clients (and Redis client) of the running event loop"""
+    loop = asyncio.get_running_loop()
+    state = _loop_state.pop(loop, None)
+    if not state:
+        return
+    for client in state["clients"].values():
+        await client.aclose()
+    if state["redis"] is not None:
+        try:
+            await state["redis"].close()
+        except Exception:
+            pass
 
 
 class ODKClientAsync:
+    """
+    Async client of the ODK Central API.
+
+    Sessions are cached per server and credentials: in process, and through
+    Redis so Celery workers share them. A session is refreshed shortly before
+    it expires, and concurrent requests needing a new one wait for a single
+    authentication. HTTP connections are pooled per server and event loop, so
+    entering the client does not open new connections.
+    """
     def __init__(self, config: OdkConfigModel):
         self.odk_default_project_id = config.project_id
         # Strip trailing slash so endpoint paths never get a double slash
@@ -18,88 +162,99 @@ class ODKClientAsync:
         self.odk_password = config.password
         self.odk_form_id = config.form_id
         self.is_sort_allowed = config.is_sort_allowed
+        self.session_key = _session_key(self.odk_base_url, self.odk_username, self.odk_password)
 
     async def __aenter__(self):
-        # 60s read timeout; ODK Central can be slow on large pages
-        self.client = httpx.AsyncClient(timeout=httpx.Timeout(60.0, connect=10.0))
+        self.client = get_odk_http_client(self.odk_base_url)
         return self
-    
+
     async def __aexit__(self, exc_type, exc_value, exc_tb):
-        await self.client.aclose()
+        # the pooled client stays open for the next ODKClientAsync (see close_odk_clients)
         if isinstance(exc_value, IndexError):
             print(f"An exception occurred: {exc_type}")
             print(f"Exception: {exc_value}")
             return True
 
+    @classmethod
+    async def invalidate_session(cls, config: OdkConfigModel):
+        """Forget the cached session of a configuration, the next request authenticates again"""
+        key = _session_key(str(config.url).rstrip('/'), config.username, config.password)
+        _sessions.pop(key, None)
+        await _redis_delete_session(key)
+
     async def send_request(self, method, url, headers=None, **kwargs):
         session_object = await self.odk_authenticate()
-        
-        
+
         if not session_object:
             return httpx.Response(status_code=404, content="Cannot authenticate to the remote server")
 
-        if headers:
-            self.client.headers.update(headers)
-
-        self.client.headers.update({'Authorization': f'Bearer {session_object["token"]}'})
-
-
-        response = await self.client.request(method, url, **kwargs)
+        request_headers = dict(headers or {})
+        request_headers['Authorization'] = f'Bearer {session_object["token"]}'
+        response = await self.client.request(method, url, headers=request_headers, **kwargs)
         # 401 = token expired/invalid; 403 = token from a different server.
-        # Both mean the cached session is stale — clear it and retry once.
+        # Both mean the cached session is stale — replace it and retry once.
         if response.status_code in {401, 403}:
-            if os.path.exists("session.json"):
-                os.remove("session.json")
-
-            session_object = await self.odk_authenticate()
+            session_object = await self.odk_authenticate(stale_token=session_object["token"])
             if session_object and "token" in session_object:
-                self.client.headers.update({'Authorization': f'Bearer {session_object["token"]}'})
-                response = await self.client.request(method, url, **kwargs)
+                request_headers['Authorization'] = f'Bearer {session_object["token"]}'
+                response = await self.client.request(method, url, headers=request_headers, **kwargs)
             else:
                 return httpx.Response(status_code=404, content="Cannot authenticate to the remote server")
         return response
 
-    async def odk_authenticate(self, headers=None, session_cache=None, clear_cache=False):
+    async def odk_authenticate(self, headers=None, stale_token: str = None, clear_cache=False):
+        """
+        Returns a valid session ({"token", "expireAt", ...}), or None when the
+        server refuses the credentials.
+
+        :param stale_token: token the server rejected; the session is replaced unless another request already did
+        :param clear_cache: always authenticate again
+        """
+        key = self.session_key
+        session_data = _sessions.get(key)
+        if not clear_cache and _is_fresh(session_data) and session_data['token'] != stale_token:
+            return session_data
+
+        locks = _state()["locks"]
+        lock = locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            # another request may have authenticated while this one waited
+            session_data = _sessions.get(key)
+            if not clear_cache and _is_fresh(session_data) and session_data['token'] != stale_token:
+                return session_data
+
+            if not clear_cache:
+                session_data = await _redis_get_session(key)
+                if _is_fresh(session_data) and session_data['token'] != stale_token:
+                    _sessions[key] = session_data
+                    return session_data
+            if stale_token is not None or clear_cache:
+                _sessions.pop(key, None)
+                await _redis_delete_session(key, token=None if clear_cache else stale_token)
+
+            session_data = await self._create_session(headers)
+            if session_data:
+                _sessions[key] = session_data
+                await _redis_set_session(key, session_data)
+            return session_data
+
+    async def _create_session(self, headers=None) -> Optional[dict]:
         headers = headers if headers else {"Content-Type": 'application/json'}
-        session_cache = session_cache if session_cache else "session.json"
-        
-        if clear_cache and os.path.exists(session_cache):
-            os.remove(session_cache)
-
-        try:
-            with open(session_cache, 'r') as file:
-                session_data = json.load(file)
-        except (FileNotFoundError, json.JSONDecodeError):
-            session_data = None
-
-        if session_data and 'expireAt' in session_data:
-            now = datetime.now()
-            expire = datetime.strptime(session_data['expireAt'], "%Y-%m-%dT%H:%M:%SZ")
-
-            if now > expire:
-                session_data = None
-
-        if not session_data:
-            user = json.dumps({"email": self.odk_username, "password": self.odk_password})
-            url = f"{self.odk_base_url}/{self.odk_api_version}/sessions"
-
-            async with httpx.AsyncClient(timeout=httpx.Timeout(30.0, connect=10.0)) as client:
-                response = await client.post(url, data=user, headers=headers)
-
-                if response.status_code in {200, 201}:
-                    session_data = response.json()
-                    with open(session_cache, 'w') as file:
-                        json.dump(session_data, file)
-                if response.status_code in {403, 401}:
-                    response = await client.post(url, data=user, headers=headers)
-
-                    if response.status_code in {200, 201}:
-                        session_data = response.json()
-                        with open(session_cache, 'w') as file:
-                            json.dump(session_data, file)
-        return session_data
-    
-    async def getFormSubmissions(self, start_date=None, end_date=None, skip: int = None, top: int = None, order_by: str = None, order_direction: str = 'asc', next_link: str = None):
+        user = json.dumps({"email": self.odk_username, "password": self.odk_password})
+        url = f"{self.odk_base_url}/{self.odk_api_version}/sessions"
+        client = get_odk_http_client(self.odk_base_url)
+
+        for _ in range(2):
+            response = await client.post(url, content=user, headers=headers, timeout=httpx.Timeout(30.0, connect=10.0))
+            if response.status_code in {200, 201}:
+                session_data = response.json()
+                session_data['expires'] = _expires(session_data)
+                return session_data
+            if response.status_code not in {403, 401}:
+                break
+        return None
+
+    async def getFormSubmissions(self, start_date=None, end_date=None, skip: int = None, top: int = None, order_by: str = None, order_direction: str = 'asc', next_link: str = None, watermark: dict = None, watermark_op: str = 'ge'):
         headers = {
             "Content-Type": 'application/json',
             "X-Extended-Metadata": "true"
@@ -127,6 +282,12 @@ class ODKClientAsync:
             if len(end_date) > 0 and len(start_date) == 0:
                 filter = f'&$filter=__system/submissionDate le {end_date}'
 
+            # delta sync: submissions received or edited since the watermark
+            # (inclusive for downloads, see watermark_filter)
+            delta_filter = self.watermark_filter(watermark, watermark_op)
+            if delta_filter:
+                filter = f'{filter} and {delta_filter}' if filter else f'&$filter={delta_filter}'
+
             if order_by and self.is_sort_allowed:
                 if order_direction not in ("asc", "desc"):
                     order_direction = "asc"
@@ -148,6 +309,36 @@ class ODKClientAsync:
 
 
 
+    @staticmethod
+    def watermark_filter(watermark: dict = None, op: str = 'gt') -> str:
+        """
+        OData condition comparing the submission and update times with a sync watermark:
+        'gt' selects the submissions received or edited after it (the delta count),
+        'eq' the ones stamped with its times (already synced, or received in the
+        same millisecond after the sync), 'ge' both (the delta download).
+        """
+        if not watermark:
+            return ""
+        conditions = []
+        if watermark.get('submission_date'):
+            conditions.append(f"__system/submissionDate {op} {watermark['submission_date']}")
+        if watermark.get('updated_at'):
+            conditions.append(f"__system/updatedAt {op} {watermark['updated_at']}")
+        return f"({' or '.join(conditions)})" if conditions else ""
+
+    async def getSubmissionIds(self, top: int = 10000, next_link: str = None):
+        """One page of submission instance IDs only ($select=__id), with @odata.count"""
+        headers = {
+            "Content-Type": 'application/json'
+        }
+        url = next_link or f"{self.odk_base_url}/{self.odk_api_version}/projects/{self.odk_default_project_id}/forms/{self.odk_form_id}.svc/Submissions?$count=true&$select=__id&$top={top}"
+
+        response = await self.send_request('get', url, headers=headers)
+
+        if response.status_code in {200, 201}:
+            return response.json()
+        raise Exception(f"Failed to fetch submission IDs (HTTP {response.status_code}): {response.text}")
+
     async def getFormQuestions(self):  
         
         headers = {
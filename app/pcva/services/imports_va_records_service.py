@@ -30,7 +30,7 @@ async def get_imports_va_by_import_detail(
         """
 
         va_records = await VManBaseModel.run_custom_query(query=query, bind_vars=bind_vars, db=db)
-        records = [record for record in va_records]
+        records = await va_records.to_list()
 
         count_query = f"""
             FOR doc IN {db_collections.IMPORTS_VA_TABLE}
@@ -39,7 +39,7 @@ async def get_imports_va_by_import_detail(
             RETURN length
         """
         count_cursor = await VManBaseModel.run_custom_query(query=count_query, bind_vars={"import_detail_uuid": import_detail_uuid}, db=db)
-        total = count_cursor.next() if count_cursor else len(records)
+        total = await count_cursor.first() if count_cursor else len(records)
 
         return ResponseMainModel(
             data=records,
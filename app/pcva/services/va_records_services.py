@@ -103,7 +103,7 @@ async def get_unassigned_va_service(paging: bool = True, page_number: int = 0, l
         })
 
         query_result = await VManBaseModel.run_custom_query(query=query, bind_vars=bind_vars, db=db)
-        query_result = query_result.next()
+        query_result = await query_result.first()
         unassigned_data = [format_va_record(va, config) for va in query_result['data']]
         return ResponseMainModel(data=unassigned_data, message="Unassigned VAs fetched successfully!", total = query_result["total"], pager=Pager(page=page_number, limit=limit))
     except Exception as e:
@@ -187,7 +187,7 @@ async def get_uncoded_assignment_service(paging: bool = True, page_number: int =
         })
 
         query_result = await VManBaseModel.run_custom_query(query=query, bind_vars=bind_vars, db=db)
-        query_result = query_result.next()
+        query_result = await query_result.first()
         unassigned_data = [format_va_record(va, config) for va in query_result['data']]
         return ResponseMainModel(data=unassigned_data, message="Assigned VAs fetched successfully!", total = query_result["total"], pager=Pager(page=page_number, limit=limit))
     except Exception as e:
@@ -374,7 +374,7 @@ async def get_va_assignment_service(paging: bool, page_number: int = None, limit
         
 
         query_result = await VManBaseModel.run_custom_query(query=query, bind_vars=bind_vars, db=db)
-        query_data = query_result.next()
+        query_data = await query_result.first()
         assignments = [format_va_record(va, config) for va in query_data['assigned_vas']]
         
         return ResponseMainModel(data=assignments, message="Assignments fetched successfully!", total = query_data['totalCount'], pager=Pager(page=page_number, limit=limit))
@@ -530,7 +530,7 @@ async def get_coded_va_service(paging: bool, page_number: int = None, limit: int
             """
         coded_vas = await VManBaseModel.run_custom_query(query = query, bind_vars = bind_vars, db = db)
 
-        coded_data = [format_va_record(va, config) for va in coded_vas]
+        coded_data = [format_va_record(va, config) async for va in coded_vas]
         return ResponseMainModel(data = coded_data, total=len(coded_data), message="Coded VAs fetched successfully!", pager=Pager(page=page_number, limit=limit)) 
     
     except Exception as e:
@@ -581,7 +581,7 @@ async def get_coded_va_details(paging: bool, page_number: int = None, limit: int
         })
         coded_vas = await VManBaseModel.run_custom_query(query = query, bind_vars = bind_vars, db = db)
 
-        coded_vas = coded_vas.next() if include_history else coded_vas
+        coded_vas = await coded_vas.first() if include_history else await coded_vas.to_list()
 
         coded_data = [await PCVAResultsResponseClass.get_structured_codedVA(pcva_result = coded_va, db = db) for coded_va in coded_vas]
         return ResponseMainModel(data = coded_data, total=len(coded_data), message="Coded VAs fetched successfully!", pager=Pager(page=page_number, limit=limit)) 
@@ -611,11 +611,11 @@ async def get_concordants_va_service(
         bind_vars = {
             "concordants": vas
         }
-        va_data = VManBaseModel.run_custom_query(query=query, bind_vars=bind_vars, db=db)
+        va_data = await VManBaseModel.run_custom_query(query=query, bind_vars=bind_vars, db=db)
         
         total_concordants = results.get("total_concordants", "")
 
-        return ResponseMainModel(data=[format_va_record(va, config) for va in va_data], message="Concordants VAs fetched successfully", total=total_concordants, pager=Pager(page=page_number, limit=limit) if paging else None)
+        return ResponseMainModel(data=[format_va_record(va, config) async for va in va_data], message="Concordants VAs fetched successfully", total=total_concordants, pager=Pager(page=page_number, limit=limit) if paging else None)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get concordants: {e}")
 
@@ -646,7 +646,7 @@ async def get_discordants_va_service(
 
         total_discordants = results.get("total_discordants", "")
 
-        return ResponseMainModel(data=[format_va_record(va, config) for va in va_data], message="Discordants VAs fetched successfully", total=total_discordants, pager=Pager(page=page_number, limit=limit) if paging else None)
+        return ResponseMainModel(data=[format_va_record(va, config) async for va in va_data], message="Discordants VAs fetched successfully", total=total_discordants, pager=Pager(page=page_number, limit=limit) if paging else None)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get discordants: {e}")
     
@@ -731,7 +731,7 @@ async def get_coders(
             db = db
         )
         
-        coders_data = [CoderResponseClass(**coder) for coder in coders.next()]
+        coders_data = [CoderResponseClass(**coder) for coder in await coders.first()]
 
         return ResponseMainModel(data = coders_data, total=len(coders_data), message="Coders fetched successfully!", pager=Pager(page=page_number, limit=limit))
     except Exception as e:
@@ -808,7 +808,7 @@ async def get_pcva_results(
         if not results:
             return ResponseMainModel(data=[], message="No PCVA results found!")
         pcva_results = []
-        for result in results:
+        async for result in results:
             result = await populate_user_fields(data = result, specific_fields=["coder"], db=db)
             pcva_results.append(result) 
         return ResponseMainModel(data=pcva_results, message="PCVA results fetched successfully!", pager=Pager(page=page_number, limit=limit) if paging else None)
@@ -925,7 +925,7 @@ async def export_pcva_results(db: StandardDatabase = None):
             query = query,
             db = db
         )
-        results = [result for result in results]
+        results = await results.to_list()
         sorted_results = sorted(results, key=lambda x: x['coders'], reverse=True)
         columns = list(sorted_results[0].keys())
 
@@ -1034,7 +1034,7 @@ async def get_discordant_messages_service(va_id: str, coder: str, db: StandardDa
         }
 
         discordant_messages_cursor = await PCVAMessages.run_custom_query(query=query, bind_vars=bind_vars, db = db)
-        discordant_messages = discordant_messages_cursor.next()
+        discordant_messages = await discordant_messages_cursor.first()
 
         discordant_messages['coded'] = [await PCVAResultsResponseClass.get_structured_codedVA(pcva_result = discordant_messages['coded'][0], db = db)]
         discordant_messages['discordants'] = [
@@ -151,4 +151,4 @@ async def get_categorised_pcva_results(coder_uuid: str = None, paging: bool = No
 
     categorised_results = await VManBaseModel.run_custom_query(query = query, bind_vars = bind_vars, db=db)
 
-    return categorised_results.next() if categorised_results else None
\ No newline at end of file
+    return await categorised_results.first()
\ No newline at end of file
@@ -1,5 +1,6 @@
+import re
 from datetime import date
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional
 
 from arango import ArangoError
 from arango.database import StandardDatabase
@@ -7,12 +8,16 @@ from fastapi.concurrency import run_in_threadpool
 
 from app.records.responses.data import map_to_data_response
 from app.settings.services.odk_configs import fetch_odk_config
+from app.shared.configs.arangodb_async import get_async_db
 from app.shared.configs.constants import db_collections
 from app.shared.configs.models import ResponseMainModel
 from app.shared.configs.security import get_location_limit_values
 from app.shared.middlewares.exceptions import BadRequestException
 from app.utilits.logger import app_logger
 
+# Documents per round trip when streaming VA records
+STREAM_BATCH_SIZE = 2000
+
 
 async def fetch_va_records(current_user:dict,paging: bool = True, page_number: int = 1, limit: int = 10, start_date: Optional[date] = None, end_date: Optional[date] = None, locations: Optional[List[str]] = None, date_type:Optional[str]=None, search_by: Optional[str] = None, search_value: Optional[str] = None, db: StandardDatabase = None) -> ResponseMainModel:
     try:
@@ -127,47 +132,55 @@ async def fetch_va_records(current_user:dict,paging: bool = True, page_number: i
 
 
 
+def _va_records_filters(config, data_source: Optional[str] = None, start_date: Optional[date] = None, end_date: Optional[date] = None, locations: Optional[List[str]] = None, date_type: Optional[str] = None):
+    """
+        Builds the FILTER conditions (and their bind variables) used to select the VA records for CCVA.
+    """
+    region_field = config.field_mapping.location_level1
+    if date_type is not None:
+        if date_type == 'submission_date':
+            today_field = 'submissiondate'
+        elif date_type == 'death_date':
+            today_field = 'id10023'
+        elif date_type == 'interview_date':
+            today_field = 'id10012'
+        else:
+            today_field = config.field_mapping.date 
+    else:
+        today_field = config.field_mapping.date 
+    bind_vars = {}
+    filters = []
+    if start_date:
+        filters.append(f"doc.{today_field} >= @start_date")
+        bind_vars["start_date"] = str(start_date)
+    
+    if end_date:
+        filters.append(f"doc.{today_field} <= @end_date")
+        bind_vars["end_date"] = str(end_date)
+
+    if locations:
+        filters.append(f"doc.{region_field} IN @locations")
+        bind_vars["locations"] = locations
+    # filter by data source and task id, THIS ID CASE WHEN WE IMPORT DATA FROM CSV, AND WE WANT THEM ONLY
+    if data_source is  None : 
+        filters.append('doc.vman_data_source !="data_source"')
+    if data_source :
+        filters.append(f'doc.vman_data_source =="{data_source}"')
+    return filters, bind_vars
+
+
 async def fetch_va_records_json(current_user:dict,paging: bool = True,data_source:Optional[str]=None, task_id:Optional[str]=None, page_number: int = 1, limit: int = 10, start_date: Optional[date] = None, end_date: Optional[date] = None, locations: Optional[List[str]] = None,date_type:Optional[str]=None, db: StandardDatabase = None, top:Optional[int]=None) -> ResponseMainModel:
     try:
         config = await fetch_odk_config(db)
-        region_field = config.field_mapping.location_level1
         # locationKey, locationLimitValues = get_location_limit_values(current_user)
-        if date_type is not None:
-            if date_type == 'submission_date':
-                today_field = 'submissiondate'
-            elif date_type == 'death_date':
-                today_field = 'id10023'
-            elif date_type == 'interview_date':
-                today_field = 'id10012'
-            else:
-                today_field = config.field_mapping.date 
-        else:
-            today_field = config.field_mapping.date 
         collection = db.collection(db_collections.VA_TABLE)  # Use the actual collection name here
         query = f"FOR doc IN {collection.name} "
-        bind_vars = {}
-        filters = []
         ## filter by location limits
         # if locationLimitValues and locationKey:
         #     filters.append(f"doc.{locationKey} IN @locationValues")
         #     bind_vars["locationValues"] = locationLimitValues
         # ##
-        if start_date:
-            filters.append(f"doc.{today_field} >= @start_date")
-            bind_vars["start_date"] = str(start_date)
-        
-        if end_date:
-            filters.append(f"doc.{today_field} <= @end_date")
-            bind_vars["end_date"] = str(end_date)
-
-        if locations:
-            filters.append(f"doc.{region_field} IN @locations")
-            bind_vars["locations"] = locations
-        # filter by data source and task id, THIS ID CASE WHEN WE IMPORT DATA FROM CSV, AND WE WANT THEM ONLY
-        if data_source is  None : 
-            filters.append('doc.vman_data_source !="data_source"')
-        if data_source :
-            filters.append(f'doc.vman_data_source =="{data_source}"')
+        filters, bind_vars = _va_records_filters(config, data_source, start_date, end_date, locations, date_type)
         
         # if task_id:
         #     filters.append(f'doc.trackid =="{task_id}"')
@@ -213,47 +226,57 @@ async def fetch_va_records_json(current_user:dict,paging: bool = True,data_sourc
     except Exception as e:
         print(e)
         raise BadRequestException(f"Failed to fetch records: {str(e)}",str(e))
+
+
+async def stream_va_records_json(current_user: dict, data_source: Optional[str] = None, start_date: Optional[date] = None, end_date: Optional[date] = None, locations: Optional[List[str]] = None, date_type: Optional[str] = None, db: StandardDatabase = None, top: Optional[int] = None, fields: Optional[List[str]] = None, field_suffixes: Optional[List[str]] = None, batch_size: int = STREAM_BATCH_SIZE) -> AsyncIterator[List[dict]]:
+    """
+        Streaming variant of fetch_va_records_json (paging=False): yields the matching
+        records one cursor batch at a time instead of collecting them in one list.
+
+        :param fields: only return these attributes of each record (all when neither fields nor field_suffixes is given)
+        :param field_suffixes: also return the attributes whose name ends with one of these (case-insensitive),
+            e.g. the question IDs of CSV uploads that kept their group prefixes
+        :param batch_size: number of records per yielded batch
+    """
+    try:
+        config = await fetch_odk_config(db)
+        query = f"FOR doc IN {db_collections.VA_TABLE} "
+        filters, bind_vars = _va_records_filters(config, data_source, start_date, end_date, locations, date_type)
+        if filters:
+            query += "FILTER " + " AND ".join(filters) + " "
+        if top and top > 0:
+            query += "LIMIT @size "
+            bind_vars["size"] = top
+        if field_suffixes:
+            query += "RETURN KEEP(doc, ATTRIBUTES(doc)[* FILTER CURRENT IN @fields OR REGEX_TEST(CURRENT, @field_pattern, true)])"
+            bind_vars["fields"] = list(fields or [])
+            bind_vars["field_pattern"] = "(" + "|".join(re.escape(suffix) for suffix in field_suffixes) + ")$"
+        elif fields:
+            query += "RETURN KEEP(doc, @fields)"
+            bind_vars["fields"] = list(fields)
+        else:
+            query += "RETURN doc"
+
+        cursor = await get_async_db(db).aql(query, bind_vars=bind_vars, batch_size=batch_size, stream=True)
+        async with cursor:
+            async for batch in cursor.batches():
+                yield batch
+    except ArangoError as e:
+        raise BadRequestException("Failed to fetched records",str(e))
+    except BadRequestException:
+        raise
+    except Exception as e:
+        raise BadRequestException(f"Failed to fetch records: {str(e)}",str(e))
     
 async def fetch_va_records_count(current_user:dict, start_date: Optional[date] = None, end_date: Optional[date] = None, locations: Optional[List[str]] = None,date_type:Optional[str]=None, db: StandardDatabase = None, top:Optional[int]=None, data_source:Optional[str]=None) -> int:
     try:
         config = await fetch_odk_config(db)
-        region_field = config.field_mapping.location_level1
-        
-        if date_type is not None:
-            if date_type == 'submission_date':
-                today_field = 'submissiondate'
-            elif date_type == 'death_date':
-                today_field = 'id10023'
-            elif date_type == 'interview_date':
-                today_field = 'id10012'
-            else:
-                today_field = config.field_mapping.date 
-        else:
-            today_field = config.field_mapping.date 
             
         collection = db.collection(db_collections.VA_TABLE)
         
         # Build count query with same filters
         query = f"FOR doc IN {collection.name} "
-        bind_vars = {}
-        filters = []
-        
-        if start_date:
-            filters.append(f"doc.{today_field} >= @start_date")
-            bind_vars["start_date"] = str(start_date)
-        
-        if end_date:
-            filters.append(f"doc.{today_field} <= @end_date")
-            bind_vars["end_date"] = str(end_date)
-
-        if locations:
-            filters.append(f"doc.{region_field} IN @locations")
-            bind_vars["locations"] = locations
-            
-        if data_source is None: 
-            filters.append('doc.vman_data_source !="data_source"')
-        if data_source:
-            filters.append(f'doc.vman_data_source =="{data_source}"')
+        filters, bind_vars = _va_records_filters(config, data_source, start_date, end_date, locations, date_type)
             
         if filters:
             query += "FILTER " + " AND ".join(filters) + " "
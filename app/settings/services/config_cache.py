@@ -0,0 +1,209 @@
+"""
+Two-tier cache of the system configuration (the vman_config document of
+system_configs) as SettingsConfigData.
+
+fetch_odk_config runs on almost every request path (record lists,
+statistics, CCVA, PCVA formatting, exports). Configurations are kept in a
+small per-process LRU in front of a Redis copy, so a lookup is an
+in-memory read and a process only goes to the database when Redis does not
+hold the current version either.
+
+    Redis  vman_cache:config:<db>:<key>          {"version": n, "document": {...}}
+           vman_cache:config_version:<db>:<key>  n, incremented by every save
+
+save_system_settings calls invalidate(), which increments the version and
+publishes the key on CHANNEL. Every API worker listens to it (see
+start_listener) and drops its local copy, so changes are seen at once.
+Processes that are not subscribed (Celery workers, or while the listener
+reconnects) keep local copies for UNSUBSCRIBED_TTL seconds only. Cached
+configurations are shared: callers must not modify them.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from arango.database import StandardDatabase
+from fastapi.concurrency import run_in_threadpool
+
+from app.settings.models.settings import SettingsConfigData
+from app.shared.configs.constants import db_collections
+from app.shared.utils.cache import CACHE_PREFIX
+from app.utilits.logger import app_logger
+
+CONFIG_KEY = 'vman_config'
+CHANNEL = f"{CACHE_PREFIX}:config:invalidate"
+LOCAL_CACHE_SIZE = 32
+UNSUBSCRIBED_TTL = 1.0  # seconds
+REDIS_TTL = 3600  # seconds
+
+
+def _redis_client():
+    from app.tasks.redis_client import get_redis_client
+
+    return get_redis_client()
+
+
+class ConfigCache:
+    """Per-process LRU of configurations in front of Redis, invalidated through Redis pub/sub"""
+
+    def __init__(self, redis: Callable[[], Any] = _redis_client, size: int = LOCAL_CACHE_SIZE,
+                 clock: Callable[[], float] = time.monotonic):
+        self.redis = redis
+        self.size = size
+        self.clock = clock
+        self.stats = {'local_hits': 0, 'redis_hits': 0, 'database_reads': 0, 'invalidations': 0}
+
+        self._lock = threading.Lock()
+        self._local: "OrderedDict[Tuple[str, str], Tuple[SettingsConfigData, float]]" = OrderedDict()
+        self._generation = 0  # incremented by every invalidation
+        self._subscribed = False
+        self._listener: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @staticmethod
+    def redis_keys(db_name: str, key: str) -> Tuple[str, str]:
+        return f"{CACHE_PREFIX}:config:{db_name}:{key}", f"{CACHE_PREFIX}:config_version:{db_name}:{key}"
+
+    async def get(self, db: StandardDatabase, key: str = CONFIG_KEY) -> Optional[SettingsConfigData]:
+        """The configuration stored under `key`, None when there is none"""
+        cache_key = (getattr(db, 'name', None) or '_system', key)
+        config = self._local_get(cache_key)
+        if config is not None:
+            return config
+        with self._lock:
+            generation = self._generation
+        config = await run_in_threadpool(self._load_sync, db, *cache_key)
+        if config is not None:
+            self._local_set(cache_key, config, generation)
+        return config
+
+    async def invalidate(self, db: StandardDatabase, key: str = CONFIG_KEY):
+        """Drop the cached copies of a configuration in every process (after saving it)"""
+        cache_key = (getattr(db, 'name', None) or '_system', key)
+        self._drop(cache_key)
+        await run_in_threadpool(self._invalidate_sync, *cache_key)
+
+    def clear(self):
+        """Drop every local copy"""
+        with self._lock:
+            self._generation += 1
+            self._local.clear()
+
+    def _local_get(self, cache_key: Tuple[str, str]) -> Optional[SettingsConfigData]:
+        with self._lock:
+            entry = self._local.get(cache_key)
+            if entry is None:
+                return None
+            config, loaded_at = entry
+            if not self._subscribed and self.clock() - loaded_at >= UNSUBSCRIBED_TTL:
+                del self._local[cache_key]
+                return None
+            self._local.move_to_end(cache_key)
+            self.stats['local_hits'] += 1
+            return config
+
+    def _local_set(self, cache_key: Tuple[str, str], config: SettingsConfigData, generation: int):
+        with self._lock:
+            # invalidated while loading: the loaded configuration may be the previous one
+            if generation != self._generation:
+                return
+            self._local[cache_key] = (config, self.clock())
+            self._local.move_to_end(cache_key)
+            while len(self._local) > self.size:
+                self._local.popitem(last=False)
+
+    def _drop(self, cache_key: Tuple[str, str]):
+        with self._lock:
+            self._generation += 1
+            self._local.pop(cache_key, None)
+            self.stats['invalidations'] += 1
+
+    def _load_sync(self, db: StandardDatabase, db_name: str, key: str) -> Optional[SettingsConfigData]:
+        """Read the configuration from Redis if it holds the current version, else from the database (Synchronous)"""
+        entry_key, version_key = self.redis_keys(db_name, key)
+        redis = None
+        version = None
+        try:
+            redis = self.redis()
+            entry, version = redis.mget([entry_key, version_key])
+            if entry is not None:
+                entry = json.loads(entry)
+                if entry.get('version') == (version or '0'):
+                    self.stats['redis_hits'] += 1
+                    return SettingsConfigData(**entry['document'])
+        except Exception as e:
+            redis = None
+            app_logger.debug(f"Configuration cache unavailable, reading {key} from the database: {e}")
+
+        document = db.collection(db_collections.SYSTEM_CONFIGS).get(key)
+        self.stats['database_reads'] += 1
+        if not isinstance(document, dict):
+            return None
+        config = SettingsConfigData(**document)
+        if redis is not None:
+            try:
+                # saved with the version read before the database, a save in between makes it stale
+                entry = {'version': version or '0', 'document': config.model_dump(mode='json')}
+                redis.set(entry_key, json.dumps(entry), ex=REDIS_TTL)
+            except Exception as e:
+                app_logger.debug(f"Configuration {key} not cached in Redis: {e}")
+        return config
+
+    def _invalidate_sync(self, db_name: str, key: str):
+        try:
+            pipe = self.redis().pipeline(transaction=False)
+            pipe.incr(self.redis_keys(db_name, key)[1])
+            pipe.publish(CHANNEL, json.dumps([db_name, key]))
+            pipe.execute()
+        except Exception as e:
+            app_logger.warning(f"Configuration {key} not invalidated in other processes: {e}")
+
+    def start_listener(self):
+        """Listen for invalidations of other processes in a daemon thread"""
+        if self._listener is not None and self._listener.is_alive():
+            return
+        self._stop.clear()
+        self._listener = threading.Thread(target=self._listen, name='config-cache-listener', daemon=True)
+        self._listener.start()
+
+    def stop_listener(self):
+        self._stop.set()
+        if self._listener is not None:
+            self._listener.join(timeout=2)
+            self._listener = None
+
+    def _listen(self):
+        while not self._stop.is_set():
+            pubsub = None
+            try:
+                pubsub = self.redis().pubsub()
+                pubsub.subscribe(CHANNEL)
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is None:
+                        continue
+                    if message['type'] == 'subscribe':
+                        # invalidations published while not subscribed were missed
+                        self.clear()
+                        self._subscribed = True
+                    elif message['type'] == 'message':
+                        self._drop(tuple(json.loads(message['data'])))
+            except Exception as e:
+                app_logger.warning(f"Configuration cache listener error: {e}")
+            finally:
+                self._subscribed = False
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+            self._stop.wait(1)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, 'entries': len(self._local), 'subscribed': self._subscribed}
+
+
+config_cache = ConfigCache()
@@ -6,6 +6,7 @@ from fastapi.concurrency import run_in_threadpool
 
 from app.odk.utils.odk_client import ODKClientAsync
 from app.settings.models.settings import ImagesConfigData, SettingsConfigData
+from app.settings.services.config_cache import config_cache
 from app.shared.configs.constants import db_collections
 from app.shared.configs.models import ResponseMainModel
 from app.shared.middlewares.exceptions import BadRequestException
@@ -26,13 +27,13 @@ def validate_configs(config: SettingsConfigData):
     
 #@log_to_db(context="fetch_odk_config", log_args=True)
 async def fetch_odk_config(db: StandardDatabase, is_validate_configs: bool = False) -> SettingsConfigData:
+    """
+    The system configuration, read through the configuration cache (see config_cache).
+    The returned configuration is shared, do not modify it.
+    """
     try:
-        
-        def get_config_data():
-            return db.collection(db_collections.SYSTEM_CONFIGS).get('vman_config')
-
-        config_data = await run_in_threadpool(get_config_data)
-        if not config_data:
+        config = await config_cache.get(db)
+        if config is None:
             await db_logger.log(
             message="ODK configuration not found in the database" ,
             level=db_logger.LogLevel.ERROR,
@@ -41,24 +42,11 @@ async def fetch_odk_config(db: StandardDatabase, is_validate_configs: bool = Fal
     )
             raise ValueError("ODK configuration not found in the database")
 
-        # Ensure config_data is a dictionary
-        if isinstance(config_data, dict):
-            config = SettingsConfigData(**config_data)
-            
-            # Validate required fields in field_mapping
-            if is_validate_configs:
-                validate_configs(config)
+        # Validate required fields in field_mapping
+        if is_validate_configs:
+            validate_configs(config)
 
-            return config
-        else:
-            print("ODK configuration data is not in the expected format")
-            await db_logger.log(
-            message="ODK configuration data is not in the expected format" ,
-            level=db_logger.LogLevel.ERROR,
-            context="fetch_odk_config",
-            data={} 
-    )
-            raise ValueError("ODK configuration data is not in the expected format")
+        return config
     except Exception as e:
         print(e)
         raise ValueError(e)
@@ -98,11 +86,9 @@ async def add_configs_settings(configData: SettingsConfigData, db: StandardDatab
 
             data_simpleSpace = SimpleNamespace(**odk_data)
 
-            # Clear any cached session before validating — the new server won't
-            # accept a token issued by the old server.
-            import os as _os
-            if _os.path.exists("session.json"):
-                _os.remove("session.json")
+            # Authenticate again so the credentials themselves are validated,
+            # not a session cached for them.
+            await ODKClientAsync.invalidate_session(data_simpleSpace)
 
             # Validate ODK configuration
             async with ODKClientAsync(data_simpleSpace) as odk_client:
@@ -207,7 +193,9 @@ async def save_system_settings(data, db: StandardDatabase = None):
             return cursor
 
             
-        return await run_in_threadpool(execute_save_settings)
+        result = await run_in_threadpool(execute_save_settings)
+        await config_cache.invalidate(db, data['_key'])
+        return result
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
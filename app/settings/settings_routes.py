@@ -1,9 +1,9 @@
-import io
+import asyncio
+import os
 import uuid
 from datetime import date
 from typing import List, Optional
 
-import pandas as pd
 from arango.database import StandardDatabase
 from fastapi import (
     APIRouter,
@@ -18,7 +18,11 @@ from fastapi import (
     status,
 )
 
-from app.ccva.services.ccva_upload import insert_all_csv_data
+from app.ccva.services.ccva_upload import (
+    broadcast_upload_progress,
+    ingest_csv_upload,
+    validate_upload_columns,
+)
 from app.settings.models.settings import ImagesConfigData, SettingsConfigData, SyncStatus
 from app.settings.services.cron import BackupSettings, CronSettings, fetch_backup_settings, fetch_cron_settings, save_backup_settings, save_cron_settings
 from app.settings.services.odk_configs import (
@@ -29,6 +33,7 @@ from app.settings.services.odk_configs import (
     save_system_images,
 )
 from app.shared.utils.cache import invalidate_cache_pattern
+from app.shared.utils.csv_stream import read_csv_header, spool_upload
 from datetime import datetime, timezone
 from app.shared.configs.arangodb import get_arangodb_session
 from app.shared.configs.constants import AccessPrivileges, db_collections
@@ -250,6 +255,7 @@ async def upload_csv(
     background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     unique_id: Optional[str] = Body ('KEY', alias="unique_id"),
+    task_id: Optional[str] = Body(None, alias="task_id"),
     # oauth = Depends(oauth2_scheme),
 
     current_user: Optional[str] = Depends(get_current_user),
@@ -262,48 +268,33 @@ async def upload_csv(
 
     try:
 
-        # # Generate task ID
-        task_id = str(uuid.uuid4())
-        
-
-        # Read CSV file
-        contents = await file.read()
-        df = pd.read_csv(io.StringIO(contents.decode('utf-8')), low_memory=False)
-
+        # Generate task ID; a client may pass its own to follow the progress over the websocket
+        task_id = task_id or str(uuid.uuid4())
 
-        if 'instanceID' in df.columns:
-            df['instanceid'] = df['instanceID']
-            df.drop(columns=['instanceID'], inplace=True)
-        if 'instanceid' not in df.columns:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Instance ID (instanceid) not found in the uploaded CSV")
-        if unique_id not in df.columns:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unique ID not found in the uploaded CSV")
-       # Add additional fields to the DataFrame
-        df['vman_data_source'] = 'uploaded_csv'
-        df['vman_data_name'] = 't'
-        df['__id'] =df[unique_id]
+        # Spool the upload to disk and save it chunk by chunk (CSV, gzip or ZIP)
+        path = await spool_upload(file)
+        try:
+            columns = await asyncio.to_thread(read_csv_header, path)
+            try:
+                validate_upload_columns(columns, unique_id)
+            except ValueError as e:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
-         
-        
-        df['version_number'] = '1.0'
-        df['trackid'] = task_id
-        df.columns = map(str.lower, df.columns)
-
-        # Convert DataFrame back to a list of dictionaries
-        recordsDF = df.to_dict(orient='records')
-        print('before insert_all_csv_data', len(recordsDF))
-        
-        await insert_all_csv_data(recordsDF)
-        print('after insert_all_csv_data')
+            total_records = await ingest_csv_upload(db, path, unique_id, task_id,
+                                                    progress_callback=broadcast_upload_progress)
+        finally:
+            os.remove(path)
 
         # Update sync status after successful CSV upload
-        await update_csv_sync_status(db, len(recordsDF))
+        await update_csv_sync_status(db, total_records)
 
         # Invalidate regions cache as data has changed
         await invalidate_cache_pattern("unique_regions:*")
 
-        return ResponseMainModel(data={"task_id": task_id, "total_records": len(recordsDF),}, message="CSV data uploaded successfully and sync status updated")
+        return ResponseMainModel(data={"task_id": task_id, "total_records": total_records,}, message="CSV data uploaded successfully and sync status updated")
 
+    except HTTPException:
+        raise
     except Exception as e:
         # Raising the error so FastAPI can handle it
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
@@ -1,10 +1,17 @@
 
+import hashlib
+import json
 import logging
 import math
-from typing import AsyncGenerator
+import os
+import re
+import threading
+import time
+from typing import AsyncGenerator, Callable, Optional
 
 from arango import ArangoClient
 from arango.database import StandardDatabase
+from arango.http import DefaultHTTPClient
 from decouple import config
 from fastapi.concurrency import run_in_threadpool
 
@@ -12,9 +19,114 @@ from app.shared.configs.constants import collections_with_indexes
 
 logger = logging.getLogger(__name__)
 
-class ArangoDBClient:
+# Bulk replaces by _key (upsert_many with key_function) are sent in batches of
+# at most this many bytes, sized to take about DB_UPSERT_TARGET_SECONDS each.
+UPSERT_TARGET_BYTES = config("DB_UPSERT_TARGET_BYTES", default=4 * 1024 * 1024, cast=int)
+UPSERT_TARGET_SECONDS = config("DB_UPSERT_TARGET_SECONDS", default=1.0, cast=float)
+UNIQUE_CONSTRAINT_VIOLATED = 1210
+
+_KEY_PATTERN = re.compile(r"^[A-Za-z0-9_\-:.@()+,=;$!*]{1,254}$")
+
+
+def document_key(value) -> str:
+    """
+    Deterministic _key of a document identified by `value` (e.g. an ODK
+    instance ID): the value itself when it is a valid ArangoDB key, otherwise
+    a hash of it.
+    """
+    value = str(value)
+    if _KEY_PATTERN.match(value):
+        return value
+    return "h-" + hashlib.sha1(value.encode("utf-8")).hexdigest()
+
+
+class AdaptiveBatchSize:
+    """
+    Batch size of bulk writes: as many documents as fit in `target_bytes`
+    (estimated from a sample of the next documents), adjusted after every
+    batch so that one batch takes about `target_seconds`.
+    """
+
+    SAMPLE_SIZE = 16
+
+    def __init__(self, initial: int = 500, minimum: int = 50, maximum: int = 10000,
+                 target_bytes: int = UPSERT_TARGET_BYTES, target_seconds: float = UPSERT_TARGET_SECONDS):
+        self.size = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_bytes = target_bytes
+        self.target_seconds = target_seconds
+
+    def _clamp(self, size: float) -> int:
+        return int(max(self.minimum, min(self.maximum, size)))
+
+    def next(self, documents: list, start: int) -> int:
+        """Number of documents of the batch starting at documents[start]"""
+        sample = documents[start:start + self.SAMPLE_SIZE]
+        if not sample:
+            return 0
+        average = sum(len(json.dumps(doc, default=str)) for doc in sample) / len(sample)
+        return min(self.size, self._clamp(self.target_bytes / max(average, 1)))
+
+    def record(self, count: int, seconds: float):
+        """Adjust the size to the time the last batch of `count` documents took"""
+        if count <= 0 or seconds <= 0:
+            return
+        ideal = count * self.target_seconds / seconds
+        # move half way, never more than doubling at once
+        self.size = self._clamp(min((self.size + ideal) / 2, self.size * 2))
+
+
+class PooledHTTPClient(DefaultHTTPClient):
+    """
+    HTTP client of the process-wide ArangoDB connection.
+
+    Behaves like python-arango's DefaultHTTPClient (a requests session with a
+    urllib3 keep-alive connection pool per host) with the pool size, retries and
+    timeouts read from the environment, and keeps its sessions so connection
+    reuse can be reported by get_arangodb_pool_stats().
+    """
+
     def __init__(self):
-        self.client = ArangoClient(hosts=config("DB_URL", default="http://localhost:8529"))
+        pool_timeout = config("DB_POOL_TIMEOUT", default=None)
+        super().__init__(
+            request_timeout=config("DB_REQUEST_TIMEOUT", default=60, cast=float),
+            retry_attempts=config("DB_RETRY_ATTEMPTS", default=3, cast=int),
+            backoff_factor=config("DB_RETRY_BACKOFF", default=1.0, cast=float),
+            pool_connections=config("DB_POOL_CONNECTIONS", default=10, cast=int),
+            pool_maxsize=config("DB_POOL_MAXSIZE", default=32, cast=int),
+            pool_timeout=float(pool_timeout) if pool_timeout else None,
+        )
+        self.sessions = []
+
+    def create_session(self, host: str):
+        session = super().create_session(host)
+        self.sessions.append(session)
+        return session
+
+    def stats(self) -> dict:
+        """Requests sent and connections opened by all sessions of this client."""
+        requests = connections = 0
+        for session in self.sessions:
+            for adapter in {id(a): a for a in session.adapters.values()}.values():
+                pools = adapter.poolmanager.pools
+                for key in pools.keys():
+                    pool = pools.get(key)
+                    if pool is not None:
+                        requests += pool.num_requests
+                        connections += pool.num_connections
+        return {
+            "pool_maxsize": self._pool_maxsize,
+            "requests": requests,
+            "connections_opened": connections,
+            "connection_reuse_ratio": round(1 - connections / requests, 4) if requests else None,
+        }
+
+
+class ArangoDBClient:
+    def __init__(self, http_client: Optional[PooledHTTPClient] = None):
+        self.http_client = http_client
+        self.client = ArangoClient(hosts=config("DB_URL", default="http://localhost:8529"), http_client=http_client)
         self.db_name = config("DB_NAME", default="vman3")
         self.username = config("DB_ROOT_USER", default="root")
         self.password = config("ARANGO_ROOT_PASSWORD", default="welcome2vman")
@@ -46,21 +158,37 @@ class ArangoDBClient:
         create_collections_and_indexes(self.db, collections_with_indexes)
 
     async def upsert_many(self, collection_name: str, documents: list[dict],
-                          key_field: str = '__id', batch_size: int = 500) -> list:
+                          key_field: str = '__id', batch_size: int = 500,
+                          return_old_fields: list[str] = None,
+                          key_function: Optional[Callable[[dict], str]] = None) -> list:
         """Insert-or-replace documents matched by key_field (must have a unique index).
 
         Avoids the silent-failure problem of insert_many(silent=True) when a secondary
         unique index is violated: AQL UPSERT finds the existing document by key_field
         and replaces it in-place, preserving the original _key.
+
+        With key_function, documents are stored under the _key it derives from them
+        (e.g. document_key of the instance ID) and written with bulk inserts in replace
+        mode, in adaptively sized batches. Documents stored earlier under another _key
+        violate the unique index and are upserted with AQL as above.
+
+        With return_old_fields, returns for each document the given fields of the
+        document it replaced (None where the document was inserted).
         """
         return await run_in_threadpool(
-            self._upsert_many_sync, collection_name, documents, key_field, batch_size
+            self._upsert_many_sync, collection_name, documents, key_field, batch_size, return_old_fields, key_function
         )
 
     def _upsert_many_sync(self, collection_name: str, documents: list[dict],
-                          key_field: str = '__id', batch_size: int = 500) -> list:
+                          key_field: str = '__id', batch_size: int = 500,
+                          return_old_fields: list[str] = None,
+                          key_function: Optional[Callable[[dict], str]] = None) -> list:
         if not documents:
             return []
+        if key_function is not None:
+            return self._replace_many_by_key_sync(
+                collection_name, documents, key_field, batch_size, return_old_fields, key_function
+            )
         query = f"""
             FOR doc IN @docs
                 UPSERT {{{key_field}: doc.{key_field}}}
@@ -68,9 +196,62 @@ class ArangoDBClient:
                 REPLACE doc
                 IN {collection_name}
         """
+        bind_vars = {}
+        if return_old_fields:
+            query += " RETURN OLD ? KEEP(OLD, @old_fields) : null"
+            bind_vars["old_fields"] = return_old_fields
+        old_documents = []
         for i in range(0, len(documents), batch_size):
-            self.db.aql.execute(query, bind_vars={"docs": documents[i:i + batch_size]})
-        return []
+            cursor = self.db.aql.execute(query, bind_vars={**bind_vars, "docs": documents[i:i + batch_size]})
+            if return_old_fields:
+                old_documents.extend(cursor)
+        return old_documents
+
+    def _replace_many_by_key_sync(self, collection_name: str, documents: list[dict], key_field: str,
+                                  batch_size: int, return_old_fields: Optional[list[str]],
+                                  key_function: Callable[[dict], str]) -> list:
+        collection = self.db.collection(collection_name)
+        old_query = """
+            FOR key IN @keys
+                LET old = DOCUMENT(@@collection, key)
+                RETURN old ? KEEP(old, @old_fields) : null
+        """
+        batches = AdaptiveBatchSize(initial=batch_size)
+        old_documents = [None] * len(documents) if return_old_fields else []
+        conflicts = []
+        start = 0
+        while start < len(documents):
+            count = batches.next(documents, start)
+            batch = [{**doc, '_key': key_function(doc)} for doc in documents[start:start + count]]
+            started = time.perf_counter()
+            if return_old_fields:
+                # fields of the documents about to be replaced, read by primary key
+                old_batch = list(self.db.aql.execute(old_query, bind_vars={
+                    '@collection': collection_name, 'keys': [doc['_key'] for doc in batch],
+                    'old_fields': return_old_fields,
+                }))
+            results = collection.insert_many(batch, overwrite=True, overwrite_mode='replace')
+            batches.record(count, time.perf_counter() - started)
+
+            for offset, result in enumerate(results):
+                if isinstance(result, Exception):
+                    if getattr(result, 'error_code', None) != UNIQUE_CONSTRAINT_VIOLATED:
+                        raise result
+                    conflicts.append(start + offset)
+                elif return_old_fields and result.get('_old_rev'):
+                    # {} when the document was written between the read and the replace
+                    old_documents[start + offset] = old_batch[offset] or {}
+            start += count
+
+        if conflicts:
+            # stored under another _key (before keys were derived), matched by key_field instead
+            logger.info(f"Upserting {len(conflicts)} documents of {collection_name} stored under other keys")
+            old_conflicts = self._upsert_many_sync(
+                collection_name, [documents[i] for i in conflicts], key_field, batch_size, return_old_fields
+            )
+            for index, old in zip(conflicts, old_conflicts):
+                old_documents[index] = old
+        return old_documents
 
     async def insert_many(self, collection_name: str, documents: list[dict], overwrite_mode: str = 'ignore',
                          batch_size: int = 1000, sanitize: bool = True):
@@ -205,18 +386,69 @@ def create_collections_and_indexes(db: StandardDatabase, collections_with_indexe
                 logger.error(f"Error processing index {index}: {e}")
                 pass
 
+# Process-wide client: connecting, checking the database and bootstrapping the
+# collections and indexes happens once per process, every request and task then
+# reuses the same keep-alive connection pool.
+_shared_client: Optional[ArangoDBClient] = None
+_shared_client_pid: Optional[int] = None
+_shared_client_lock = threading.Lock()
+_shared_client_info: dict = {}
+
+
+def _get_shared_client_sync() -> ArangoDBClient:
+    global _shared_client, _shared_client_pid
+    # A forked process (e.g. a Celery pool worker) must not share the sockets
+    # of its parent, so the client is rebuilt when the pid changes.
+    if _shared_client is not None and _shared_client_pid == os.getpid():
+        return _shared_client
+    with _shared_client_lock:
+        if _shared_client is None or _shared_client_pid != os.getpid():
+            started = time.perf_counter()
+            client = ArangoDBClient(http_client=PooledHTTPClient())
+            client._connect_sync()
+            client._create_collections_sync()
+            _shared_client_info.update({
+                "created_at": time.time(),
+                "bootstrap_seconds": round(time.perf_counter() - started, 3),
+            })
+            _shared_client, _shared_client_pid = client, os.getpid()
+            logger.info(f"ArangoDB client ready for process {_shared_client_pid} "
+                        f"({_shared_client_info['bootstrap_seconds']}s)")
+    return _shared_client
+
+
+async def init_arangodb() -> ArangoDBClient:
+    """Create the process-wide client (run once from the application lifespan)."""
+    return await run_in_threadpool(_get_shared_client_sync)
+
+
+def close_arangodb() -> None:
+    """Close the process-wide client and its connection pool."""
+    global _shared_client, _shared_client_pid
+    with _shared_client_lock:
+        if _shared_client is not None and _shared_client_pid == os.getpid():
+            _shared_client.client.close()
+        _shared_client, _shared_client_pid = None, None
+        _shared_client_info.clear()
+
+
+def get_arangodb_pool_stats() -> dict:
+    """Connection reuse metrics of the process-wide client (for this worker)."""
+    client = _shared_client
+    if client is None or _shared_client_pid != os.getpid():
+        return {"pid": os.getpid(), "connected": False}
+    return {"pid": os.getpid(), "connected": True, **_shared_client_info, **client.http_client.stats()}
+
+
 # Asynchronous generator for session management
 async def get_arangodb_client() -> ArangoDBClient:
-    client = ArangoDBClient()
-    await client.connect()
-    return client
+    if _shared_client is not None and _shared_client_pid == os.getpid():
+        return _shared_client
+    return await init_arangodb()
 
 async def get_arangodb_session() -> AsyncGenerator[StandardDatabase, None]:
     client = await get_arangodb_client()
-    try:
-        yield client.db
-    finally:
-        pass  # No explicit closing needed        pass  # No explicit closing needed
+    yield client.db
 
 
 def get_arangodb_client_sync() -> StandardDatabase:
@@ -224,10 +456,7 @@ def get_arangodb_client_sync() -> StandardDatabase:
     Synchronous version of get_arangodb_client for use in Celery workers.
     Celery tasks run in a sync context, so we need a sync DB connection.
     """
-    client = ArangoDBClient()
-    client._connect_sync()
-    client._create_collections_sync()
-    return client.db
+    return _get_shared_client_sync().db
 
 
 def null_convert_data(data):
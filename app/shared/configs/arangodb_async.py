@@ -0,0 +1,265 @@
+"""
+Asyncio-native access to the ArangoDB HTTP API.
+
+python-arango is blocking, so every call made from a request handler has to go
+through run_in_threadpool, and under load the handlers queue up behind
+Starlette's thread pool. This module talks to the same database over a shared
+httpx.AsyncClient instead: AQL cursors are read with ``async for`` one batch at
+a time and documents are inserted/updated without leaving the event loop.
+
+    adb = get_async_db(db)
+    cursor = await adb.aql("FOR doc IN users RETURN doc", batch_size=500)
+    async for doc in cursor:
+        ...
+
+Errors are raised as ArangoHTTPError, an arango.exceptions.ArangoServerError,
+so the ``except ArangoError`` handlers written for python-arango catch them.
+"""
+import asyncio
+import json
+import logging
+import weakref
+from collections import deque
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+from urllib.parse import quote
+
+import httpx
+from arango.database import StandardDatabase
+from arango.exceptions import ArangoServerError
+from arango.request import Request
+from arango.response import Response
+from decouple import config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = config("DB_CURSOR_BATCH_SIZE", default=1000, cast=int)
+
+# One client (and connection pool) per event loop: the web server has a single
+# loop per worker, while asyncio.run() inside sync code gets its own. Each client
+# is kept with the task that closes it when its loop ends (see _close_on_shutdown).
+_http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Tuple[httpx.AsyncClient, asyncio.Task]]" = weakref.WeakKeyDictionary()
+
+
+class ArangoHTTPError(ArangoServerError):
+    """Error response of the ArangoDB HTTP API (an ArangoServerError, like python-arango raises)."""
+
+    def __init__(self, http_code: int, body: Optional[dict] = None, method: str = "post",
+                 url: str = "", endpoint: str = ""):
+        body = body or {}
+        response = Response(method=method, url=url, headers={}, status_code=http_code,
+                            status_text=f"HTTP {http_code}", raw_body=json.dumps(body))
+        response.body = body
+        response.error_code = body.get("errorNum")
+        response.error_message = body.get("errorMessage")
+        response.is_success = False
+        super().__init__(response, Request(method=method, endpoint=endpoint))
+
+
+def _create_http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        base_url=config("DB_URL", default="http://localhost:8529"),
+        auth=(config("DB_ROOT_USER", default="root"), config("ARANGO_ROOT_PASSWORD", default="welcome2vman")),
+        limits=httpx.Limits(
+            max_connections=config("DB_ASYNC_MAX_CONNECTIONS", default=64, cast=int),
+            max_keepalive_connections=config("DB_ASYNC_MAX_KEEPALIVE", default=32, cast=int),
+        ),
+        timeout=config("DB_REQUEST_TIMEOUT", default=60, cast=float),
+    )
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """Shared httpx client of the running event loop."""
+    loop = asyncio.get_running_loop()
+    entry = _http_clients.get(loop)
+    if entry is None or entry[0].is_closed:
+        client = _create_http_client()
+        closer = loop.create_task(_close_on_shutdown(loop, client), name="arangodb-http-client")
+        _http_clients[loop] = (client, closer)
+        return client
+    return entry[0]
+
+
+async def _close_on_shutdown(loop: asyncio.AbstractEventLoop, client: httpx.AsyncClient) -> None:
+    """
+    Wait until cancelled, then close the client: asyncio.run() (Celery tasks,
+    scripts) cancels the tasks left when its loop ends.
+    """
+    try:
+        await loop.create_future()
+    finally:
+        entry = _http_clients.get(loop)
+        if entry is not None and entry[0] is client:
+            del _http_clients[loop]
+        await client.aclose()
+
+
+async def close_async_arangodb() -> None:
+    """Close the client of the running event loop (application shutdown)."""
+    entry = _http_clients.pop(asyncio.get_running_loop(), None)
+    if entry is not None:
+        client, closer = entry
+        closer.cancel()
+        try:
+            await closer
+        except asyncio.CancelledError:
+            pass
+
+
+def get_async_db(db: Union[StandardDatabase, str, None] = None) -> "AsyncArangoDB":
+    """
+    Async access to a database.
+
+    :param db: python-arango database (or database name) to access, defaults to DB_NAME
+    """
+    if isinstance(db, str):
+        name = db
+    else:
+        name = getattr(db, "name", None) or config("DB_NAME", default="vman3")
+    return AsyncArangoDB(get_async_http_client(), name)
+
+
+class AsyncArangoDB:
+    """Database handle on top of a shared httpx.AsyncClient."""
+
+    def __init__(self, http: httpx.AsyncClient, name: str):
+        self.http = http
+        self.name = name
+
+    async def request(self, method: str, endpoint: str, **kwargs) -> Any:
+        response = await self.http.request(method, f"/_db/{quote(self.name)}{endpoint}", **kwargs)
+        body = response.json() if response.content else None
+        if response.is_error:
+            raise ArangoHTTPError(response.status_code, body if isinstance(body, dict) else None,
+                                  method=method, url=str(response.request.url), endpoint=endpoint)
+        return body
+
+    async def aql(self, query: str, bind_vars: Optional[Dict[str, Any]] = None, count: bool = False,
+                  batch_size: Optional[int] = None, stream: bool = False, ttl: Optional[int] = None,
+                  full_count: bool = False) -> "AsyncCursor":
+        """
+        Execute an AQL query.
+
+        :param batch_size: documents transferred per round trip (default DB_CURSOR_BATCH_SIZE)
+        :param stream: let the server produce the results lazily instead of materialising them
+        :return: cursor over the results
+        """
+        payload: Dict[str, Any] = {
+            "query": query,
+            "bindVars": bind_vars or {},
+            "count": count,
+            "batchSize": batch_size or DEFAULT_BATCH_SIZE,
+        }
+        if ttl is not None:
+            payload["ttl"] = ttl
+        options = {}
+        if stream:
+            options["stream"] = True
+        if full_count:
+            options["fullCount"] = True
+        if options:
+            payload["options"] = options
+        body = await self.request("POST", "/_api/cursor", json=payload)
+        return AsyncCursor(self, body)
+
+    async def insert(self, collection: str, document: dict, return_new: bool = False) -> dict:
+        params = {"returnNew": "true"} if return_new else None
+        return await self.request("POST", f"/_api/document/{quote(collection)}", json=document, params=params)
+
+    async def update(self, collection: str, document: dict, return_new: bool = False) -> dict:
+        """Partially update a document identified by its _key (like python-arango's collection.update)."""
+        params = {"keepNull": "true", "mergeObjects": "true"}
+        if return_new:
+            params["returnNew"] = "true"
+        headers = {"If-Match": document["_rev"]} if document.get("_rev") else None
+        return await self.request("PATCH", f"/_api/document/{quote(collection)}/{quote(str(document['_key']))}",
+                                  json=document, params=params, headers=headers)
+
+
+class AsyncCursor:
+    """Async iterator over an AQL cursor; further batches are fetched on demand."""
+
+    def __init__(self, db: AsyncArangoDB, body: dict):
+        self._db = db
+        self._id = body.get("id")
+        self._batch = deque(body.get("result", []))
+        self._has_more = body.get("hasMore", False)
+        self._count = body.get("count")
+        self.extra = body.get("extra", {})
+
+    def count(self) -> Optional[int]:
+        """Total number of results (only if the query was run with count=True)."""
+        return self._count
+
+    def __len__(self) -> int:
+        return self._count or 0
+
+    def __bool__(self) -> bool:
+        """Whether results are left to read (like a non-empty python-arango cursor)."""
+        return bool(self._batch) or self._has_more
+
+    def has_more(self) -> bool:
+        return self._has_more
+
+    def empty(self) -> bool:
+        """Whether the current batch is read (further ones may be left, see has_more)."""
+        return not self._batch
+
+    async def next(self) -> Any:
+        """Next result; StopAsyncIteration when there is none."""
+        return await self.__anext__()
+
+    def __aiter__(self) -> "AsyncCursor":
+        return self
+
+    async def __anext__(self) -> Any:
+        while not self._batch:
+            if not self._has_more:
+                raise StopAsyncIteration
+            await self._fetch()
+        return self._batch.popleft()
+
+    async def __aenter__(self) -> "AsyncCursor":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    async def batches(self) -> AsyncIterator[List[Any]]:
+        """Yield the results one server batch at a time."""
+        while self._batch or self._has_more:
+            if not self._batch:
+                await self._fetch()
+            batch, self._batch = list(self._batch), deque()
+            if batch:
+                yield batch
+
+    async def first(self) -> Any:
+        """First result (None if there is none); the rest of the cursor is released."""
+        try:
+            return await self.__anext__()
+        except StopAsyncIteration:
+            return None
+        finally:
+            await self.close()
+
+    async def to_list(self) -> List[Any]:
+        results = []
+        async for batch in self.batches():
+            results.extend(batch)
+        return results
+
+    async def close(self) -> None:
+        """Release the server side cursor if it was not read to the end."""
+        if self._id is not None and self._has_more:
+            self._has_more = False
+            try:
+                await self._db.request("DELETE", f"/_api/cursor/{self._id}")
+            except ArangoHTTPError as e:
+                if e.http_code != 404:
+                    raise
+
+    async def _fetch(self) -> None:
+        body = await self._db.request("POST", f"/_api/cursor/{self._id}")
+        self._batch.extend(body.get("result", []))
+        self._has_more = body.get("hasMore", False)
+
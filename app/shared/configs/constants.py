@@ -31,6 +31,8 @@ class db_collections():
     TASK_PROGRESS: str = 'task_progress'
     SYNC_HISTORY: str = 'sync_history'
     DQA_ANALYTICS: str = 'dqa_analytics'
+    VA_DAILY_ROLLUPS: str = 'va_daily_rollups'
+    CCVA_CSMF: str = 'ccva_csmf'
 
 class Special_Constants():
     UPLOAD_FOLDER: str = '/uploads'
@@ -51,6 +53,7 @@ collections_with_indexes = {
         {"fields": ["id10005r"], "unique": False, "type": "persistent", "name": "idx_region"},
         {"fields": ["id10012"], "unique": False, "type": "persistent", "name": "idx_date"},
         {"fields": ["today"], "unique": False, "type": "persistent", "name": "idx_submission"},
+        {"fields": ["submissiondate"], "unique": False, "type": "persistent", "name": "idx_submissiondate"},
         
         # New Optimization Indexes
         {"fields": ["id10005d"], "unique": False, "type": "persistent", "name": "idx_district"},
@@ -127,9 +130,13 @@ collections_with_indexes = {
     db_collections.DOWNLOAD_TRACKER: [],
     db_collections.DOWNLOAD_PROCESS_TRACKER: [],
     db_collections.SYSTEM_CONFIGS: [],
-    db_collections.VA_QUESTIONS: [],
+    db_collections.VA_QUESTIONS: [
+        # question sync matches the form questions on name
+        {"fields": ["name"], "type": "persistent", "name": "idx_question_name"}
+    ],
     db_collections.CCVA_RESULTS: [
-             {"fields": ["CAUSE1"], "type": "persistent", "name": "cause_idx"}
+             {"fields": ["CAUSE1"], "type": "persistent", "name": "cause_idx"},
+             {"fields": ["task_id"], "type": "persistent", "name": "idx_ccva_task_id"},
         #   {"fields": ["ID"], "unique": True, "type": "persistent", "name": "idx_interva5_id"},
           ],
     db_collections.CCVA_GRAPH_RESULTS: [
@@ -153,6 +160,14 @@ collections_with_indexes = {
     db_collections.DQA_ANALYTICS: [
         {"fields": ["computed_at"], "type": "persistent", "name": "idx_dqa_computed_at"},
     ],
+    db_collections.VA_DAILY_ROLLUPS: [
+        # one row per dimension tuple; dashboard reads filter on date_field and day
+        {"fields": ["date_field", "day", "region", "district", "age_group", "gender"], "unique": True, "type": "persistent", "name": "idx_rollup_dimensions"},
+    ],
+    db_collections.CCVA_CSMF: [
+        # one row per task, location and group; graphs read the rows of one task
+        {"fields": ["task_id", "region", "district", "group"], "unique": True, "type": "persistent", "name": "idx_csmf_task_group"},
+    ],
 }
 
 class AccessPrivileges():
@@ -7,10 +7,15 @@ from arango.database import StandardDatabase
 from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 
+from app.shared.configs.arangodb_async import get_async_db
 from app.shared.configs.constants import db_collections
 from app.shared.utils.database_utilities import add_query_filters, replace_object_values
 
 
+# Collections whose uuid index has been checked by this process: (database, collection)
+_initialized_collections = set()
+
+
 class Pager(BaseModel):
     page: Union[int, None] = None
     limit: Union[int, None] = None
@@ -48,6 +53,9 @@ class VManBaseModel(BaseModel):
 
     @classmethod
     def init_collection(cls, db):
+        collection_key = (getattr(db, "name", None), cls.get_collection_name())
+        if collection_key in _initialized_collections:
+            return
         if not db.has_collection(cls.get_collection_name()):
             collection = db.create_collection(cls.get_collection_name())
             collection.add_hash_index(fields=['uuid'], unique=True)
@@ -56,6 +64,7 @@ class VManBaseModel(BaseModel):
             indexes = collection.indexes()
             if not any(index['fields'] == ['uuid'] for index in indexes):
                 collection.add_hash_index(fields=['uuid'], unique=True)
+        _initialized_collections.add(collection_key)
 
     async def save(self, db: StandardDatabase, unique_field: str = None):
         """
@@ -67,7 +76,7 @@ class VManBaseModel(BaseModel):
         :return Newly saved data
         """
         self.init_collection(db)
-        collection = db.collection(self.get_collection_name())
+        adb = get_async_db(db)
         self.uuid = str(uuid.uuid4())
         self.created_at = datetime.now().isoformat()
         doc = self.model_dump()
@@ -76,13 +85,9 @@ class VManBaseModel(BaseModel):
 
         if existing_doc:
             doc["_key"] = existing_doc[0]["_key"]
-            def execute_update():
-                return collection.update(doc, return_new=True)
-            new_doc = await run_in_threadpool(execute_update)
+            new_doc = await adb.update(self.get_collection_name(), doc, return_new=True)
         else:
-            def execute_insert():
-                return collection.insert(doc, return_new=True)
-            new_doc = await run_in_threadpool(execute_insert)
+            new_doc = await adb.insert(self.get_collection_name(), doc, return_new=True)
         return new_doc['new'] if 'new' in new_doc else new_doc
 
     @classmethod
@@ -117,9 +122,8 @@ class VManBaseModel(BaseModel):
         :return: A list of records matching the filters.
         """
         cls.init_collection(db)
-        collection = db.collection(cls.get_collection_name())
         query, bind_vars = cls.build_query(
-            collection_name = collection.name, 
+            collection_name = cls.get_collection_name(), 
             filters = filters,
             paging = paging, 
             page_number = page_number, 
@@ -127,11 +131,8 @@ class VManBaseModel(BaseModel):
             include_deleted = include_deleted
         )
 
-        def execute_get_many():
-            cursor = db.aql.execute(query, bind_vars=bind_vars)
-            return list(cursor)
-        
-        records = await run_in_threadpool(execute_get_many)
+        cursor = await get_async_db(db).aql(query, bind_vars=bind_vars)
+        records = await cursor.to_list()
         if not records:
             return []
         return records
@@ -151,7 +152,6 @@ class VManBaseModel(BaseModel):
         """
         try:
             cls.init_collection(db)
-            collection = db.collection(cls.get_collection_name())
             bind_vars = {}
             aql_filters = []
 
@@ -166,7 +166,7 @@ class VManBaseModel(BaseModel):
                 aql_filters.append("doc.is_deleted == false")
 
             query = f"""
-                FOR doc in {collection.name}
+                FOR doc in {cls.get_collection_name()}
             """
     
             if aql_filters:
@@ -174,15 +174,9 @@ class VManBaseModel(BaseModel):
     
             query += " COLLECT WITH COUNT INTO length RETURN length"
 
-            def execute_count():
-                cursor = db.aql.execute(query, bind_vars=bind_vars)
-                try:
-                    result = cursor.next()
-                    return result if result is not None else 0
-                except StopIteration:
-                    return 0
-
-            return await run_in_threadpool(execute_count)
+            cursor = await get_async_db(db).aql(query, bind_vars=bind_vars)
+            result = await cursor.first()
+            return result if result is not None else 0
         except Exception as e:
             print(f"Error in count method: {e}")
             return 0
@@ -370,15 +364,10 @@ class VManBaseModel(BaseModel):
             :params db: ArangoDB database instance
 
             RETURN
-            Database return value
+            Cursor over the results, read one batch at a time (async for, next(), first(), to_list())
         """
         try:
-
-            def execute_custom_query():
-                return db.aql.execute(query=query, bind_vars=bind_vars, count=count)
-
-            cursor = await run_in_threadpool(execute_custom_query)
-            return cursor
+            return await get_async_db(db).aql(query, bind_vars=bind_vars, count=count)
         except Exception as e:
             raise e
 
@@ -28,6 +28,32 @@ class Settings(BaseSettings):
     # App Secret Key
     SECRET_KEY: str = config("SECRET_KEY", default="8deadce9449770680910741063cd0a3fe0acb62a8978661f421bbcbb66dc41f1")
 
+    # CCVA: worker processes used by InterVA5 on large runs (0 = the CPUs
+    # shared among the CELERY_WORKER_CONCURRENCY tasks a worker runs at once)
+    CCVA_WORKERS: int = config("CCVA_WORKERS", default=0, cast=int)
+    CELERY_WORKER_CONCURRENCY: int = config("CELERY_WORKER_CONCURRENCY", default=2, cast=int)
+    # CCVA: VA records read per database round trip when building the input frame
+    CCVA_FETCH_BATCH_SIZE: int = config("CCVA_FETCH_BATCH_SIZE", default=2000, cast=int)
+
+    # ODK sync: $skip/$top windows downloaded in parallel (when the server sorts
+    # submissions) and pages buffered ahead of the normalise/save stage
+    ODK_FETCH_CONCURRENCY: int = config("ODK_FETCH_CONCURRENCY", default=4, cast=int)
+    ODK_PREFETCH_PAGES: int = config("ODK_PREFETCH_PAGES", default=8, cast=int)
+
+    # CSV uploads: rows parsed and saved per batch
+    CSV_UPLOAD_CHUNK_ROWS: int = config("CSV_UPLOAD_CHUNK_ROWS", default=5000, cast=int)
+
+    # Task progress: reports published per second per task (later ones are
+    # coalesced) and seconds between writes of the state to task_progress
+    PROGRESS_MAX_RATE: float = config("PROGRESS_MAX_RATE", default=4, cast=float)
+    PROGRESS_PERSIST_SECONDS: float = config("PROGRESS_PERSIST_SECONDS", default=5, cast=float)
+
+    # Dashboard statistics: hour (server time) of the nightly rebuild of the daily rollups
+    STATISTICS_ROLLUP_REBUILD_HOUR: int = config("STATISTICS_ROLLUP_REBUILD_HOUR", default=2, cast=int)
+
+    # Authentication: seconds a resolved user and their privileges are cached per access token
+    PRINCIPAL_CACHE_SECONDS: int = config("PRINCIPAL_CACHE_SECONDS", default=30, cast=int)
+
 
 @lru_cache()
 def get_settings() -> Settings:
@@ -0,0 +1,145 @@
+"""
+Coalescing progress reporting of long running tasks (CCVA runs).
+
+InterVA5 reports every warning record and every 1% step; sending each of
+them to the clients and to task_progress made one Redis publish and one
+database write per report. ProgressPublisher keeps the latest report of a
+task and publishes it at most `max_rate` times per second, with the 'log'
+lines reported since the previous publish collected in 'logs'. The task
+state is written to task_progress at most every `persist_interval` seconds.
+Final reports (completed or error) are published and saved at once, and
+close() sends whatever is still pending.
+
+    publisher = ProgressPublisher(task_id, publish=send_to_clients, persist=save_to_db)
+    try:
+        run(update_callback=publisher.update)
+    finally:
+        publisher.close()
+"""
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from app.shared.configs.settings import get_settings
+from app.utilits.logger import app_logger
+
+FINAL_STATUSES = ('completed', 'error', 'cancelled')
+
+
+def progress_dict(progress: Any) -> Dict[str, Any]:
+    """A progress report (dict, pydantic model, JSON string or plain message) as a dict"""
+    if hasattr(progress, 'model_dump'):
+        return progress.model_dump()
+    if isinstance(progress, str):
+        try:
+            progress = json.loads(progress)
+        except ValueError:
+            return {'message': progress}
+    return dict(progress) if isinstance(progress, dict) else {'message': str(progress)}
+
+
+def is_final(progress: Dict[str, Any]) -> bool:
+    return progress.get('status') in FINAL_STATUSES or progress.get('error') is True
+
+
+class ProgressPublisher:
+    """Rate limited, coalescing publisher of the progress reports of one task (thread safe)"""
+
+    def __init__(
+        self,
+        task_id: str,
+        publish: Callable[[Dict[str, Any]], Any],
+        persist: Optional[Callable[[Dict[str, Any]], Any]] = None,
+        max_rate: Optional[float] = None,
+        persist_interval: Optional[float] = None,
+        max_logs: int = 100,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        settings = get_settings()
+        self.task_id = task_id
+        self.publish = publish
+        self.persist = persist
+        self.min_interval = 1 / (max_rate or settings.PROGRESS_MAX_RATE)
+        self.persist_interval = persist_interval if persist_interval is not None else settings.PROGRESS_PERSIST_SECONDS
+        self.max_logs = max_logs
+        self.clock = clock
+        self.stats = {'updates': 0, 'published': 0, 'persisted': 0}
+
+        self._lock = threading.RLock()
+        self._pending: Optional[Dict[str, Any]] = None  # reported, not published yet
+        self._logs: List[str] = []
+        self._unsaved: Optional[Dict[str, Any]] = None  # published, not persisted yet
+        self._published_at = float('-inf')
+        self._persisted_at = float('-inf')
+        self._timer: Optional[threading.Timer] = None
+        self._closed = False
+
+    def update(self, progress: Any) -> None:
+        """Report progress; published now if allowed by the rate limit, otherwise coalesced"""
+        progress = progress_dict(progress)
+        with self._lock:
+            self.stats['updates'] += 1
+            if progress.get('log'):
+                self._logs.append(str(progress['log']))
+                del self._logs[:-self.max_logs]
+            self._pending = {**(self._pending or {}), **progress}
+            self._deliver(force=is_final(progress))
+
+    def flush(self) -> None:
+        """Publish and persist the pending report now"""
+        with self._lock:
+            self._deliver(force=True)
+
+    def close(self) -> None:
+        """Flush and stop the timer; later reports are still published, without coalescing"""
+        with self._lock:
+            self._closed = True
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._deliver(force=True)
+
+    def _deliver(self, force: bool = False) -> None:
+        now = self.clock()
+        if self._pending is not None and (force or self._closed or now - self._published_at >= self.min_interval):
+            message = self._pending
+            if self._logs:
+                message['logs'] = self._logs
+            self._pending, self._logs = None, []
+            self._published_at = now
+            self._call(self.publish, message, 'published')
+            self._unsaved = message
+        if self.persist and self._unsaved is not None and (
+            force or self._closed or is_final(self._unsaved) or now - self._persisted_at >= self.persist_interval
+        ):
+            message, self._unsaved = self._unsaved, None
+            self._persisted_at = now
+            self._call(self.persist, message, 'persisted')
+        self._schedule(now)
+
+    def _schedule(self, now: float) -> None:
+        if self._closed or self._timer is not None:
+            return
+        delays = []
+        if self._pending is not None:
+            delays.append(self._published_at + self.min_interval - now)
+        if self.persist and self._unsaved is not None:
+            delays.append(self._persisted_at + self.persist_interval - now)
+        if delays:
+            self._timer = threading.Timer(max(min(delays), 0), self._tick)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _tick(self) -> None:
+        with self._lock:
+            self._timer = None
+            if not self._closed:
+                self._deliver()
+
+    def _call(self, function: Callable, message: Dict[str, Any], counter: str) -> None:
+        try:
+            function(message)
+            self.stats[counter] += 1
+        except Exception as e:
+            app_logger.warning(f"Progress of task {self.task_id} not {counter}: {e}")
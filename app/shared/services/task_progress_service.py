@@ -39,6 +39,11 @@ class TaskProgressService:
         collection.insert(doc, overwrite=True, overwrite_mode="update")
         return doc
 
+    @classmethod
+    def save_progress_sync(cls, db: StandardDatabase, task_id: str, data: Dict[str, Any], ttl_seconds: int = 86400):
+        """Save progress to DB from a worker thread or process (Synchronous)"""
+        return cls._save_progress_sync(db, task_id, data, ttl_seconds)
+
     @classmethod
     async def save_progress(cls, db: StandardDatabase, task_id: str, data: Dict[str, Any], ttl_seconds: int = 86400):
         """Asynchronously save progress to DB"""
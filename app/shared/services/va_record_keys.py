@@ -0,0 +1,138 @@
+"""
+Deterministic _keys of VA records.
+
+Every record of form_submissions is stored under document_key(__id): the
+instance ID itself when it is a valid ArangoDB key (ODK's "uuid:..." IDs are)
+or a hash of it. A record can then be read by primary key, with DOCUMENT()
+or collection.get_many, instead of through the __id/instanceid indexes.
+
+Records saved before keys were derived keep their random keys until
+migrate_va_record_keys moves them (`vman migrate-va-keys`); va_record_lookup
+still finds them through the index.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from arango.database import StandardDatabase
+from fastapi.concurrency import run_in_threadpool
+
+from app.shared.configs.arangodb import document_key
+from app.shared.configs.constants import db_collections
+from app.utilits.logger import app_logger
+
+MIGRATE_BATCH_SIZE = 1000
+
+
+def va_record_key(instance_id) -> str:
+    """_key of the VA record with this instance ID (__id)"""
+    return document_key(instance_id)
+
+
+def va_record_document_id(instance_id) -> Optional[str]:
+    """_id of the VA record with this instance ID, for DOCUMENT()"""
+    if instance_id is None:
+        return None
+    return f"{db_collections.VA_TABLE}/{va_record_key(instance_id)}"
+
+
+def with_va_record_key(record: dict) -> dict:
+    """The record with its deterministic _key set (records without __id are left as they are)"""
+    if record.get('__id') is None:
+        return record
+    return {**record, '_key': va_record_key(record['__id'])}
+
+
+def va_record_lookup(instance_ids: Iterable, field: str = '__id', var: str = 'doc') -> Tuple[str, Dict]:
+    """
+    Start of an AQL query looping `var` over the VA records whose `field` is
+    one of instance_ids, with its bind variables.
+
+    Records are read by primary key first; IDs not found that way (records not
+    migrated yet, or a field that is not the instance ID of the key) are looked
+    up through the index of `field`.
+
+        lookup, bind_vars = va_record_lookup(ids, 'instanceid')
+        db.aql.execute(f"{lookup} RETURN doc.id10019", bind_vars=bind_vars)
+    """
+    ids = list(dict.fromkeys(instance_id for instance_id in instance_ids if instance_id is not None))
+    query = f"""
+        LET va_by_key = (
+            FOR va IN @va_lookup
+                LET va_doc = DOCUMENT(va.document)
+                FILTER va_doc != null AND va_doc.{field} == va.id
+                RETURN va_doc
+        )
+        LET va_missing = MINUS(@va_ids, va_by_key[*].{field})
+        FOR {var} IN APPEND(va_by_key, (
+            FOR va_doc IN {db_collections.VA_TABLE}
+                FILTER va_doc.{field} IN va_missing
+                RETURN va_doc
+        ))
+    """
+    bind_vars = {
+        'va_ids': ids,
+        'va_lookup': [
+            {'id': instance_id, 'document': va_record_document_id(instance_id)}
+            for instance_id in ids
+        ],
+    }
+    return query, bind_vars
+
+
+def _keys_to_migrate_sync(db: StandardDatabase) -> List[Tuple[str, str]]:
+    cursor = db.aql.execute(
+        f"FOR doc IN {db_collections.VA_TABLE} FILTER doc.__id != null RETURN [doc._key, doc.__id]",
+        batch_size=10000, stream=True,
+    )
+    moves = []
+    for key, instance_id in cursor:
+        new_key = va_record_key(instance_id)
+        if key != new_key:
+            moves.append((key, new_key))
+    return moves
+
+
+def _migrate_batch_sync(db: StandardDatabase, moves: List[Tuple[str, str]]) -> int:
+    # removed and inserted again in one transaction: the unique __id index does
+    # not allow both copies at once, and a failed batch leaves the records as they were
+    transaction = db.begin_transaction(write=db_collections.VA_TABLE)
+    try:
+        collection = transaction.collection(db_collections.VA_TABLE)
+        records = {record['_key']: record for record in collection.get_many([old for old, _ in moves])}
+        moved = [(old, new) for old, new in moves if old in records]
+        collection.delete_many([{'_key': old} for old, _ in moved], silent=True)
+        results = collection.insert_many([
+            {**{k: v for k, v in records[old].items() if k not in ('_id', '_rev')}, '_key': new}
+            for old, new in moved
+        ])
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            raise errors[0]
+        transaction.commit_transaction()
+        return len(moved)
+    except Exception:
+        transaction.abort_transaction()
+        raise
+
+
+async def migrate_va_record_keys(db: StandardDatabase, batch_size: int = MIGRATE_BATCH_SIZE,
+                                 dry_run: bool = False) -> Dict[str, int]:
+    """
+    Moves the VA records stored under random keys to their deterministic key.
+
+    Returns the number of records to migrate, migrated and failed (a failed
+    batch is left unchanged and can be migrated by running again).
+    """
+    moves = await run_in_threadpool(_keys_to_migrate_sync, db)
+    summary = {'to_migrate': len(moves), 'migrated': 0, 'failed': 0}
+    if dry_run:
+        return summary
+    for start in range(0, len(moves), batch_size):
+        batch = moves[start:start + batch_size]
+        try:
+            summary['migrated'] += await run_in_threadpool(_migrate_batch_sync, db, batch)
+        except Exception as e:
+            summary['failed'] += len(batch)
+            app_logger.error(f"Failed to migrate the keys of {len(batch)} VA records: {e}")
+    app_logger.info(f"Migrated the keys of {summary['migrated']} of {summary['to_migrate']} VA records")
+    return summary
+
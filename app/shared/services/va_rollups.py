@@ -0,0 +1,286 @@
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from arango.database import StandardDatabase
+from fastapi.concurrency import run_in_threadpool
+
+from app.settings.models.settings import SettingsConfigData
+from app.settings.services.odk_configs import fetch_odk_config
+from app.shared.configs.constants import db_collections
+from app.utilits.logger import app_logger
+
+
+class VARollupService:
+    """
+    Daily aggregates of the VA records (form_submissions) for the dashboard
+    statistics, kept in va_daily_rollups. A row counts the records of one
+
+        date_field, day, region, district, age_group, gender
+
+    with the earliest and latest value of the date field (first, last). Every
+    record is counted once for each date field a dashboard can filter on
+    (date, submission, death and interview date), so any date/location filter
+    is answered by summing the rows of one date_field.
+
+    Rows are updated as upserts land (apply_upsert_changes) and rebuilt from
+    the collection by rebuild(), which runs nightly, after bulk imports, and
+    whenever the field mapping the rows were built with changes.
+    """
+    META_KEY = 'va_daily_rollups'
+    AGE_GROUPS = ('adult', 'child', 'neonatal')
+    GENDERS = ('male', 'female', 'other')
+    UNKNOWN = 'unknown'
+    DIMENSIONS = ('date_field', 'day', 'region', 'district', 'age_group', 'gender')
+
+    @staticmethod
+    def date_field(config: SettingsConfigData, date_type: Optional[str], default: str = 'date') -> str:
+        """Record field of a dashboard date type (submission_date, death_date, interview_date), `default` otherwise"""
+        mapping = config.field_mapping
+        fields = {
+            'date': mapping.date,
+            'submission_date': mapping.submitted_date or 'today',
+            'death_date': mapping.death_date or 'id10023',
+            'interview_date': mapping.interview_date or 'id10012',
+        }
+        if date_type not in ('submission_date', 'death_date', 'interview_date'):
+            date_type = default
+        return fields[date_type]
+
+    @classmethod
+    def fields(cls, config: SettingsConfigData) -> Dict[str, Any]:
+        """Record fields the rollups are built from, per the field mapping"""
+        mapping = config.field_mapping
+        return {
+            'region': mapping.location_level1,
+            'district': mapping.location_level2,
+            'adult': mapping.is_adult,
+            'child': mapping.is_child,
+            'neonatal': mapping.is_neonate,
+            'gender': mapping.deceased_gender,
+            'date_fields': sorted({
+                cls.date_field(config, date_type)
+                for date_type in ('date', 'submission_date', 'death_date', 'interview_date')
+            }),
+        }
+
+    @staticmethod
+    def record_fields(fields: Dict[str, Any]) -> List[str]:
+        """The record fields read by the rollups (to return for replaced records)"""
+        return [fields[name] for name in ('region', 'district', 'adult', 'child', 'neonatal', 'gender')] + fields['date_fields']
+
+    @classmethod
+    def record_rows(cls, record: Dict[str, Any], fields: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Dimensions and date value of the rows a record counts in (one per date field)"""
+        age_group = next((group for group in cls.AGE_GROUPS if record.get(fields[group]) == '1'), cls.UNKNOWN)
+        gender = record.get(fields['gender'])
+        gender = gender if gender in cls.GENDERS else cls.UNKNOWN
+        rows = []
+        for date_field in fields['date_fields']:
+            value = record.get(date_field)
+            rows.append({
+                'date_field': date_field,
+                'day': None if value is None else str(value)[:10],
+                'region': record.get(fields['region']),
+                'district': record.get(fields['district']),
+                'age_group': age_group,
+                'gender': gender,
+                'value': None if value is None else str(value),
+            })
+        return rows
+
+    @classmethod
+    def upsert_changes(cls, fields: Dict[str, Any], documents: List[dict], old_documents: List[Optional[dict]]) -> List[Dict[str, Any]]:
+        """
+        Change of the rollup rows caused by upserting documents.
+
+        :param old_documents: for each document, the rollup fields of the document it replaced (None if it was inserted)
+        """
+        changes: Dict[Tuple, Dict[str, Any]] = {}
+
+        def change(row: Dict[str, Any]) -> Dict[str, Any]:
+            key = tuple(repr(row[dimension]) for dimension in cls.DIMENSIONS)
+            if key not in changes:
+                changes[key] = {**{dimension: row[dimension] for dimension in cls.DIMENSIONS},
+                                'count': 0, 'first': None, 'last': None}
+            return changes[key]
+
+        for document, old_document in zip(documents, old_documents):
+            if old_document is not None:
+                for row in cls.record_rows(old_document, fields):
+                    change(row)['count'] -= 1
+            for row in cls.record_rows(document, fields):
+                total = change(row)
+                total['count'] += 1
+                if row['value'] is not None:
+                    total['first'] = min(filter(None, (total['first'], row['value'])))
+                    total['last'] = max(filter(None, (total['last'], row['value'])))
+        return [total for total in changes.values() if total['count'] or total['last'] is not None]
+
+    @classmethod
+    def _apply_changes_sync(cls, db: StandardDatabase, changes: List[Dict[str, Any]]):
+        """Add changes (see upsert_changes) to the rollup rows (Synchronous)"""
+        query = """
+            FOR change IN @changes
+                UPSERT {
+                    date_field: change.date_field, day: change.day, region: change.region,
+                    district: change.district, age_group: change.age_group, gender: change.gender
+                }
+                INSERT MERGE(change, { updated_at: @now })
+                UPDATE {
+                    count: OLD.count + change.count,
+                    first: MIN([OLD.first, change.first]),
+                    last: MAX([OLD.last, change.last]),
+                    updated_at: @now
+                }
+                IN @@collection
+                OPTIONS { exclusive: true }
+        """
+        db.aql.execute(query, bind_vars={
+            '@collection': db_collections.VA_DAILY_ROLLUPS,
+            'changes': changes,
+            'now': datetime.now().isoformat(),
+        })
+
+    @classmethod
+    def apply_upsert_changes_sync(cls, db: StandardDatabase, fields: Dict[str, Any], documents: List[dict], old_documents: List[Optional[dict]]):
+        """
+        Update the rollups after upserting documents (Synchronous).
+        Skipped while the rollups were built with another field mapping (the next read rebuilds them);
+        failures are logged only, the next rebuild() corrects the rows.
+        """
+        try:
+            meta = db.collection(db_collections.SYSTEM_CONFIGS).get(cls.META_KEY)
+            if meta is None or meta.get('fields') != fields:
+                return
+            changes = cls.upsert_changes(fields, documents, old_documents)
+            if changes:
+                cls._apply_changes_sync(db, changes)
+        except Exception as e:
+            app_logger.warning(f"Failed to update VA record rollups: {e}")
+
+    @classmethod
+    async def apply_upsert_changes(cls, db: StandardDatabase, fields: Dict[str, Any], documents: List[dict], old_documents: List[Optional[dict]]):
+        await run_in_threadpool(cls.apply_upsert_changes_sync, db, fields, documents, old_documents)
+
+    @classmethod
+    def _rebuild_sync(cls, db: StandardDatabase, fields: Dict[str, Any]) -> Dict[str, Any]:
+        """Replace the rollup rows with aggregates of the collection, in one transaction (Synchronous)"""
+        query = """
+            FOR doc IN @@records
+                LET record_age_group = doc[@adult] == "1" ? "adult"
+                    : (doc[@child] == "1" ? "child" : (doc[@neonatal] == "1" ? "neonatal" : @unknown))
+                LET record_gender = doc[@gender] IN @genders ? doc[@gender] : @unknown
+                FOR field IN @date_fields
+                    LET value = doc[field]
+                    COLLECT date_field = field,
+                            day = value == null ? null : SUBSTRING(TO_STRING(value), 0, 10),
+                            region = doc[@region],
+                            district = doc[@district],
+                            age_group = record_age_group,
+                            gender = record_gender
+                    AGGREGATE count = LENGTH(1), first = MIN(value), last = MAX(value)
+                    INSERT { date_field, day, region, district, age_group, gender, count, first, last, updated_at: @now }
+                    INTO @@collection
+        """
+        now = datetime.now().isoformat()
+        transaction = db.begin_transaction(
+            read=[db_collections.VA_TABLE],
+            write=[db_collections.VA_DAILY_ROLLUPS, db_collections.SYSTEM_CONFIGS],
+            exclusive=[db_collections.VA_DAILY_ROLLUPS],
+        )
+        try:
+            transaction.aql.execute(
+                "FOR row IN @@collection REMOVE row IN @@collection",
+                bind_vars={'@collection': db_collections.VA_DAILY_ROLLUPS},
+            )
+            cursor = transaction.aql.execute(query, bind_vars={
+                '@records': db_collections.VA_TABLE,
+                '@collection': db_collections.VA_DAILY_ROLLUPS,
+                **{name: fields[name] for name in ('region', 'district', 'adult', 'child', 'neonatal', 'gender', 'date_fields')},
+                'genders': list(cls.GENDERS),
+                'unknown': cls.UNKNOWN,
+                'now': now,
+            })
+            rows = cursor.statistics().get('modified', 0)
+            meta = {'_key': cls.META_KEY, 'fields': fields, 'rows': rows, 'rebuilt_at': now}
+            transaction.collection(db_collections.SYSTEM_CONFIGS).insert(meta, overwrite=True, overwrite_mode='replace')
+            transaction.commit_transaction()
+            return meta
+        except Exception:
+            transaction.abort_transaction()
+            raise
+
+    @classmethod
+    async def rebuild(cls, db: StandardDatabase, config: Optional[SettingsConfigData] = None) -> Optional[Dict[str, Any]]:
+        """Asynchronously rebuild the rollups from the collection (nothing to do before the field mapping is configured)"""
+        if config is None:
+            try:
+                config = await fetch_odk_config(db)
+            except Exception as e:
+                app_logger.warning(f"VA record rollups not rebuilt: {e}")
+                return None
+        meta = await run_in_threadpool(cls._rebuild_sync, db, cls.fields(config))
+        app_logger.info(f"Rebuilt VA record rollups: {meta['rows']} rows")
+        return meta
+
+    @classmethod
+    def _ensure_sync(cls, db: StandardDatabase, fields: Dict[str, Any]):
+        """Build the rollups when missing or built with another field mapping (Synchronous)"""
+        meta = db.collection(db_collections.SYSTEM_CONFIGS).get(cls.META_KEY)
+        if meta is None or meta.get('fields') != fields:
+            cls._rebuild_sync(db, fields)
+
+    @classmethod
+    def row_filters(
+        cls,
+        fields: Dict[str, Any],
+        date_field: str,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        locations: Optional[List[str]] = None,
+        location_key: Optional[str] = None,
+        location_values: Optional[List[str]] = None,
+    ) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        FILTER of the rollup rows (variable `row`) matching a dashboard filter and its bind variables,
+        None when the filter cannot be answered from the rollups (location limit on another field).
+
+        Dates are compared by day, so end_date includes the records of that whole day.
+        """
+        filters = ["row.date_field == @date_field", "row.count > 0"]
+        bind_vars: Dict[str, Any] = {'date_field': date_field}
+        if location_values and location_key:
+            dimension = next((name for name in ('region', 'district') if fields[name] == location_key), None)
+            if dimension is None:
+                return None
+            filters.append(f"row.{dimension} IN @locationValues")
+            bind_vars['locationValues'] = location_values
+        if start_date:
+            filters.append("row.day >= @start_date")
+            bind_vars['start_date'] = str(start_date)
+        if end_date:
+            filters.append("row.day <= @end_date")
+            bind_vars['end_date'] = str(end_date)
+        if locations:
+            filters.append("row.region IN @locations")
+            bind_vars['locations'] = locations
+        return "FILTER " + " AND ".join(filters), bind_vars
+
+    @classmethod
+    async def query(cls, db: StandardDatabase, fields: Dict[str, Any], query: str, bind_vars: Dict[str, Any]) -> List[Any]:
+        """Run a query over the rollup rows (@@rollups), building them first if needed"""
+        def execute_query():
+            cls._ensure_sync(db, fields)
+            cursor = db.aql.execute(query, bind_vars={'@rollups': db_collections.VA_DAILY_ROLLUPS, **bind_vars})
+            return [row for row in cursor]
+
+        return await run_in_threadpool(execute_query)
+
+
+async def rollup_fields(db: StandardDatabase) -> Optional[Dict[str, Any]]:
+    """Rollup fields of the configured field mapping, None while ODK is not configured"""
+    try:
+        return VARollupService.fields(await fetch_odk_config(db))
+    except Exception:
+        return None
+
@@ -0,0 +1,168 @@
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from arango.database import StandardDatabase
+from fastapi.concurrency import run_in_threadpool
+
+from app.shared.configs.constants import db_collections
+from app.utilits.logger import app_logger
+
+
+class VAStatsService:
+    """
+    Statistics of the VA records (form_submissions) kept in one system_configs
+    document, so reading them is a single document lookup instead of a
+    collection scan:
+
+        total_records, earliest_date, latest_date (submissiondate) and
+        records_by_source (vman_data_source -> count)
+
+    The document is updated as upserts land (apply_upsert_changes) and rebuilt
+    from the collection by reconcile(), which runs periodically to correct any
+    drift (deletes, writes that bypass insert_many_data_to_arangodb).
+    """
+    STATS_KEY = 'va_records_stats'
+    DATE_FIELD = 'submissiondate'
+    SOURCE_FIELD = 'vman_data_source'
+    UNKNOWN_SOURCE = 'unknown'
+
+    @classmethod
+    def upsert_changes(cls, documents: List[dict], old_documents: List[Optional[dict]]) -> Dict[str, Any]:
+        """
+        Change of the statistics caused by upserting documents.
+
+        :param documents: the upserted documents
+        :param old_documents: for each document, the source field of the document it replaced (None if it was inserted)
+        """
+        added = 0
+        sources = Counter()
+        for document, old_document in zip(documents, old_documents):
+            source = document.get(cls.SOURCE_FIELD) or cls.UNKNOWN_SOURCE
+            if old_document is None:
+                added += 1
+                sources[source] += 1
+            else:
+                old_source = old_document.get(cls.SOURCE_FIELD) or cls.UNKNOWN_SOURCE
+                if old_source != source:
+                    sources[old_source] -= 1
+                    sources[source] += 1
+        dates = [str(document[cls.DATE_FIELD]) for document in documents if document.get(cls.DATE_FIELD) is not None]
+        return {
+            'added': added,
+            'earliest_date': min(dates) if dates else None,
+            'latest_date': max(dates) if dates else None,
+            'sources': {source: count for source, count in sources.items() if count},
+        }
+
+    @classmethod
+    def _apply_changes_sync(cls, db: StandardDatabase, changes: Dict[str, Any]):
+        """Apply changes (see upsert_changes) to the statistics document (Synchronous)"""
+        query = f"""
+            UPSERT {{ _key: @key }}
+            INSERT {{
+                _key: @key,
+                total_records: @added,
+                earliest_date: @earliest_date,
+                latest_date: @latest_date,
+                records_by_source: @sources,
+                updated_at: @now
+            }}
+            UPDATE {{
+                total_records: OLD.total_records + @added,
+                earliest_date: MIN([OLD.earliest_date, @earliest_date]),
+                latest_date: MAX([OLD.latest_date, @latest_date]),
+                records_by_source: MERGE(OLD.records_by_source || {{}}, ZIP(
+                    ATTRIBUTES(@sources),
+                    (FOR source IN ATTRIBUTES(@sources) RETURN (OLD.records_by_source[source] || 0) + @sources[source])
+                )),
+                updated_at: @now
+            }}
+            IN {db_collections.SYSTEM_CONFIGS}
+            OPTIONS {{ exclusive: true }}
+        """
+        db.aql.execute(query, bind_vars={
+            'key': cls.STATS_KEY,
+            'added': changes['added'],
+            'earliest_date': changes['earliest_date'],
+            'latest_date': changes['latest_date'],
+            'sources': changes['sources'],
+            'now': datetime.now().isoformat(),
+        })
+
+    @classmethod
+    def apply_upsert_changes_sync(cls, db: StandardDatabase, documents: List[dict], old_documents: List[Optional[dict]]):
+        """
+        Update the statistics after upserting documents (Synchronous).
+        Failures are logged only, the next reconcile() corrects the document.
+        """
+        changes = cls.upsert_changes(documents, old_documents)
+        if not (changes['added'] or changes['sources'] or changes['earliest_date']):
+            return
+        try:
+            cls._apply_changes_sync(db, changes)
+        except Exception as e:
+            app_logger.warning(f"Failed to update VA record statistics: {e}")
+
+    @classmethod
+    async def apply_upsert_changes(cls, db: StandardDatabase, documents: List[dict], old_documents: List[Optional[dict]]):
+        await run_in_threadpool(cls.apply_upsert_changes_sync, db, documents, old_documents)
+
+    @classmethod
+    def _compute_stats_sync(cls, db: StandardDatabase) -> Dict[str, Any]:
+        """Compute the statistics from form_submissions (count, indexed min/max, per source counts)"""
+        query = f"""
+            LET earliest = FIRST(
+                FOR doc IN {db_collections.VA_TABLE}
+                    FILTER doc.{cls.DATE_FIELD} != null
+                    SORT doc.{cls.DATE_FIELD} ASC
+                    LIMIT 1
+                    RETURN doc.{cls.DATE_FIELD}
+            )
+            LET latest = FIRST(
+                FOR doc IN {db_collections.VA_TABLE}
+                    SORT doc.{cls.DATE_FIELD} DESC
+                    LIMIT 1
+                    RETURN doc.{cls.DATE_FIELD}
+            )
+            LET sources = (
+                FOR doc IN {db_collections.VA_TABLE}
+                    COLLECT source = doc.{cls.SOURCE_FIELD} WITH COUNT INTO count
+                    RETURN [source || @unknown, count]
+            )
+            RETURN {{
+                total_records: LENGTH({db_collections.VA_TABLE}),
+                earliest_date: earliest,
+                latest_date: latest,
+                records_by_source: ZIP(sources[*][0], sources[*][1])
+            }}
+        """
+        return db.aql.execute(query, bind_vars={'unknown': cls.UNKNOWN_SOURCE}).next()
+
+    @classmethod
+    def _reconcile_sync(cls, db: StandardDatabase) -> Dict[str, Any]:
+        """Rebuild the statistics document from the collection (Synchronous)"""
+        now = datetime.now().isoformat()
+        stats = {'_key': cls.STATS_KEY, **cls._compute_stats_sync(db), 'updated_at': now, 'reconciled_at': now}
+        db.collection(db_collections.SYSTEM_CONFIGS).insert(stats, overwrite=True, overwrite_mode="replace")
+        return stats
+
+    @classmethod
+    async def reconcile(cls, db: StandardDatabase) -> Dict[str, Any]:
+        """Asynchronously rebuild the statistics document from the collection"""
+        stats = await run_in_threadpool(cls._reconcile_sync, db)
+        app_logger.info(f"Reconciled VA record statistics: {stats['total_records']} records")
+        return stats
+
+    @classmethod
+    def _get_stats_sync(cls, db: StandardDatabase) -> Dict[str, Any]:
+        """Read the statistics document, building it on first use (Synchronous)"""
+        stats = db.collection(db_collections.SYSTEM_CONFIGS).get(cls.STATS_KEY)
+        if stats is None:
+            stats = cls._reconcile_sync(db)
+        return {key: value for key, value in stats.items() if key not in ('_id', '_key', '_rev')}
+
+    @classmethod
+    async def get_stats(cls, db: StandardDatabase) -> Dict[str, Any]:
+        """Asynchronously get the VA record statistics"""
+        return await run_in_threadpool(cls._get_stats_sync, db)
@@ -1,7 +1,9 @@
+from fastapi.concurrency import run_in_threadpool
 from fastapi_cache.decorator import cache as _fastapi_cache
 from fastapi_cache import FastAPICache
-from typing import Optional
+from typing import Any, Dict, Optional, Sequence
 import hashlib
+import inspect
 import json
 import time
 from functools import wraps
@@ -27,23 +29,11 @@ def cache(*args, **kwargs):
 
 async def invalidate_cache(key: str):
     """
-    Invalidates a specific cache key using FastAPICache backend.
-    Dynamically gets prefix and client from initialized FastAPICache.
+    Invalidates the entries of a ttl_cache (its key_prefix or function name) or
+    of every ttl_cache depending on a tag (e.g. a collection name), by bumping
+    its version (see ttl_cache); no keys are searched or deleted.
     """
-
-    try:
-
-        backend = FastAPICache.get_backend()
-        prefix = FastAPICache.get_prefix() or ""
-
-        
-        if hasattr(backend, "redis"):
-            redis = backend.redis
-            full_key = f"{prefix}:{key}" if prefix else key
-            await redis.delete(full_key)
-    except Exception as e:
-        print("COULDN'T INVALIDATE CACHE FOR KEY: ", key, " ERROR: ", e)
-        pass
+    await bump_cache_versions(key)
 
 async def invalidate_cache_pattern(pattern: str):
     """
@@ -65,56 +55,106 @@ async def invalidate_cache_pattern(pattern: str):
             if keys:
                 await redis.delete(*keys)
 
-def ttl_cache(ttl: int = 300, key_prefix: Optional[str] = None):
+CACHE_PREFIX = "vman_cache"
+
+
+def cache_version_key(tag: str) -> str:
+    return f"{CACHE_PREFIX}:version:{tag}"
+
+
+async def bump_cache_versions(*tags: str):
     """
-    Wrapper around fastapi-cache2 @cache decorator.
-    Allows explicit key_prefix for deterministic caching and invalidation.
-    Includes custom key generation logic to handle 'db' and 'current_user'.
+    Invalidate the ttl_cache entries depending on the tags (O(1) per tag).
+    Uses the FastAPICache Redis client, or the process Redis client where
+    FastAPICache is not initialised (Celery workers).
     """
-    def specific_key_builder(func, namespace: str = "", request = None, response = None, *args, **kwargs):
-        # 1. Static/Explicit Key
-        if key_prefix:
-            return key_prefix
-        
-        # 2. Dynamic Key Generation
-        key_parts = [func.__name__]
-        
-        filtered_args = []
-        for arg in args:
-            # Skip complex objects like DB session or Arango objects
-            if hasattr(arg, 'aql') or hasattr(arg, 'collection'): 
-                continue
-            filtered_args.append(str(arg))
-        
-        filtered_kwargs = []
-        for k, v in sorted(kwargs.items()):
-            if k == 'db':
-                continue
-            if k == 'current_user':
-                # Handle user dict intelligently to prefer ID/UID
-                if isinstance(v, dict):
-                   if 'uid' in v:
-                        filtered_kwargs.append(f"{k}={v['uid']}")
-                   elif 'id' in v:
-                         filtered_kwargs.append(f"{k}={v['id']}")
-                   else:
-                       # Fallback hash of empty/unknown user dict
-                       filtered_kwargs.append(f"{k}=user_obj") 
-                else:
-                     filtered_kwargs.append(f"{k}={str(v)}")
-                continue
-            
-            filtered_kwargs.append(f"{k}={str(v)}")
-        
-        # Construct the key payload
-        # format: func_name:arg1:arg2:k=v
-        payload = ":".join(key_parts + filtered_args + filtered_kwargs)
-        return payload
+    try:
+        try:
+            redis = FastAPICache.get_backend().redis
+        except Exception:
+            await run_in_threadpool(bump_cache_versions_sync, *tags)
+            return
+        pipe = redis.pipeline(transaction=False)
+        for tag in tags:
+            pipe.incr(cache_version_key(tag))
+        await pipe.execute()
+    except Exception as e:
+        print("COULDN'T INVALIDATE CACHE FOR TAGS: ", tags, " ERROR: ", e)
+
+
+def bump_cache_versions_sync(*tags: str):
+    """bump_cache_versions with the (synchronous) Redis client of the process"""
+    from app.tasks.redis_client import get_redis_client
 
-    import time
-    from functools import wraps
+    pipe = get_redis_client().pipeline(transaction=False)
+    for tag in tags:
+        pipe.incr(cache_version_key(tag))
+    pipe.execute()
 
+
+def cache_scope(current_user: Any) -> Any:
+    """The part of a user a shared cached result depends on: their location access limit"""
+    from app.shared.configs.security import get_location_limit_values
+
+    if not isinstance(current_user, dict):
+        current_user = getattr(current_user, '__dict__', {}) or {}
+    location_key, location_values = get_location_limit_values(current_user)
+    if not (location_key and location_values):
+        return None
+    return [location_key, sorted(str(value) for value in location_values)]
+
+
+def cache_key(name: str, arguments: Dict[str, Any], versions: Sequence[Any]) -> str:
+    """
+    Key of a cached call: the name, the versions of its tags and a hash of the
+    canonical JSON of its arguments (keys sorted, dates and other values as strings).
+    """
+    payload = json.dumps(arguments, sort_keys=True, default=str, separators=(",", ":"))
+    digest = hashlib.sha1(payload.encode("utf-8")).hexdigest()[:20]
+    version = ".".join(str(int(v)) if v else "0" for v in versions)
+    return f"{CACHE_PREFIX}:{name}:v{version}:{digest}"
+
+
+def ttl_cache(ttl: int = 300, key_prefix: Optional[str] = None, depends_on: Sequence[str] = (), per_user: bool = False):
+    """
+    Wrapper around fastapi-cache2 @cache decorator.
+
+    Entries are keyed by key_prefix (default: the function name), the versions of
+    its tags and a canonical hash of the arguments. The `db` argument is skipped and
+    `current_user` is reduced to the user's location scope, so users with the same
+    access limit share entries (per_user=True keys by user instead).
+
+    Tags are key_prefix and the depends_on names (e.g. db_collections.VA_TABLE):
+    invalidate_cache(tag) bumps a tag's version and the entries keyed with the old
+    version are not read again (they expire after ttl).
+    """
     def decorator(func):
+        name = key_prefix or func.__name__
+        tags = [name, *depends_on]
+        signature = inspect.signature(func)
+
+        def call_arguments(args, kwargs) -> Dict[str, Any]:
+            bound = signature.bind_partial(*args, **kwargs)
+            arguments = {}
+            for key, value in bound.arguments.items():
+                if key in ('db', 'request', 'response') or hasattr(value, 'aql') or hasattr(value, 'collection'):
+                    continue
+                if key == 'current_user':
+                    if per_user:
+                        user = value if isinstance(value, dict) else getattr(value, '__dict__', {})
+                        value = user.get('uid') or user.get('id') or user.get('uuid') or user.get('_key')
+                    else:
+                        value = cache_scope(value)
+                elif hasattr(value, 'model_dump'):
+                    value = value.model_dump()
+                arguments[key] = value
+            return arguments
+
+        async def specific_key_builder(func, namespace: str = "", request=None, response=None, args=(), kwargs=None):
+            redis = FastAPICache.get_backend().redis
+            versions = await redis.mget([cache_version_key(tag) for tag in tags])
+            return cache_key(name, call_arguments(args, kwargs or {}), versions)
+
         # Apply the cache decorator first
         cached_func = _fastapi_cache(expire=ttl, key_builder=specific_key_builder)(func)
 
@@ -128,7 +168,8 @@ def ttl_cache(ttl: int = 300, key_prefix: Optional[str] = None):
                 end_time = time.time()
                 elapsed = (end_time - start_time) * 1000
                 print(f"[Performance] {func.__name__} took {elapsed:.2f}ms")
-        
+
+        wrapper.cache_tags = tags
         return wrapper
 
     return decorator
@@ -0,0 +1,143 @@
+"""
+Streaming reads of uploaded CSV files.
+
+Uploads are spooled to a temporary file block by block and parsed in chunks
+of rows, so a large upload never sits in memory as bytes, a decoded string
+and a DataFrame at once. gzip files and ZIP archives holding one CSV file
+are read transparently.
+
+    path = await spool_upload(file)
+    try:
+        async with aclosing(iter_csv_chunks(path, chunk_rows=5000)) as chunks:
+            async for df, fraction in chunks:
+                ...
+    finally:
+        os.remove(path)
+"""
+import asyncio
+import gzip
+import os
+import tempfile
+import zipfile
+from contextlib import contextmanager
+from typing import AsyncIterator, Callable, Iterator, List, Optional, Tuple, Union
+
+import pandas as pd
+from fastapi import UploadFile
+
+SPOOL_BLOCK_SIZE = 1024 * 1024
+CSV_ENCODING = 'utf-8-sig'  # also strips the byte order mark added by spreadsheet exports
+
+
+async def spool_upload(file: UploadFile, block_size: int = SPOOL_BLOCK_SIZE) -> str:
+    """Copies an upload to a temporary file, returns its path (the caller removes it)"""
+    fd, path = tempfile.mkstemp(prefix="vman_upload_", suffix=os.path.splitext(file.filename or "")[1])
+    try:
+        with os.fdopen(fd, 'wb') as spool:
+            while True:
+                block = await file.read(block_size)
+                if not block:
+                    break
+                await asyncio.to_thread(spool.write, block)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+@contextmanager
+def open_csv(path: str):
+    """
+    Opens a CSV file, a gzip file or a ZIP archive with one CSV file.
+    Yields (csv binary stream, function returning the fraction of the upload read).
+    """
+    with open(path, 'rb') as raw:
+        size = os.fstat(raw.fileno()).st_size or 1
+        magic = raw.read(4)
+        raw.seek(0)
+        if magic[:2] == b'\x1f\x8b':
+            with gzip.GzipFile(fileobj=raw) as stream:
+                yield stream, lambda: min(raw.tell() / size, 1.0)
+        elif magic == b'PK\x03\x04':
+            with zipfile.ZipFile(raw) as archive:
+                members = [info for info in archive.infolist() if not info.is_dir()]
+                csv_members = [info for info in members if info.filename.lower().endswith('.csv')] or members
+                if len(csv_members) != 1:
+                    raise ValueError("The uploaded ZIP archive must contain exactly one CSV file")
+                member = csv_members[0]
+                # the compressed data of the member is read from the archive in order
+                end = member.header_offset + member.compress_size or 1
+                with archive.open(member) as stream:
+                    yield stream, lambda: min(raw.tell() / end, 1.0)
+        else:
+            yield raw, lambda: min(raw.tell() / size, 1.0)
+
+
+def read_csv_header(path: str) -> List[str]:
+    """Column names of a CSV upload"""
+    with open_csv(path) as (stream, _):
+        return list(pd.read_csv(stream, nrows=0, encoding=CSV_ENCODING).columns)
+
+
+def read_csv_chunks(
+    path: str,
+    chunk_rows: int,
+    usecols: Optional[Union[List[str], Callable[[str], bool]]] = None,
+    nrows: Optional[int] = None,
+) -> Iterator[Tuple[pd.DataFrame, float]]:
+    """Yields (chunk of at most chunk_rows rows, fraction of the upload read)"""
+    with open_csv(path) as (stream, progress):
+        reader = pd.read_csv(stream, chunksize=chunk_rows, low_memory=False, encoding=CSV_ENCODING,
+                             usecols=usecols, nrows=nrows)
+        with reader:
+            for chunk in reader:
+                yield chunk, progress()
+
+
+async def iter_csv_chunks(path: str, chunk_rows: int, prefetch: int = 2, **kwargs) -> AsyncIterator[Tuple[pd.DataFrame, float]]:
+    """
+    read_csv_chunks parsed in a worker thread, at most `prefetch` chunks ahead
+    of the consumer, so parsing overlaps saving without reading the whole upload.
+    """
+    chunks = read_csv_chunks(path, chunk_rows, **kwargs)
+    queue = asyncio.Queue(maxsize=max(prefetch, 1))
+    done = object()
+    loop = asyncio.get_running_loop()
+    parsing = None
+
+    async def read_chunks():
+        nonlocal parsing
+        try:
+            while True:
+                parsing = loop.run_in_executor(None, next, chunks, done)
+                # shielded: a chunk being parsed is waited for before the file is closed
+                chunk = await asyncio.shield(parsing)
+                await queue.put(chunk)
+                if chunk is done:
+                    break
+        except Exception as exc:
+            await queue.put(exc)
+
+    reader = asyncio.ensure_future(read_chunks())
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        reader.cancel()
+        await asyncio.gather(reader, return_exceptions=True)
+        if parsing is not None:
+            await asyncio.gather(parsing, return_exceptions=True)
+        chunks.close()
+
+
+def read_csv_frame(path: str, chunk_rows: int, **kwargs) -> pd.DataFrame:
+    """The whole CSV upload as one DataFrame, parsed in chunks"""
+    frames = [chunk for chunk, _ in read_csv_chunks(path, chunk_rows, **kwargs)]
+    if not frames:
+        return pd.DataFrame(columns=read_csv_header(path))
+    return pd.concat(frames, ignore_index=True, sort=False)
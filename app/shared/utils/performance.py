@@ -82,6 +82,15 @@ class StatisticsCache:
     @classmethod
     async def _compute_stats(cls, db: StandardDatabase, collection_name: str) -> Dict[str, Any]:
         """Compute statistics using optimized queries"""
+        if collection_name == db_collections.VA_TABLE:
+            # VA records statistics are maintained in a document, no query needed
+            from app.shared.services.va_stats_service import VAStatsService
+            stats = await VAStatsService.get_stats(db)
+            return {
+                'total_records': stats.get('total_records', 0),
+                'earliest_date': stats.get('earliest_date'),
+                'latest_date': stats.get('latest_date')
+            }
         try:
             def execute_compute():
                 # Use collection statistics for count (much faster than LENGTH())
@@ -8,13 +8,75 @@ from app.settings.services.odk_configs import fetch_odk_config
 from app.shared.configs.constants import db_collections
 from app.shared.configs.models import ResponseMainModel
 from app.shared.configs.security import get_location_limit_values
+from app.shared.services.va_rollups import VARollupService
 
 
 from app.shared.utils.cache import ttl_cache
 from fastapi_cache.decorator import cache
 
 
-# @cache(namespace="charts_statistics", expire=3000) # Cache for 5 minutes
+def charts_response(result: dict) -> dict:
+    """Structure the combined charts query result for the response"""
+    distribution_by_age_data = result['distribution_by_age'][0]
+    return {
+        "monthly_submissions": result['monthly_submissions'],
+        "distribution_by_age": {
+            "neonates": distribution_by_age_data["neonatal"],
+            "children": distribution_by_age_data["child"],
+            "adults": distribution_by_age_data["adult"],
+        },
+        "distribution_by_gender": result['gender_distribution'][0],
+        "data_overview": result.get('data_overview', {}),
+    }
+
+
+async def _charts_from_rollups(db: StandardDatabase, fields: dict, row_filters: str, bind_vars: dict) -> dict:
+    """The charts statistics (same shape as the combined query below), summed from the daily rollups"""
+    query = f"""
+        LET rows = (
+            FOR row IN @@rollups
+                {row_filters}
+                RETURN row
+        )
+
+        LET monthlySubmissions = (
+            FOR row IN rows
+                COLLECT month = DATE_MONTH(DATE_TIMESTAMP(row.day)), year = DATE_YEAR(DATE_TIMESTAMP(row.day))
+                AGGREGATE count = SUM(row.count)
+                SORT year, month
+                RETURN {{ month, year, count }}
+        )
+
+        LET geoData = (
+            FOR row IN rows
+                RETURN DISTINCT {{ region: row.region, district: row.district }}
+        )
+
+        RETURN {{
+            monthly_submissions: monthlySubmissions,
+            distribution_by_age: [{{
+                adult: SUM(rows[* FILTER CURRENT.age_group == "adult"].count),
+                child: SUM(rows[* FILTER CURRENT.age_group == "child"].count),
+                neonatal: SUM(rows[* FILTER CURRENT.age_group == "neonatal"].count)
+            }}],
+            gender_distribution: [{{
+                male: SUM(rows[* FILTER CURRENT.gender == "male"].count),
+                female: SUM(rows[* FILTER CURRENT.gender == "female"].count),
+                other: SUM(rows[* FILTER CURRENT.gender == "other"].count)
+            }}],
+            data_overview: {{
+                total: SUM(rows[*].count),
+                first_submission: MIN(rows[*].first),
+                last_submission: MAX(rows[*].last),
+                distinct_regions: LENGTH(UNIQUE(geoData[*].region)),
+                distinct_districts: LENGTH(geoData)
+            }}
+        }}
+    """
+    return (await VARollupService.query(db, fields, query, bind_vars))[0]
+
+
+@ttl_cache(ttl=30, key_prefix='charts_statistics', depends_on=[db_collections.VA_TABLE, db_collections.SYSTEM_CONFIGS])
 async def fetch_charts_statistics( current_user: dict,paging: bool = True, page_number: int = 1, limit: int = 10, start_date: Optional[date] = None, end_date: Optional[date] = None, locations: Optional[List[str]] = None,  date_type:Optional[str]=None, db: StandardDatabase = None) -> ResponseMainModel:
     try:
         print("Fetching charts statistics")
@@ -25,31 +87,25 @@ async def fetch_charts_statistics( current_user: dict,paging: bool = True, page_
         is_child_field = config.field_mapping.is_child
         is_neonate_field = config.field_mapping.is_neonate
         #
-        print(date_type)
-        death_date = config.field_mapping.death_date 
-        submitted_date = config.field_mapping.submitted_date 
-        interview_date = config.field_mapping.interview_date 
-        
-
-        if date_type is not None:
-            if date_type == 'submission_date':
-                today_field = submitted_date
-            elif date_type == 'death_date':
-                today_field = death_date
-            elif date_type == 'interview_date':
-                today_field = interview_date
-            else:
-                today_field = submitted_date
-        else:
-            today_field = submitted_date
+        today_field = VARollupService.date_field(config, date_type, default='submission_date')
 
         deceased_gender = config.field_mapping.deceased_gender
 
-        print(date_type, today_field, 'today_field')
         # locationLimitValues =current_user['access_limit']['limit_by'] or None ## [{value: "value", label: "label"}]
         locationKey, locationLimitValues = get_location_limit_values(current_user)
 
-        
+        # Answered from the daily rollups unless the user's location limit is on
+        # a field they are not kept by
+        fields = VARollupService.fields(config)
+        rollup_filters = VARollupService.row_filters(
+            fields, today_field, start_date, end_date, locations, locationKey, locationLimitValues)
+        if rollup_filters is not None:
+            return ResponseMainModel(
+                data=charts_response(await _charts_from_rollups(db, fields, *rollup_filters)),
+                message="Statistics fetched successfully",
+                total=None
+            )
+
         collection = db.collection(db_collections.VA_TABLE)   # Use the actual collection name here
         bind_vars = {}
         filters = []
@@ -188,25 +244,8 @@ async def fetch_charts_statistics( current_user: dict,paging: bool = True, page_
 
         result = await run_in_threadpool(execute_query)
 
-        monthly_submissions_data = result['monthly_submissions']
-        distribution_by_age_data = result['distribution_by_age'][0]
-        distribution_by_gender = result['gender_distribution'][0]
-        data_overview = result.get('data_overview', {})
-
-        # Structure the combined response
-        response_data = {
-            "monthly_submissions": monthly_submissions_data,
-            "distribution_by_age": {
-                "neonates": distribution_by_age_data["neonatal"],
-                "children": distribution_by_age_data["child"],
-                "adults": distribution_by_age_data["adult"],
-            },
-            "distribution_by_gender": distribution_by_gender,
-            "data_overview": data_overview,
-        }
-
         return ResponseMainModel(
-            data=response_data,
+            data=charts_response(result),
             message="Statistics fetched successfully",
             total=None
         )
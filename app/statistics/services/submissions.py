@@ -8,10 +8,29 @@ from app.settings.services.odk_configs import fetch_odk_config
 from app.shared.configs.constants import db_collections
 from app.shared.configs.models import ResponseMainModel
 from app.shared.configs.security import get_location_limit_values
+from app.shared.services.va_rollups import VARollupService
 from app.shared.utils.cache import ttl_cache
 
 
-@ttl_cache(ttl=30, key_prefix='submissions_statistics')
+async def _submissions_from_rollups(db: StandardDatabase, fields: dict, row_filters: str, bind_vars: dict) -> List[dict]:
+    """Submissions per region and district, summed from the daily rollups"""
+    query = f"""
+        FOR row IN @@rollups
+            {row_filters}
+            COLLECT region = row.region, district = row.district
+            AGGREGATE count = SUM(row.count),
+                      lastSubmission = MAX(row.last),
+                      adults = SUM(row.age_group == "adult" ? row.count : 0),
+                      children = SUM(row.age_group == "child" ? row.count : 0),
+                      neonates = SUM(row.age_group == "neonatal" ? row.count : 0),
+                      male = SUM(row.gender == "male" ? row.count : 0),
+                      female = SUM(row.gender == "female" ? row.count : 0)
+            RETURN {{ region, district, count, lastSubmission, adults, children, neonates, male, female }}
+    """
+    return await VARollupService.query(db, fields, query, bind_vars)
+
+
+@ttl_cache(ttl=30, key_prefix='submissions_statistics', depends_on=[db_collections.VA_TABLE, db_collections.SYSTEM_CONFIGS])
 async def fetch_submissions_statistics( current_user: dict,paging: bool = True, page_number: int = 1, limit: int = 10, start_date: Optional[date] = None, end_date: Optional[date] = None, locations: Optional[List[str]] = None,date_type:Optional[str]=None, db: StandardDatabase = None) -> ResponseMainModel:
     try:
         config = await fetch_odk_config(db, True)
@@ -20,29 +39,23 @@ async def fetch_submissions_statistics( current_user: dict,paging: bool = True,
         is_adult_field = config.field_mapping.is_adult
         is_child_field = config.field_mapping.is_child
         is_neonte_field = config.field_mapping.is_neonate
-        death_date = config.field_mapping.death_date or 'id10023'
-        submitted_date = config.field_mapping.submitted_date or 'today'or  'submissiondate'
-        interview_date = config.field_mapping.interview_date or 'id10012'
-            
-        if date_type is not None:
-            if date_type == 'submission_date':
-                today_field = submitted_date
-            elif date_type == 'death_date':
-                today_field = death_date
-            elif date_type == 'interview_date':
-                today_field = interview_date
-            else:
-                today_field = config.field_mapping.date 
-        else:
-            today_field = config.field_mapping.date 
-
-            
-        # today_field = config.field_mapping.date
+        today_field = VARollupService.date_field(config, date_type)
         deceased_gender = config.field_mapping.deceased_gender
 
 
         locationKey, locationLimitValues = get_location_limit_values(current_user)
 
+        # Answered from the daily rollups unless the user's location limit is on
+        # a field they are not kept by
+        fields = VARollupService.fields(config)
+        rollup_filters = VARollupService.row_filters(
+            fields, today_field, start_date, end_date, locations, locationKey, locationLimitValues)
+        if rollup_filters is not None:
+            return ResponseMainModel(
+                data=await _submissions_from_rollups(db, fields, *rollup_filters),
+                message="Records fetched successfully",
+            )
+
         collection = db.collection(db_collections.VA_TABLE)  # Use the actual collection name here
         query = f"""
             FOR doc IN {collection.name}
@@ -14,34 +14,11 @@ from typing import Dict, List, Optional
 from celery import shared_task
 from celery.utils.log import get_task_logger
 
-import redis
-
-from decouple import config
+from app.tasks.redis_client import get_redis_client, redis_client_stats
 
 logger = get_task_logger(__name__)
 
 
-def get_redis_client():
-    """Get Redis client for Pub/Sub"""
-    redis_url = config('REDIS_URL', default='redis://localhost:6370')
-    redis_password = config('REDIS_PASSWORD', default=None)
-    
-    # Parse URL
-    if '://' in redis_url:
-        _, rest = redis_url.split('://', 1)
-        if ':' in rest:
-            host, port = rest.split(':')
-            port = int(port)
-        else:
-            host = rest
-            port = 6379
-    else:
-        host = 'localhost'
-        port = 6379
-    
-    return redis.Redis(host=host, port=port, password=redis_password, decode_responses=True)
-
-
 def publish_progress(task_id: str, progress_data: dict):
     """Publish progress update to Redis Pub/Sub channel"""
     try:
@@ -109,7 +86,8 @@ def run_ccva_task(
     try:
         # Import here to avoid circular imports
         from app.shared.configs.arangodb import get_arangodb_client_sync
-        from app.ccva.services.ccva_services import runCCVA, get_record_to_run_ccva
+        from app.ccva.services.ccva_services import runCCVA, load_ccva_dataframe
+        from app.shared.configs.arangodb_async import close_async_arangodb
         from app.settings.services.odk_configs import fetch_odk_config
         from app.shared.configs.models import ResponseMainModel
         
@@ -131,32 +109,32 @@ def run_ccva_task(
             
             # Construct mock current_user for fetch_va_records_json context
             mock_user = {"uid": user_id, "access_limit": access_limit}
-            
-            # Run async fetch in sync worker
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            try:
-                records_response = loop.run_until_complete(
-                    get_record_to_run_ccva(
+
+            async def load_records():
+                try:
+                    return await load_ccva_dataframe(
                         current_user=mock_user,
                         db=db,
                         data_source=None,
-                        task_id=task_id,
-                        task_results={},
                         start_date=start_date,
                         end_date=end_date,
                         date_type=date_type,
-                        top=top
+                        top=top,
+                        algorithm=ccva_algorithm
                     )
-                )
-                records_data = records_response.data
+                finally:
+                    await close_async_arangodb()
+            
+            # Run async fetch in sync worker; the records are streamed into
+            # the DataFrame one batch at a time
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            try:
+                database_dataframe = loop.run_until_complete(load_records())
             finally:
                 loop.close()
             
-            if not records_data:
-                raise Exception("No records found in database for these filters.")
-            
-            logger.info(f"Worker fetched {len(records_data)} records from database")
+            logger.info(f"Worker fetched {len(database_dataframe)} records from database")
         
         # Convert to DataFrame
         publish_progress(task_id, {
@@ -164,12 +142,13 @@ def run_ccva_task(
             "message": "Preparing data...",
             "status": "running",
             "task_id": task_id,
-            "total_records": len(records_data),
+            "total_records": len(records_data) if records_data is not None else len(database_dataframe),
             "error": False
         })
         
-        database_dataframe = pd.DataFrame.from_records(records_data)
-        del records_data # Free up memory as soon as possible
+        if records_data is not None:
+            database_dataframe = pd.DataFrame.from_records(records_data)
+            del records_data # Free up memory as soon as possible
         
         # Get ODK config synchronously
         loop = asyncio.new_event_loop()
@@ -182,16 +161,21 @@ def run_ccva_task(
         id_col = config_obj.field_mapping.instance_id
         date_col = config_obj.field_mapping.date
         
-        # Define callback for progress updates
+        # Progress of runCCVA: coalesced, published through the pooled Redis
+        # client and saved to task_progress on a timer
+        from app.ccva.services.ccva_services import ccva_progress_report
+        from app.shared.services.progress_publisher import ProgressPublisher
+        from app.shared.services.task_progress_service import TaskProgressService
+
+        publisher = ProgressPublisher(
+            task_id,
+            publish=lambda progress: publish_progress(task_id, progress),
+            persist=lambda progress: TaskProgressService.save_progress_sync(db, task_id, progress),
+        )
+
         def celery_update_callback(progress):
             """Callback to publish progress from runCCVA"""
-            if isinstance(progress, str):
-                try:
-                    progress = json.loads(progress)
-                except:
-                    progress = {"message": progress}
-            
-            publish_progress(task_id, progress)
+            publisher.update(ccva_progress_report(progress, user_id))
         
         # Run CCVA (this is synchronous)
         publish_progress(task_id, {
@@ -203,21 +187,24 @@ def run_ccva_task(
             "error": False
         })
         
-        result = runCCVA(
-            odk_raw=database_dataframe,
-            file_id=task_id,
-            update_callback=celery_update_callback,
-            db=db,
-            id_col=id_col,
-            date_col=date_col,
-            start_time=start_time,
-            algorithm=ccva_algorithm,
-            malaria=malaria_status,
-            hiv=hiv_status,
-            user_id=user_id,
-            dk_threshold=dk_threshold,
-            ood_threshold=ood_threshold,
-        )
+        try:
+            result = runCCVA(
+                odk_raw=database_dataframe,
+                file_id=task_id,
+                update_callback=celery_update_callback,
+                db=db,
+                id_col=id_col,
+                date_col=date_col,
+                start_time=start_time,
+                algorithm=ccva_algorithm,
+                malaria=malaria_status,
+                hiv=hiv_status,
+                user_id=user_id,
+                dk_threshold=dk_threshold,
+                ood_threshold=ood_threshold,
+            )
+        finally:
+            publisher.close()
         
         elapsed = datetime.now() - start_time
         elapsed_str = f"{elapsed.seconds // 3600}:{(elapsed.seconds // 60) % 60}:{elapsed.seconds % 60}"
@@ -233,8 +220,9 @@ def run_ccva_task(
             "data": result
         })
         
-        logger.info(f"CCVA task {task_id} completed in {elapsed_str}")
-        return {"status": "completed", "task_id": task_id, "elapsed_time": elapsed_str}
+        redis_stats = redis_client_stats()
+        logger.info(f"CCVA task {task_id} completed in {elapsed_str} (redis: {redis_stats})")
+        return {"status": "completed", "task_id": task_id, "elapsed_time": elapsed_str, "redis": redis_stats}
         
     except Exception as e:
         elapsed = datetime.now() - start_time
@@ -14,12 +14,11 @@ import time
 from datetime import datetime, timezone
 from typing import Optional, Tuple
 
-import pandas as pd
-import redis
 from celery import shared_task
 from celery.utils.log import get_task_logger
-from decouple import config
-from json import loads
+from contextlib import aclosing
+
+from app.tasks.redis_client import get_redis_client, redis_client_stats
 
 logger = get_task_logger(__name__)
 
@@ -32,12 +31,6 @@ ACTIVE_TASK_KEY   = "sync:active_task_id"  # single Redis key tracking the runni
 
 # ── Redis helpers ─────────────────────────────────────────────────────────────
 
-def get_redis_client():
-    redis_url = config('REDIS_URL', default='redis://localhost:6370')
-    redis_password = config('REDIS_PASSWORD', default=None)
-    return redis.from_url(redis_url, password=redis_password, decode_responses=True)
-
-
 def publish_progress(task_id: str, progress_data: dict):
     try:
         r = get_redis_client()
@@ -67,17 +60,38 @@ def _update_snapshot(task_id: str, records_saved: int, start_time: float,
     """Write live progress to Redis so the cancel endpoint can save accurate history."""
     try:
         r = get_redis_client()
-        r.setex(f"sync:snapshot:{task_id}", SNAPSHOT_TTL, json.dumps({
-            "records_saved": records_saved,
-            "start_time": start_time,
-            "user_name": user_name,
-            "method": method,
-            "total_data_count": total_data_count,
-        }))
+        r.setex(f"sync:snapshot:{task_id}", SNAPSHOT_TTL,
+                _snapshot(records_saved, start_time, user_name, method, total_data_count))
     except Exception:
         pass
 
 
+def _snapshot(records_saved: int, start_time: float, user_name: str, method: str, total_data_count: int) -> str:
+    return json.dumps({
+        "records_saved": records_saved,
+        "start_time": start_time,
+        "user_name": user_name,
+        "method": method,
+        "total_data_count": total_data_count,
+    })
+
+
+def _page_checkpoint(task_id: str, snapshot: str, progress_data: dict) -> bool:
+    """
+    After a page is saved: writes the snapshot, publishes the progress and
+    checks the cancel flag in one round trip. Returns whether the sync was cancelled.
+    """
+    try:
+        pipe = get_redis_client().pipeline(transaction=False)
+        pipe.setex(f"sync:snapshot:{task_id}", SNAPSHOT_TTL, snapshot)
+        pipe.publish(f"ws:broadcast:{task_id}", json.dumps(progress_data))
+        pipe.exists(f"{CANCEL_KEY_PREFIX}{task_id}")
+        return pipe.execute()[-1] > 0
+    except Exception as e:
+        logger.error(f"Failed to publish ODK progress: {e}")
+        return False
+
+
 def _clear_snapshot(task_id: str) -> None:
     try:
         r = get_redis_client()
@@ -118,6 +132,8 @@ def sync_odk_data_task(
     method: str = "api",
     server_total: int = 0,
     local_count: int = 0,
+    sync_mode: Optional[str] = None,
+    watermark: Optional[dict] = None,
 ):
     # Clear any stale cancel flag from a previous run before starting
     _clear_cancel_flag(task_id)
@@ -151,11 +167,15 @@ def sync_odk_data_task(
     try:
         from app.shared.configs.arangodb import get_arangodb_client_sync
         from app.settings.services.odk_configs import fetch_odk_config
-        from app.odk.utils.odk_client import ODKClientAsync
+        from app.odk.utils.odk_client import ODKClientAsync, close_odk_clients
+        from app.odk.services.sync_pipeline import form_flattener, iter_submission_pages, normalize_submissions
+        from app.odk.services.sync_watermark import merge_watermarks, submissions_watermark
+        from app.shared.configs.settings import get_settings
         from app.odk.services.data_download import (
             insert_many_data_to_arangodb,
             update_sync_status_internal,
             get_margin_dates_and_records_count,
+            finish_watermark_sync,
         )
 
         db = get_arangodb_client_sync()
@@ -169,6 +189,7 @@ def sync_odk_data_task(
             async def fetch_and_process() -> Tuple[int, bool]:
                 nonlocal records_saved
                 was_cancelled = False
+                seen_watermark = None
 
                 async def fetch_page_with_retry(odk_client, max_attempts=3, **kwargs):
                     last_exc = None
@@ -185,72 +206,62 @@ def sync_odk_data_task(
                                 await asyncio.sleep(2 ** attempt)  # 1s, 2s
                     raise last_exc
 
-                async with ODKClientAsync(config_obj.odk_api_configs) as odk_client:
-                    next_link = None
-                    first_page = True
-
-                    while True:
-                        # ── Cooperative cancellation check ────────────────────
-                        # Runs before every page fetch so cancellation takes
-                        # effect between pages (never mid-download).
-                        if _is_cancelled(task_id):
-                            logger.info(
-                                f"Sync {task_id} cancelled by user after {records_saved} records"
-                            )
-                            _clear_cancel_flag(task_id)
-                            was_cancelled = True
-                            break
-                        # ──────────────────────────────────────────────────────
-
-                        if next_link:
-                            data = await fetch_page_with_retry(odk_client, next_link=next_link)
-                        else:
-                            data = await fetch_page_with_retry(
-                                odk_client,
-                                top=top,
-                                skip=skip if first_page else None,
-                                start_date=start_date,
-                                end_date=end_date,
-                                order_by='__system/submissionDate',
-                                order_direction='asc',
-                            )
-                            first_page = False
-
-                        if isinstance(data, str):
-                            raise Exception(f"Unexpected string response: {data}")
-
-                        page_records = data.get('value', [])
-                        if not page_records:
-                            break
-
-                        df = pd.json_normalize(page_records, sep='/')
-                        df.columns = [col.split('/')[-1] for col in df.columns]
-                        df.columns = df.columns.str.lower()
-                        df = df.dropna(axis=1, how='all')
-                        df = df.loc[:, ~df.columns.duplicated()]
-                        records = loads(df.to_json(orient='records'))
-
-                        await insert_many_data_to_arangodb(records, overwrite_mode='replace')
-                        records_saved += len(records)
-                        _update_snapshot(task_id, records_saved, start_time, user_name, method, total_data_count)
-
-                        progress = min((records_saved / total_data_count) * 100, 100.0)
-                        elapsed = time.time() - start_time
-
-                        publish_progress(task_id, {
-                            "total_records": total_data_count,
-                            "server_total": _server_total,
-                            "local_count": local_count,
-                            "progress": progress,
-                            "elapsed_time": elapsed,
-                            "records_processed": records_saved,
-                            "status": "running",
-                            "message": f"Syncing... {records_saved:,}/{total_data_count:,} new records",
-                        })
-
-                        next_link = data.get('@odata.nextLink')
-                        if not next_link:
-                            break
+                # nothing to download when only deleted submissions are pending
+                if total_data_count:
+                    async with ODKClientAsync(config_obj.odk_api_configs) as odk_client:
+                        # Pages are downloaded ahead (parallel $skip/$top windows
+                        # when the server sorts) while earlier pages are saved.
+                        settings = get_settings()
+                        flattener = await form_flattener(odk_client)
+                        pages = iter_submission_pages(
+                            odk_client,
+                            top=top,
+                            skip=skip,
+                            start_date=start_date,
+                            end_date=end_date,
+                            concurrency=settings.ODK_FETCH_CONCURRENCY,
+                            prefetch=settings.ODK_PREFETCH_PAGES,
+                            fetch_page=lambda **kwargs: fetch_page_with_retry(odk_client, **kwargs),
+                            watermark=watermark if sync_mode == "delta" else None,
+                        )
+
+                        cancelled = _is_cancelled(task_id)
+                        async with aclosing(pages):
+                            async for page_records in pages:
+                                # ── Cooperative cancellation check ────────────────────
+                                # The flag is read with the checkpoint of the previous
+                                # page, so cancellation takes effect between pages;
+                                # downloads in flight are dropped.
+                                if cancelled:
+                                    logger.info(
+                                        f"Sync {task_id} cancelled by user after {records_saved} records"
+                                    )
+                                    _clear_cancel_flag(task_id)
+                                    was_cancelled = True
+                                    break
+                                # ──────────────────────────────────────────────────────
+
+                                seen_watermark = merge_watermarks(seen_watermark, submissions_watermark(page_records))
+                                records = await asyncio.to_thread(normalize_submissions, page_records, flattener)
+
+                                await insert_many_data_to_arangodb(records, overwrite_mode='replace', clean=False)
+                                records_saved += len(records)
+
+                                progress = min((records_saved / total_data_count) * 100, 100.0)
+                                elapsed = time.time() - start_time
+
+                                # snapshot, progress and cancel flag in one Redis round trip
+                                snapshot = _snapshot(records_saved, start_time, user_name, method, total_data_count)
+                                cancelled = _page_checkpoint(task_id, snapshot, {
+                                    "total_records": total_data_count,
+                                    "server_total": _server_total,
+                                    "local_count": local_count,
+                                    "progress": progress,
+                                    "elapsed_time": elapsed,
+                                    "records_processed": records_saved,
+                                    "status": "running",
+                                    "message": f"Syncing... {records_saved:,}/{total_data_count:,} new records",
+                                })
 
                 # ── Post-loop bookkeeping ─────────────────────────────────────
                 if was_cancelled:
@@ -258,6 +269,11 @@ def sync_odk_data_task(
                     # Clear the snapshot so a late cancel request doesn't create a duplicate.
                     _clear_snapshot(task_id)
                 else:
+                    try:
+                        await finish_watermark_sync(db, config_obj.odk_api_configs, sync_mode, seen_watermark)
+                    except Exception as exc:
+                        # the records are saved; the next sync downloads the delta again
+                        logger.warning(f"Could not update the sync watermark: {exc}")
                     current_records = await get_margin_dates_and_records_count(db)
                     current_total = current_records.get('total_records', 0) if current_records else 0
                     await update_sync_status_internal(db, records_saved, current_total)
@@ -271,19 +287,15 @@ def sync_odk_data_task(
                         status="completed",
                     )
                     _clear_snapshot(task_id)
-                    # Bust the Dashboard stats Redis cache so the new count shows immediately.
-                    try:
-                        _r = get_redis_client()
-                        for key in _r.scan_iter("*submissions_statistics*"):
-                            _r.delete(key)
-                    except Exception:
-                        pass
+                    # The dashboard statistics caches depend on form_submissions:
+                    # every saved page bumped its version, nothing to clear here.
 
                 return records_saved, was_cancelled
 
             records_saved, was_cancelled = loop.run_until_complete(fetch_and_process())
 
         finally:
+            loop.run_until_complete(close_odk_clients())
             loop.close()
 
         elapsed = time.time() - start_time
@@ -300,9 +312,10 @@ def sync_odk_data_task(
                 "status": "cancelled",
                 "message": f"Sync cancelled — {records_saved:,} records saved in {elapsed:.0f}s",
             })
-            logger.info(f"ODK sync task {task_id} cancelled: {records_saved} records saved in {elapsed:.2f}s")
             _clear_active_task()
-            return {"status": "cancelled", "records_saved": records_saved, "elapsed_time": elapsed}
+            redis_stats = redis_client_stats()
+            logger.info(f"ODK sync task {task_id} cancelled: {records_saved} records saved in {elapsed:.2f}s (redis: {redis_stats})")
+            return {"status": "cancelled", "records_saved": records_saved, "elapsed_time": elapsed, "redis": redis_stats}
         else:
             publish_progress(task_id, {
                 "total_records": total_data_count,
@@ -314,9 +327,10 @@ def sync_odk_data_task(
                 "status": "completed",
                 "message": f"Sync completed: {records_saved:,} new records in {elapsed:.0f}s",
             })
-            logger.info(f"ODK sync task {task_id} completed: {records_saved} records in {elapsed:.2f}s")
             _clear_active_task()
-            return {"status": "completed", "records_saved": records_saved, "elapsed_time": elapsed}
+            redis_stats = redis_client_stats()
+            logger.info(f"ODK sync task {task_id} completed: {records_saved} records in {elapsed:.2f}s (redis: {redis_stats})")
+            return {"status": "completed", "records_saved": records_saved, "elapsed_time": elapsed, "redis": redis_stats}
 
     except Exception as e:
         elapsed = time.time() - start_time
@@ -434,6 +448,14 @@ def run_scheduled_odk_sync():
     import uuid
     from app.shared.configs.arangodb import get_arangodb_client_sync
     from app.odk.services.data_download import fetch_odk_data_initial
+    from app.odk.utils.odk_client import close_odk_clients
+
+    async def fetch_initial(db):
+        try:
+            return await fetch_odk_data_initial(db=db, skip=0, top=1, force_update=False)
+        finally:
+            # the pooled ODK clients belong to this event loop
+            await close_odk_clients()
 
     try:
         r = get_redis_client()
@@ -444,7 +466,7 @@ def run_scheduled_odk_sync():
             return
 
         db = get_arangodb_client_sync()
-        initial = asyncio.run(fetch_odk_data_initial(db=db, skip=0, top=1, force_update=False))
+        initial = asyncio.run(fetch_initial(db))
 
         if not initial.get("download_status"):
             logger.info("Scheduled sync: no new records available")
@@ -467,6 +489,8 @@ def run_scheduled_odk_sync():
             method="api",
             server_total=initial.get("server_total", total_data_count),
             local_count=initial.get("local_count", 0),
+            sync_mode=initial.get("sync_mode"),
+            watermark=initial.get("watermark"),
         )
         logger.info(f"Scheduled sync dispatched (id={task_id}, {total_data_count} records)")
 
@@ -0,0 +1,68 @@
+"""
+Redis client of the Celery task helpers.
+
+One client, and so one connection pool, per worker process: progress
+publishes and flag checks reuse its connections instead of opening a new
+connection each time. A forked process builds its own client.
+
+redis_client_stats() reports the clients and connections opened by this
+process (connection churn), it is added to the results of the tasks.
+"""
+import os
+import threading
+from typing import Optional
+
+import redis
+from decouple import config
+
+_client: Optional[redis.Redis] = None
+_client_pid: Optional[int] = None
+_client_lock = threading.Lock()
+_clients_created = 0
+_closed_connections = 0
+
+
+def get_redis_client() -> redis.Redis:
+    """The process-wide Redis client (REDIS_URL, REDIS_PASSWORD)"""
+    global _client, _client_pid, _clients_created, _closed_connections
+    if _client is not None and _client_pid == os.getpid():
+        return _client
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            if _client_pid != os.getpid():
+                # counters of the parent process
+                _clients_created = _closed_connections = 0
+            _client = redis.from_url(
+                config('REDIS_URL', default='redis://localhost:6370'),
+                password=config('REDIS_PASSWORD', default=None),
+                decode_responses=True,
+                health_check_interval=30,
+            )
+            _client_pid = os.getpid()
+            _clients_created += 1
+    return _client
+
+
+def close_redis_client() -> None:
+    """Disconnect the client of this process"""
+    global _client, _closed_connections
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _closed_connections += _client.connection_pool._created_connections
+            _client.close()
+            _client.connection_pool.disconnect()
+        _client = None
+
+
+def redis_client_stats() -> dict:
+    """Clients and connections opened by this process, and the connections of its pool"""
+    client = _client if _client_pid == os.getpid() else None
+    pool = client.connection_pool if client is not None else None
+    opened = pool._created_connections if pool is not None else 0
+    return {
+        "pid": os.getpid(),
+        "clients_created": _clients_created if _client_pid == os.getpid() else 0,
+        "connections_created": _closed_connections + opened,
+        "connections_in_use": len(pool._in_use_connections) if pool is not None else 0,
+        "connections_idle": len(pool._available_connections) if pool is not None else 0,
+    }
@@ -1,7 +1,7 @@
 
 
 from functools import wraps
-from typing import List
+from typing import Dict, List, Optional
 
 from fastapi import Depends, HTTPException, WebSocket, status, Query
 from fastapi.security import OAuth2PasswordBearer
@@ -15,17 +15,38 @@ from app.users.models.user import User
 from app.users.responses.user import UserRolesResponse
 from app.users.schemas.user import RegisterUserRequest
 from app.users.schemas.user import RegisterUserRequest
+from app.users.services.principal_cache import load_principal, save_principal
 from app.users.services.user import get_user_roles
-from app.shared.configs.security import get_token_payload, settings, load_user
+from app.shared.configs.security import get_token_payload, settings, load_user, str_decode
 from app.users.models.user import User # Ensure User is imported for type hinting if needed, though load_user returns dict/obj
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db = Depends(get_arangodb_session)):
+async def get_principal(token: str = Depends(oauth2_scheme), db = Depends(get_arangodb_session)) -> Optional[Dict]:
+    """
+    The user of an access token and their privileges ({"user", "privileges"}),
+    from the principal cache or resolved from the database; None when the token is not valid.
+    """
+    payload = get_token_payload(token, settings.JWT_SECRET, settings.JWT_ALGORITHM)
+    if not payload or not payload.get('r'):
+        return None
+    token_id = str_decode(payload['r'])
+
+    principal, version = await load_principal(token_id)
+    if principal is not None:
+        return principal
+
     user = await get_token_user(token=token, db=db)
-    if user is  not None:
-        return user
+    if user is None:
+        return None
+    principal = {"user": user, "privileges": await resolve_user_privileges(user, db)}
+    await save_principal(token_id, principal, version, expires_at=payload.get('exp'))
+    return principal
+
+async def get_current_user(principal: Optional[Dict] = Depends(get_principal)):
+    if principal is not None:
+        return principal["user"]
     raise HTTPException(status_code=401, detail="Not authorised..")
 
 async def get_current_user_ws(websocket: WebSocket, db = Depends(get_arangodb_session)):
@@ -41,7 +62,7 @@ async def get_current_user_ws(websocket: WebSocket, db = Depends(get_arangodb_se
             raise HTTPException(status_code=401, detail="Not authorized")
         
 
-        user = await get_current_user(token, db=db)
+        user = await get_current_user(await get_principal(token, db=db))
         
         return user
 
@@ -113,7 +134,10 @@ def created_by_decorator(func):
         return await func(*args, **kwargs)
     return wrapper
 
-async def get_current_user_privileges(current_user: User =  Depends(get_current_user), db: StandardDatabase = Depends(get_arangodb_session)):
+async def get_current_user_privileges(current_user: User =  Depends(get_current_user), principal: Optional[Dict] = Depends(get_principal)):
+    return principal["privileges"]
+
+async def resolve_user_privileges(current_user: Dict, db: StandardDatabase):
     response = await get_user_roles(current_user = current_user, db=db)
     
     # Handle cached response (dict) vs fresh response (Pydantic model)
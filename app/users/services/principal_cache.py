@@ -0,0 +1,101 @@
+"""
+Cache of authenticated principals: the user an access token resolves to
+(with their access limit) and their flattened privileges.
+
+Resolving a token takes a UserToken, a User and a user_access_limits query,
+and privileges the get_user_roles query, on every protected request. The
+result is kept in Redis for PRINCIPAL_CACHE_SECONDS (never past the expiry
+of the token), keyed by the token ID (the `r` claim):
+
+    vman_cache:principal:<token id>     {"version": n, "user": {...}, "privileges": [...]}
+    vman_cache:version:principals       n, incremented by invalidate_principals()
+
+Changes to roles, role assignments, access limits or users call
+invalidate_principals(), which makes every cached principal stale at once;
+a refreshed (expired) token is dropped with forget_token(). Without Redis
+every request resolves its principal from the database.
+"""
+import json
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi_cache import FastAPICache
+
+from app.shared.configs.settings import get_settings
+from app.shared.utils.cache import CACHE_PREFIX, bump_cache_versions, cache_version_key
+from app.utilits.logger import app_logger
+
+PRINCIPALS_TAG = 'principals'
+
+settings = get_settings()
+
+
+def principal_key(token_id: str) -> str:
+    return f"{CACHE_PREFIX}:principal:{token_id}"
+
+
+def _redis():
+    try:
+        return FastAPICache.get_backend().redis
+    except Exception:
+        return None
+
+
+def _version(value: Any) -> int:
+    return int(value) if value else 0
+
+
+async def load_principal(token_id: str) -> Tuple[Optional[Dict[str, Any]], Optional[int]]:
+    """
+    The cached principal of a token (None when missing or stale) and the
+    current principals version, to store a principal resolved after this read.
+    """
+    redis = _redis()
+    if redis is None:
+        return None, None
+    try:
+        entry, version = await redis.mget([principal_key(token_id), cache_version_key(PRINCIPALS_TAG)])
+    except Exception as e:
+        app_logger.debug(f"Principal cache unavailable: {e}")
+        return None, None
+    version = _version(version)
+    if entry is not None:
+        entry = json.loads(entry)
+        if entry.get('version') == version:
+            return entry, version
+    return None, version
+
+
+async def save_principal(token_id: str, principal: Dict[str, Any], version: Optional[int], expires_at: Optional[float] = None):
+    """
+    Cache a principal resolved after load_principal returned `version`; if the
+    principals were invalidated in between, the entry is stale on its next read.
+    """
+    redis = _redis()
+    if redis is None or version is None:
+        return
+    ttl = settings.PRINCIPAL_CACHE_SECONDS
+    if expires_at is not None:
+        ttl = min(ttl, int(expires_at - time.time()))
+    if ttl <= 0:
+        return
+    try:
+        await redis.set(principal_key(token_id), json.dumps({**principal, 'version': version}, default=str), ex=ttl)
+    except Exception as e:
+        app_logger.debug(f"Principal of token {token_id} not cached: {e}")
+
+
+async def forget_token(token_id: str):
+    """Drop the cached principal of a token that is no longer valid"""
+    redis = _redis()
+    if redis is None:
+        return
+    try:
+        await redis.delete(principal_key(token_id))
+    except Exception as e:
+        app_logger.warning(f"Cached principal of token {token_id} not dropped: {e}")
+
+
+async def invalidate_principals():
+    """Make every cached principal stale (after roles, role assignments, access limits or users change)"""
+    await bump_cache_versions(PRINCIPALS_TAG)
@@ -26,6 +26,7 @@ from app.shared.utils.database_utilities import record_exists, replace_object_va
 from app.users.models.role import Role, UserAccessLimit, UserRole
 from app.users.models.user import User, UserToken
 from app.users.responses.user import RoleResponse, UserResponse, UserRolesResponse
+from app.users.services.principal_cache import forget_token, invalidate_principals
 from app.users.schemas.user import (
     AssignRolesRequest,
     RegisterUserRequest,
@@ -84,7 +85,9 @@ async def create_or_update_user_account(data: RegisterUserRequest, image: Upload
                     delete_extisting=existing_image
                 )
 
-            return await User(**update_user_data).update(updated_by = current_user["id"] if current_user and 'id' in current_user else None, db = db)
+            updated_user = await User(**update_user_data).update(updated_by = current_user["id"] if current_user and 'id' in current_user else None, db = db)
+            await invalidate_principals()
+            return updated_user
         else:
             raise HTTPException(status_code=404, detail="User not found.")
 
@@ -190,6 +193,7 @@ async def get_refresh_token(refresh_token: str, db: StandardDatabase):
     user_token = user_token_cursor[0]
     user_token['expires_at'] = datetime.now().isoformat()
     updated_token = await UserToken(**user_token).update(user_token['user_id'], db)
+    await forget_token(user_token['_key'])
 
     user = await User.get(doc_id = updated_token['user_id'], db = db)
     res = await _generate_tokens(user, db)
@@ -338,7 +342,7 @@ async def _fetch_roles_and_limits(user_uuids: List[str], db: StandardDatabase) -
             RETURN {{ user: uuid, roles: role_list, access_limit: access_info }}
     """
     results = await VManBaseModel.run_custom_query(query=query, bind_vars={'user_uuids': user_uuids}, db=db)
-    return {item['user']: item for item in results} if results else {}
+    return {item['user']: item async for item in results} if results else {}
 
 
 async def fetch_users(paging: bool = None, page_number: int = None, limit: int = None, search: str = None, db: StandardDatabase = None):
@@ -452,6 +456,7 @@ async def save_role(data: RoleRequest = None, current_user: User = None, db: Sta
                 role_json['created_by'] = current_user.uuid
                 role = await Role(**role_json).save(db=db)
                 message = "Role created successfully"
+            await invalidate_principals()
             return ResponseMainModel(data = await RoleResponse.get_structured_role(role = role, db=db), message=message)
         else:
             raise HTTPException(status_code=400, detail="Invalid privileges have been defined.")
@@ -462,6 +467,7 @@ async def delete_role(data: List[str] = [], current_user: User = None, db: Stand
     try:
         for role in data:
             await Role.delete(doc_uuid=role, deleted_by = current_user['uuid'], db=db)            
+        await invalidate_principals()
     except Exception as e:
         raise e
 
@@ -534,7 +540,7 @@ async def assign_roles(data: AssignRolesRequest = None, current_user: User = Non
                     "created_by": current_user['uuid'] if 'uuid' in current_user else None
                 }).save(db=db)
         
-        
+        await invalidate_principals()
         user_roles = await get_user_roles(data.user, current_user, db=db)
 
         return ResponseMainModel(data = user_roles.data, message="Roles were successfully assigned!")
@@ -556,6 +562,7 @@ async def unassign_roles(data: AssignRolesRequest = None, current_user: User = N
                 await UserRole.delete(doc_uuid=existing_user_role[0].get('uuid'), deleted_by=current_user['uuid'], db=db)
             else:
                 raise HTTPException(status_code=404, detail="Could not finish role unassignment due to duplicate records")
+        await invalidate_principals()
         user_roles = await get_user_roles(data.user, current_user, db=db)
 
         return ResponseMainModel(data = user_roles.data, message="Roles were successfully unassigned!")         
@@ -612,7 +619,7 @@ async def get_user_roles(user_uuid: str  = None, current_user: User = None, db:
 
         user_roles_result = await VManBaseModel.run_custom_query(query=query, bind_vars=bind_vars, db=db)
         if user_roles_result:
-            user_roles = [user_role for user_role in user_roles_result]
+            user_roles = await user_roles_result.to_list()
             user_role = user_roles[0]
             roles = []
             if 'roles' in user_role and len(user_role['roles']) > 0:
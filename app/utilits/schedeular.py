@@ -14,6 +14,9 @@ from app.utilits.db_logger import log_to_db
 from app.utilits.logger import app_logger
 from app.ccva.services.ccva_public_services import cleanup_expired_ccva_public_results
 from app.ccva_public_module.config import CCVA_PUBLIC_CLEANUP_ENABLED
+from app.shared.configs.settings import get_settings
+from app.shared.services.va_rollups import VARollupService
+from app.shared.services.va_stats_service import VAStatsService
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -201,6 +204,20 @@ async def ccva_stale_task_check_job(db=None):
     except Exception as e:
         logger.error(f"Error in stale task monitor: {e}")
 
+async def va_stats_reconcile_job(db):
+    """Rebuild the VA record statistics from form_submissions to correct any drift"""
+    try:
+        await VAStatsService.reconcile(db)
+    except Exception as e:
+        logger.error(f"Error reconciling VA record statistics: {e}")
+
+async def va_rollups_rebuild_job(db):
+    """Rebuild the daily VA record rollups of the dashboard statistics from form_submissions"""
+    try:
+        await VARollupService.rebuild(db)
+    except Exception as e:
+        logger.error(f"Error rebuilding VA record rollups: {e}")
+
 async def start_scheduler():
     db = None
     async for session in get_arangodb_session():
@@ -250,6 +267,30 @@ async def start_scheduler():
         )
         logger.info("Scheduled stale task monitor job (running every 1 minute)")
 
+    # Reconcile the maintained VA record statistics every hour
+    if not scheduler.get_job('va_stats_reconcile_job'):
+        scheduler.add_job(
+            va_stats_reconcile_job,
+            'interval',
+            hours=1,
+            id='va_stats_reconcile_job',
+            replace_existing=True,
+            kwargs={'db': db}
+        )
+        logger.info("Scheduled VA record statistics reconcile job (running every hour)")
+
+    # Rebuild the dashboard statistics rollups nightly
+    if not scheduler.get_job('va_rollups_rebuild_job'):
+        rebuild_hour = get_settings().STATISTICS_ROLLUP_REBUILD_HOUR
+        scheduler.add_job(
+            va_rollups_rebuild_job,
+            CronTrigger(hour=rebuild_hour, minute=0),
+            id='va_rollups_rebuild_job',
+            replace_existing=True,
+            kwargs={'db': db}
+        )
+        logger.info(f"Scheduled VA record rollups rebuild job (running daily at {rebuild_hour:02d}:00)")
+
 async def shutdown_scheduler():
     """Shutdown the scheduler"""
     try:
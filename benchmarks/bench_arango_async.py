@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Concurrent ArangoDB request throughput: python-arango through the thread pool
+(the previous VManBaseModel path) vs the asyncio-native layer.
+
+Needs a reachable database configured through the usual DB_* settings:
+
+    python benchmarks/bench_arango_async.py --requests 2000 --concurrency 200
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fastapi.concurrency import run_in_threadpool  # noqa: E402
+
+from app.shared.configs.arangodb import close_arangodb, get_arangodb_client  # noqa: E402
+from app.shared.configs.arangodb_async import close_async_arangodb, get_async_db  # noqa: E402
+
+QUERY = "FOR doc IN @@collection LIMIT @limit RETURN doc"
+
+
+async def run_concurrently(request, total, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await request()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    return time.perf_counter() - start
+
+
+async def main(args):
+    db = (await get_arangodb_client()).db
+    bind_vars = {"@collection": args.collection, "limit": args.limit}
+
+    async def threadpool_request():
+        await run_in_threadpool(lambda: list(db.aql.execute(QUERY, bind_vars=bind_vars)))
+
+    async def async_request():
+        cursor = await get_async_db(db).aql(QUERY, bind_vars=bind_vars)
+        await cursor.to_list()
+
+    print(f"📊 {args.requests} queries, {args.concurrency} concurrent, "
+          f"{args.limit} documents each from {args.collection}")
+    for name, request in (("threadpool (python-arango)", threadpool_request),
+                          ("asyncio (httpx)", async_request)):
+        await run_concurrently(request, args.concurrency, args.concurrency)  # warm up the pools
+        elapsed = await run_concurrently(request, args.requests, args.concurrency)
+        print(f"  {name:28s} {elapsed:7.2f}s  {args.requests / elapsed:8.1f} req/s")
+
+    await close_async_arangodb()
+    close_arangodb()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--collection", default="form_submissions")
+    parser.add_argument("--limit", type=int, default=10)
+    asyncio.run(main(parser.parse_args()))
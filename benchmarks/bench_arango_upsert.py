@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+VA record upsert throughput: AQL UPSERT in batches of 500 (the previous
+upsert_many) vs bulk inserts in replace mode by a _key derived from __id,
+in adaptively sized batches (upsert_many with key_function).
+
+Each path writes the records twice into a scratch collection with a unique
+index on __id: once inserting, once replacing them. Needs a reachable
+database configured through the usual DB_* settings:
+
+    python benchmarks/bench_arango_upsert.py --records 20000 --fields 300
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.shared.configs.arangodb import (ArangoDBClient,  # noqa: E402
+                                         document_key)
+
+
+def make_records(count, fields, seed):
+    rng = random.Random(seed)
+    return [
+        {"__id": f"uuid:{i:08d}",
+         **{f"id{10000 + f}": rng.choice(["yes", "no", "dk"]) for f in range(fields)}}
+        for i in range(count)
+    ]
+
+
+def run(client, collection, records, key_function):
+    start = time.perf_counter()
+    old = client._upsert_many_sync(collection, records, key_field="__id",
+                                   return_old_fields=["vman_data_source"], key_function=key_function)
+    assert len(old) == len(records)
+    return time.perf_counter() - start
+
+
+def main(args):
+    client = ArangoDBClient()
+    client._connect_sync()
+    db = client.db
+    print(f"📊 {args.records} records x {args.fields} fields")
+
+    results = {}
+    for name, key_function in (
+        ("AQL UPSERT (500 per batch)", None),
+        ("bulk replace by _key", lambda record: document_key(record["__id"])),
+    ):
+        collection = f"bench_upsert_{os.getpid()}"
+        if db.has_collection(collection):
+            db.delete_collection(collection)
+        db.create_collection(collection).add_persistent_index(fields=["__id"], unique=True)
+        try:
+            insert = run(client, collection, make_records(args.records, args.fields, 1), key_function)
+            replace = run(client, collection, make_records(args.records, args.fields, 2), key_function)
+            assert db.collection(collection).count() == args.records
+        finally:
+            db.delete_collection(collection)
+        results[name] = insert + replace
+        print(f"  {name:28s} insert {args.records / insert:8.0f} docs/s   replace {args.records / replace:8.0f} docs/s")
+    aql, bulk = results.values()
+    print(f"  speed-up: {aql / bulk:.1f}x")
+    client.client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=10000)
+    parser.add_argument("--fields", type=int, default=300)
+    main(parser.parse_args())
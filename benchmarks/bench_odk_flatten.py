@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Flattening one page of ODK submissions into VMan records: the previous
+pandas path (json_normalize, column clean-up, to_json/loads, clean_document)
+vs SubmissionFlattener from app.odk.utils.data_transform.
+
+By default a 1000-submission page shaped like the WHO 2016 VA form is
+generated; pass a page recorded from ODK Central (the JSON of a
+.svc/Submissions response, optionally with its getFormFields JSON) to use
+real data:
+
+    python benchmarks/bench_odk_flatten.py --page page.json --fields fields.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from json import loads
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.ccva.services.ccva_services import get_ccva_input_columns  # noqa: E402
+from app.odk.utils.data_transform import SubmissionFlattener  # noqa: E402
+from app.shared.configs.arangodb import clean_document  # noqa: E402
+
+
+def pandas_normalize(page_records):
+    """The previous normalisation, followed by clean_document as in insert_many_data_to_arangodb"""
+    df = pd.json_normalize(page_records, sep='/')
+    df.columns = [col.split('/')[-1] for col in df.columns]
+    df.columns = df.columns.str.lower()
+    df = df.dropna(axis=1, how='all')
+    df = df.loc[:, ~df.columns.duplicated()]
+    return [clean_document(record) for record in loads(df.to_json(orient='records'))]
+
+
+def make_page(count):
+    """WHO VA shaped submissions: questions in nested groups, many unanswered, a geopoint and __system"""
+    rng = random.Random(1)
+    questions = [f"Id{column[2:]}" for column in get_ccva_input_columns()]
+    groups = {}
+    for index, question in enumerate(questions):
+        groups.setdefault(f"group_{index // 40}", []).append(question)
+    fields = [{"path": f"/consented/{group}/{question}", "name": question, "type": "string"}
+              for group, group_questions in groups.items() for question in group_questions]
+
+    def answer():
+        return rng.choice(["yes", "no", "dk", None, None, rng.randint(0, 90)])
+
+    page = [
+        {
+            "__id": f"uuid:{i:08d}",
+            "start": "2024-01-01T08:00:00.000+03:00",
+            "consented": {
+                group: {question: answer() for question in group_questions}
+                for group, group_questions in groups.items()
+            },
+            "gps": {"type": "Point", "coordinates": [36.8, -1.2, 1650.0], "properties": {"accuracy": 5.0}},
+            "meta": {"instanceID": f"uuid:{i:08d}"},
+            "__system": {
+                "submissionDate": f"2024-01-01T00:{i // 60 % 60:02d}:{i % 60:02d}.000Z",
+                "updatedAt": None, "submitterId": "5", "submitterName": "collector",
+                "attachmentsPresent": 0, "attachmentsExpected": 0, "status": None,
+                "reviewState": None, "deviceId": None, "edits": 0, "formVersion": "1",
+            },
+        }
+        for i in range(count)
+    ]
+    return page, fields
+
+
+def timed(function, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(args):
+    if args.page:
+        with open(args.page) as file:
+            page = json.load(file)
+        page = page.get("value", page) if isinstance(page, dict) else page
+        fields = None
+        if args.fields:
+            with open(args.fields) as file:
+                fields = json.load(file)
+    else:
+        page, fields = make_page(args.records)
+
+    print(f"📊 {len(page)} submissions, best of {args.repeat} runs")
+    flattener = SubmissionFlattener(fields)
+    flattener.flatten_page(page[:1])  # a sync reuses one flattener for every page
+    pandas_time, expected = timed(lambda: pandas_normalize(page), args.repeat)
+    flat_time, actual = timed(lambda: flattener.flatten_page(page), args.repeat)
+    print(f"  json_normalize + clean_document {pandas_time * 1000:8.1f} ms")
+    print(f"  SubmissionFlattener             {flat_time * 1000:8.1f} ms")
+    print(f"  speed-up: {pandas_time / flat_time:.1f}x")
+    # (pandas turns integers into floats in columns with missing values, they compare equal)
+    print(f"  same records: {'✅' if actual == expected else '❌'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=1000)
+    parser.add_argument("--page", help="recorded ODK submissions page (JSON)")
+    parser.add_argument("--fields", help="recorded getFormFields response (JSON)")
+    parser.add_argument("--repeat", type=int, default=5)
+    main(parser.parse_args())
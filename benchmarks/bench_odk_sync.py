@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+ODK sync throughput against a local mock ODK Central with slow responses:
+the previous page-by-page loop (download, normalise, save, repeat) vs the
+pipelined download of app.odk.services.sync_pipeline.
+
+Saving is simulated with a fixed delay per page, so no database is needed:
+
+    python benchmarks/bench_odk_sync.py --records 5000 --latency 1.0 --concurrency 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import aclosing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.odk.services.sync_pipeline import (iter_submission_pages,  # noqa: E402
+                                            normalize_submissions)
+from app.odk.utils.odk_client import ODKClientAsync  # noqa: E402
+from app.settings.models.settings import OdkConfigModel  # noqa: E402
+
+
+def make_submissions(count, fields):
+    rng = random.Random(1)
+    return [
+        {
+            "__id": f"uuid:{i}",
+            "__system": {"submissionDate": f"2024-01-01T00:00:{i:08d}Z"},
+            "consented": {f"id{10000 + f}": rng.choice(["yes", "no", "dk"]) for f in range(fields)},
+        }
+        for i in range(count)
+    ]
+
+
+def make_handler(submissions, latency, max_page):
+    class MockODKCentral(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):  # /v1/sessions
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            self._send({"token": "benchmark", "expireAt": "2999-01-01T00:00:00Z"})
+
+        def do_GET(self):  # /v1/projects/1/forms/va.svc/Submissions
+            time.sleep(latency)
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            skip = int(query.get("$skip", ["0"])[0])
+            top = min(int(query.get("$top", [str(max_page)])[0]), max_page)
+            body = {"@odata.count": len(submissions), "value": submissions[skip:skip + top]}
+            if skip + top < len(submissions):
+                host = f"http://{self.headers['Host']}"
+                body["@odata.nextLink"] = f"{host}{url.path}?$count=true&$skip={skip + top}&$top={top}"
+            self._send(body)
+
+        def _send(self, body):
+            data = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    return MockODKCentral
+
+
+async def sequential_sync(config, top, save_delay):
+    """The previous loop: each page is saved before the next one is requested."""
+    saved = 0
+    async with ODKClientAsync(config) as odk_client:
+        data = await odk_client.getFormSubmissions(top=top, order_by="__system/submissionDate")
+        while data.get("value"):
+            records = normalize_submissions(data["value"])
+            await asyncio.sleep(save_delay)
+            saved += len(records)
+            if not data.get("@odata.nextLink"):
+                break
+            data = await odk_client.getFormSubmissions(next_link=data["@odata.nextLink"])
+    return saved
+
+
+async def pipelined_sync(config, top, save_delay, concurrency, prefetch):
+    saved = 0
+    async with ODKClientAsync(config) as odk_client:
+        pages = iter_submission_pages(odk_client, top=top, concurrency=concurrency, prefetch=prefetch)
+        async with aclosing(pages):
+            async for page_records in pages:
+                records = await asyncio.to_thread(normalize_submissions, page_records)
+                await asyncio.sleep(save_delay)
+                saved += len(records)
+    return saved
+
+
+async def main(args):
+    submissions = make_submissions(args.records, args.fields)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(submissions, args.latency, args.max_page))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    config = OdkConfigModel(url=f"http://127.0.0.1:{server.server_address[1]}", username="bench",
+                            password="bench", form_id="va", project_id="1", is_sort_allowed=True)
+
+    print(f"📊 {args.records} submissions x {args.fields} fields, pages of {args.top}, "
+          f"{args.latency}s per request, {args.save_delay}s save per page")
+    results = {}
+    for name, run in (
+        ("sequential", lambda: sequential_sync(config, args.top, args.save_delay)),
+        (f"pipelined (concurrency {args.concurrency})",
+         lambda: pipelined_sync(config, args.top, args.save_delay, args.concurrency, args.prefetch)),
+    ):
+        start = time.perf_counter()
+        saved = await run()
+        results[name] = time.perf_counter() - start
+        print(f"  {name:28s} {results[name]:7.2f}s  {saved / results[name]:8.1f} records/s")
+        assert saved == args.records, f"{name} saved {saved} records"
+    sequential, pipelined = results.values()
+    print(f"  speed-up: {sequential / pipelined:.1f}x")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=3000)
+    parser.add_argument("--fields", type=int, default=200)
+    parser.add_argument("--top", type=int, default=250)
+    parser.add_argument("--max-page", type=int, default=250, help="server cap on $top")
+    parser.add_argument("--latency", type=float, default=1.0, help="seconds per ODK request")
+    parser.add_argument("--save-delay", type=float, default=0.1, help="seconds to save a page")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--prefetch", type=int, default=8)
+    args = parser.parse_args()
+    # sessions are cached in process only, no Redis needed
+    os.environ.setdefault("ODK_SESSION_REDIS", "false")
+    asyncio.run(main(args))
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Merge of CCVA results with their VA records: the previous single query with
+every ID written into the AQL text vs merge_va_data (bound IDs, parallel
+batches, primary key reads).
+
+Uses the instance IDs of the records in form_submissions (padded with IDs
+that do not exist up to each size) and the configured field mapping. Needs
+a reachable database configured through the usual DB_* settings:
+
+    python benchmarks/bench_va_merge.py --sizes 10000 40000 100000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.ccva.services.va_data_merge import (merge_va_data,  # noqa: E402
+                                             va_merge_query)
+from app.settings.services.odk_configs import fetch_odk_config  # noqa: E402
+from app.shared.configs.arangodb import get_arangodb_client  # noqa: E402
+from app.shared.configs.constants import db_collections  # noqa: E402
+
+
+def string_built_merge(db, results, config):
+    """The previous getVADataAndMergeWithResults query"""
+    instance_id = config.field_mapping.instance_id or 'instanceid'
+    uids = ', '.join(f'"{result["ID"]}"' for result in results)
+    lookup = f"FOR doc IN {db_collections.VA_TABLE}\n    FILTER doc.{instance_id} IN [{uids}]"
+    va_data_map = {doc['uid']: doc for doc in db.aql.execute(va_merge_query(config, lookup), cache=True)}
+    return [{**result, **va_data_map[result['ID']]} if result['ID'] in va_data_map else result for result in results]
+
+
+async def main(args):
+    db = (await get_arangodb_client()).db
+    config = await fetch_odk_config(db, True)
+    instance_id = config.field_mapping.instance_id or 'instanceid'
+    ids = list(db.aql.execute(
+        f"FOR doc IN {db_collections.VA_TABLE} LIMIT @limit RETURN doc.{instance_id}",
+        bind_vars={"limit": max(args.sizes)},
+    ))
+    print(f"📊 {len(ids)} VA records available")
+
+    for size in args.sizes:
+        results = [{"ID": uid, "CAUSE1": "x"} for uid in ids[:size]]
+        results += [{"ID": f"uuid:missing-{i}", "CAUSE1": "x"} for i in range(size - len(results))]
+
+        start = time.perf_counter()
+        previous = await asyncio.to_thread(string_built_merge, db, results, config)
+        previous_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        merged = await merge_va_data(db, results, config, batch_size=args.batch_size, concurrency=args.concurrency)
+        merged_seconds = time.perf_counter() - start
+
+        assert merged == previous, "merged results differ"
+        print(f"  {size:7d} results  string-built {previous_seconds:7.2f}s  "
+              f"batched {merged_seconds:7.2f}s  speed-up {previous_seconds / merged_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 40000, 100000])
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=4)
+    asyncio.run(main(parser.parse_args()))